@@ -4,9 +4,214 @@ import os
 GOOGLE_CREDENTIALS = os.environ.get("GOOGLE_APPLICATION_CREDENTIALS")
 DEEPSEEK_API_KEY = os.environ.get("DEEPSEEK_API_KEY")
 
+# Diretório local para artefatos gerados (modelos exportados, caches)
+CACHE_DIR = os.environ.get(
+    "APP_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache")
+)
+
 # Modelo Zero-Shot e configuração do pipeline
 ZERO_SHOT_MODEL = "facebook/bart-large-mnli"
 
+# Backend de execução do Zero-Shot: "transformers" (PyTorch fp32) ou "onnx" (ONNX Runtime, CPU)
+ZERO_SHOT_BACKEND = os.environ.get("ZERO_SHOT_BACKEND", "transformers")
+# Aplica quantização dinâmica int8 quando o backend é "onnx"
+ZERO_SHOT_ONNX_QUANTIZE = os.environ.get("ZERO_SHOT_ONNX_QUANTIZE", "1") != "0"
+# Onde o modelo exportado para ONNX é salvo
+ZERO_SHOT_ONNX_DIR = os.path.join(CACHE_DIR, "onnx")
+
+# Pré-filtro de rótulos antes do Zero-Shot: "none", "tfidf" ou "embedding"
+ZERO_SHOT_PREFILTER = os.environ.get("ZERO_SHOT_PREFILTER", "none")
+# Quantos rótulos por texto seguem do pré-filtro para o BART-MNLI
+ZERO_SHOT_PREFILTER_TOP_K = int(os.environ.get("ZERO_SHOT_PREFILTER_TOP_K", "40"))
+# Modelo de embeddings (bi-encoder multilíngue) usado pelo pré-filtro "embedding"
+ZERO_SHOT_PREFILTER_EMBEDDING_MODEL = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+
+# Cache persistente dos resultados Zero-Shot (SQLite)
+ZERO_SHOT_CACHE_ENABLED = os.environ.get("ZERO_SHOT_CACHE_ENABLED", "1") != "0"
+ZERO_SHOT_CACHE_PATH = os.environ.get(
+    "ZERO_SHOT_CACHE_PATH", os.path.join(CACHE_DIR, "zero_shot_cache.sqlite3")
+)
+ZERO_SHOT_CACHE_MAX_ENTRIES = int(os.environ.get("ZERO_SHOT_CACHE_MAX_ENTRIES", "50000"))
+
+# Pré-carrega o modelo Zero-Shot em segundo plano quando o usuário vai fazer o mapeamento
+ZERO_SHOT_BACKGROUND_WARMUP = os.environ.get("ZERO_SHOT_BACKGROUND_WARMUP", "1") != "0"
+
+# Quantidade de pares (texto, rótulo) processados por forward pass do Zero-Shot
+ZERO_SHOT_BATCH_SIZE = int(os.environ.get("ZERO_SHOT_BATCH_SIZE", "16"))
+
+# Processos dedicados ao Zero-Shot (0 = classificar no próprio processo)
+ZERO_SHOT_WORKERS = int(os.environ.get("ZERO_SHOT_WORKERS", "0"))
+# Micro-batching do serviço: máximo de textos por lote e espera máxima para juntar pedidos
+ZERO_SHOT_MAX_BATCH_TEXTS = int(os.environ.get("ZERO_SHOT_MAX_BATCH_TEXTS", "8"))
+ZERO_SHOT_MAX_BATCH_WAIT_MS = float(os.environ.get("ZERO_SHOT_MAX_BATCH_WAIT_MS", "10"))
+# Prazo (segundos) para o serviço devolver a classificação de um texto
+ZERO_SHOT_RESULT_TIMEOUT = float(os.environ.get("ZERO_SHOT_RESULT_TIMEOUT", "300"))
+
+# Textos longos são divididos em trechos (em tokens) com sobreposição, em vez de truncados
+ZERO_SHOT_CHUNK_TOKENS = int(os.environ.get("ZERO_SHOT_CHUNK_TOKENS", "400"))
+ZERO_SHOT_CHUNK_OVERLAP = int(os.environ.get("ZERO_SHOT_CHUNK_OVERLAP", "50"))
+# Como combinar os scores dos trechos: "max" ou "mean"
+ZERO_SHOT_CHUNK_AGGREGATION = os.environ.get("ZERO_SHOT_CHUNK_AGGREGATION", "max")
+# Trechos enviados ao modelo por vez (limita a memória em textos muito longos)
+ZERO_SHOT_CHUNK_BATCH = int(os.environ.get("ZERO_SHOT_CHUNK_BATCH", "4"))
+
+# Cache de respostas do LLM: "memory" (LRU do processo), "sqlite" (arquivo local
+# compartilhado entre processos) ou "redis" (armazenamento compartilhado)
+LLM_CACHE_BACKEND = os.environ.get("LLM_CACHE_BACKEND", "memory")
+LLM_CACHE_PATH = os.environ.get("LLM_CACHE_PATH", os.path.join(CACHE_DIR, "llm_responses.sqlite3"))
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get("LLM_CACHE_MAX_ENTRIES", "1000"))
+# Limite total em bytes ("memory"/"sqlite") e tamanho máximo de cada resposta guardada ("redis")
+LLM_CACHE_MAX_BYTES = int(os.environ.get("LLM_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+LLM_CACHE_MAX_ENTRY_BYTES = int(os.environ.get("LLM_CACHE_MAX_ENTRY_BYTES", str(1024 * 1024)))
+LLM_CACHE_REDIS_URL = os.environ.get("LLM_CACHE_REDIS_URL", "redis://localhost:6379/0")
+
+# Deduplicação de prompts idênticos também entre processos (lock de arquivo por chave).
+# Só tem efeito com um cache compartilhado ("sqlite" ou "redis").
+LLM_SINGLE_FLIGHT_CROSS_PROCESS = os.environ.get("LLM_SINGLE_FLIGHT_CROSS_PROCESS", "0") == "1"
+LLM_SINGLE_FLIGHT_LOCK_DIR = os.path.join(CACHE_DIR, "llm_locks")
+
+# Limites de requisições simultâneas à API: global e por modelo (nome do modelo na API).
+# Modelos sem entrada em LLM_MODEL_CONCURRENCY ficam limitados só pelo global.
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", "16"))
+LLM_MODEL_CONCURRENCY = {
+    "gpt-4o": int(os.environ.get("LLM_CONCURRENCY_GPT_4O", "8")),
+    "gpt-3.5-turbo": int(os.environ.get("LLM_CONCURRENCY_GPT_35_TURBO", "16"))
+}
+
+# Endereço da API compatível com OpenAI (ex: servidor local de testes) e tempo limite por requisição
+LLM_BASE_URL = os.environ.get("OPENAI_BASE_URL") or None
+LLM_REQUEST_TIMEOUT = float(os.environ.get("LLM_REQUEST_TIMEOUT", "60"))
+
+# Transporte das chamadas (app/llm_transport.py): "live" (API), "record" (API + grava
+# cassetes) ou "replay" (só cassetes, sem rede). No replay, a latência é sintética
+# (none, recorded, fixed:MS, uniform:MIN:MAX, lognormal:MEDIANA_MS:SIGMA) e
+# requisições sem cassete falham ("error") ou recebem uma resposta genérica ("synthetic")
+LLM_TRANSPORT = os.environ.get("LLM_TRANSPORT", "live")
+LLM_CASSETTE_DIR = os.environ.get("LLM_CASSETTE_DIR", os.path.join(CACHE_DIR, "cassettes"))
+LLM_REPLAY_LATENCY = os.environ.get("LLM_REPLAY_LATENCY", "recorded")
+LLM_REPLAY_ON_MISS = os.environ.get("LLM_REPLAY_ON_MISS", "error")
+LLM_REPLAY_SEED = int(os.environ["LLM_REPLAY_SEED"]) if os.environ.get("LLM_REPLAY_SEED") else None
+
+# Novas tentativas para erros transitórios (429, 5xx, rede), com backoff exponencial e jitter
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "4"))
+LLM_BACKOFF_BASE = float(os.environ.get("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.environ.get("LLM_BACKOFF_MAX", "20"))
+# Maior Retry-After respeitado, em segundos
+LLM_RETRY_AFTER_MAX = float(os.environ.get("LLM_RETRY_AFTER_MAX", "60"))
+# Circuit breaker por modelo: abre após N falhas seguidas do servidor e testa de novo após o intervalo
+LLM_CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get("LLM_CIRCUIT_FAILURE_THRESHOLD", "5"))
+LLM_CIRCUIT_RECOVERY_SECONDS = float(os.environ.get("LLM_CIRCUIT_RECOVERY_SECONDS", "30"))
+
+# Limite de taxa do lado do cliente (token bucket por modelo), compartilhado entre os
+# processos da máquina pelo arquivo de estado. rpm: requisições/min; tpm: tokens/min
+# (prompt estimado + max_tokens). Ajuste aos limites da sua conta no provedor.
+LLM_RATE_LIMIT_ENABLED = os.environ.get("LLM_RATE_LIMIT_ENABLED", "1") == "1"
+LLM_RATE_LIMIT_STATE_PATH = os.path.join(CACHE_DIR, "llm_rate_limit.json")
+LLM_RATE_LIMITS = {
+    "gpt-4o": {
+        "rpm": int(os.environ.get("LLM_RPM_GPT_4O", "500")),
+        "tpm": int(os.environ.get("LLM_TPM_GPT_4O", "30000"))
+    },
+    "gpt-3.5-turbo": {
+        "rpm": int(os.environ.get("LLM_RPM_GPT_35_TURBO", "3500")),
+        "tpm": int(os.environ.get("LLM_TPM_GPT_35_TURBO", "200000"))
+    }
+}
+
+# Roteamento entre os níveis de MODELS (app/llm_routing.py). Tarefa -> nível padrão;
+# chamadas sem tarefa (ou com tarefa fora da tabela) usam "default".
+LLM_ROUTING_TABLE = {
+    "extraction": "fast",       # palavras-chave, listas curtas
+    "classification": "fast",   # rótulos e escolhas fechadas
+    "grading": "fast",          # correção APROVADO/REPROVADO
+    "rewrite": "default",       # simplificar ou enriquecer um texto
+    "analysis": "default",      # análises com saída JSON
+    "explanation": "default",
+    "chat": "default",
+    "lesson": "default",
+    "assessment": "default",
+    "pathway": "advanced"
+}
+# Nível mínimo para respostas que precisam seguir um esquema JSON
+LLM_ROUTING_MIN_STRUCTURED_TIER = os.environ.get("LLM_ROUTING_MIN_STRUCTURED_TIER", "default")
+# Prompt + resposta (tokens estimados) acima disso saem do nível "fast"
+LLM_ROUTING_FAST_MAX_TOKENS = int(os.environ.get("LLM_ROUTING_FAST_MAX_TOKENS", "6000"))
+# Latência esperada por nível (ms fixos, ms por token de resposta) até haver medições
+# suficientes; usada quando a chamada informa um SLO de latência
+LLM_TIER_LATENCY_MS = {
+    "fast": (400, 8),
+    "default": (800, 20),
+    "advanced": (800, 20)
+}
+# Preço em dólares por milhão de tokens (entrada, saída), para o custo registrado por nível
+LLM_MODEL_PRICES = {
+    "gpt-4o": {"input": 2.50, "output": 10.00},
+    "gpt-3.5-turbo": {"input": 0.50, "output": 1.50}
+}
+# Registro (JSONL) de latência/tokens/custo por chamada: python -m app.llm_routing
+LLM_ROUTING_LOG = os.environ.get("LLM_ROUTING_LOG", "1") == "1"
+LLM_ROUTING_LOG_PATH = os.environ.get("LLM_ROUTING_LOG_PATH", os.path.join(CACHE_DIR, "llm_routing.jsonl"))
+
+# Uso por usuário (app/usage_ledger.py): lido do JSONL acima, que marca o usuário e a
+# função chamadora de cada resposta (python -m app.usage_ledger). Orçamentos diários
+# por usuário (0 = sem limite): acima deles, só respostas em cache ou do nível "fast"
+USAGE_DAILY_TOKEN_BUDGET = int(os.environ.get("USAGE_DAILY_TOKEN_BUDGET", "0"))
+USAGE_DAILY_COST_BUDGET = float(os.environ.get("USAGE_DAILY_COST_BUDGET", "0"))
+
+# Saída estruturada (app/structured_output.py): pede response_format json_object à API
+# (desative para provedores compatíveis que não o aceitam) e quantas rodadas de novos
+# pedidos fazer apenas para os trechos do JSON que não passaram na validação
+LLM_JSON_MODE = os.environ.get("LLM_JSON_MODE", "1") == "1"
+STRUCTURED_MAX_REASKS = int(os.environ.get("STRUCTURED_MAX_REASKS", "1"))
+
+# Aula completa em seções (generate_complete_lesson): uma chamada curta gera o roteiro
+# e cada parte da aula (introdução, seções, exemplos, atividades, resumo) é gerada em
+# paralelo, com orçamento de tokens e entrada de cache próprios. Desligado por padrão:
+# são cerca de 10 chamadas por aula (roteiro + 9 partes, cada uma repetindo o roteiro
+# no prompt) em vez de 1; a aula fica pronta no tempo da parte mais lenta e uma parte
+# com erro não derruba as outras
+LESSON_SECTIONED = os.environ.get("LESSON_SECTIONED", "0") == "1"
+LESSON_OUTLINE_MAX_TOKENS = int(os.environ.get("LESSON_OUTLINE_MAX_TOKENS", "600"))
+LESSON_SECTION_MAX_TOKENS = int(os.environ.get("LESSON_SECTION_MAX_TOKENS", "900"))
+
+# Correção das questões dissertativas (apply_assessment): "batch" corrige todas ao final
+# da avaliação, até ESSAY_GRADING_BATCH_SIZE respostas por chamada (lotes em paralelo);
+# "background" corrige em segundo plano enquanto o aluno segue, enviando cada lote de
+# ESSAY_GRADING_BATCH_SIZE respostas assim que ele enche (mesmo número de chamadas do "batch")
+ESSAY_GRADING_MODE = os.environ.get("ESSAY_GRADING_MODE", "batch")
+ESSAY_GRADING_BATCH_SIZE = int(os.environ.get("ESSAY_GRADING_BATCH_SIZE", "5"))
+
+# Cache semântico das perguntas livres ao professor (app/semantic_cache.py): serve a
+# resposta de uma pergunta equivalente já feita no mesmo contexto (área, subárea,
+# nível, faixa etária e estilo) quando o cosseno passa do limiar
+SEMANTIC_CACHE_ENABLED = os.environ.get("SEMANTIC_CACHE_ENABLED", "1") == "1"
+# Modelo de embeddings de frase das perguntas e limiar de cosseno: "auto" calibra com os
+# pares rotulados de app/semantic_cache_pairs.py (margem acima do maior par negativo)
+SEMANTIC_CACHE_EMBEDDING_MODEL = os.environ.get("SEMANTIC_CACHE_EMBEDDING_MODEL",
+                                                ZERO_SHOT_PREFILTER_EMBEDDING_MODEL)
+SEMANTIC_CACHE_THRESHOLD = os.environ.get("SEMANTIC_CACHE_THRESHOLD", "auto")
+SEMANTIC_CACHE_THRESHOLD_MARGIN = float(os.environ.get("SEMANTIC_CACHE_THRESHOLD_MARGIN", "0.02"))
+SEMANTIC_CACHE_CALIBRATION_PATH = os.path.join(CACHE_DIR, "semantic_cache_threshold.json")
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.environ.get("SEMANTIC_CACHE_MAX_ENTRIES", "5000"))
+SEMANTIC_CACHE_TTL = int(os.environ.get("SEMANTIC_CACHE_TTL", str(24 * 60 * 60)))
+
+# Pré-carregamento da explicação do próximo passo enquanto o aluno lê o atual
+STEP_PREFETCH_ENABLED = os.environ.get("STEP_PREFETCH_ENABLED", "1") == "1"
+# Explicações geradas em paralelo e máximo de pré-carregamentos pendentes (além disso, descarta)
+STEP_PREFETCH_CONCURRENCY = int(os.environ.get("STEP_PREFETCH_CONCURRENCY", "2"))
+STEP_PREFETCH_MAX_PENDING = int(os.environ.get("STEP_PREFETCH_MAX_PENDING", "8"))
+# Chamadas especulativas à API por usuário por hora (respostas já em cache não contam)
+STEP_PREFETCH_BUDGET_PER_HOUR = int(os.environ.get("STEP_PREFETCH_BUDGET_PER_HOUR", "20"))
+# Também pré-carrega o primeiro passo da próxima lição no último passo da lição atual
+STEP_PREFETCH_NEXT_LESSON = os.environ.get("STEP_PREFETCH_NEXT_LESSON", "1") == "1"
+
+# Explicações de passos pré-geradas para todo o currículo (python -m app.pregenerate_steps)
+STEP_STORE_ENABLED = os.environ.get("STEP_STORE_ENABLED", "1") == "1"
+STEP_STORE_PATH = os.environ.get("STEP_STORE_PATH", os.path.join(CACHE_DIR, "step_explanations.sqlite3"))
+# Faixas etárias (idade mínima, máxima) para as quais as explicações são pré-geradas
+STEP_AGE_BANDS = [(10, 12), (13, 14), (15, 17)]
+
 # CANDIDATE_LABELS com novos labels adicionados e organizados
 CANDIDATE_LABELS = [
     # Ciências Exatas e Aplicadas
@@ -3,9 +3,22 @@
 
 import time
 from app.firestore_client import get_firestore_client
-from app.llm_integration import call_teacher_llm
+from app.llm_integration import call_teacher_llm, generate_json
 import json
 
+_STRING_LIST = {"type": "array", "items": {"type": "string", "description": "Item"}}
+
+# Formato esperado da análise dos comentários de feedback (ver llm_integration.generate_json)
+FEEDBACK_ANALYSIS_SCHEMA = {
+    "type": "object",
+    "required": ["main_themes", "improvement_suggestions", "missing_interests"],
+    "properties": {
+        "main_themes": _STRING_LIST,
+        "improvement_suggestions": _STRING_LIST,
+        "missing_interests": _STRING_LIST
+    }
+}
+
 
 def collect_feedback(db, user_id, recommended_track, session_type="study"):
     """
@@ -151,17 +164,7 @@ def analyze_user_feedback(db, user_id, recent_days=30):
         """
 
         try:
-            text_analysis_result = call_teacher_llm(prompt, temperature=0.3)
-
-            # Extrair o JSON da resposta
-            if "```json" in text_analysis_result:
-                json_text = text_analysis_result.split("```json")[1].split("```")[0]
-            elif "```" in text_analysis_result:
-                json_text = text_analysis_result.split("```")[1].split("```")[0]
-            else:
-                json_text = text_analysis_result
-
-            text_analysis = json.loads(json_text)
+            text_analysis = generate_json(prompt, FEEDBACK_ANALYSIS_SCHEMA, temperature=0.3, task="analysis")
         except Exception as e:
             text_analysis = {
                 "main_themes": ["Erro ao analisar comentários"],
@@ -297,7 +300,7 @@ def adapt_recommendations(db, user_id, analysis_result):
             """
 
             try:
-                keywords_response = call_teacher_llm(prompt, temperature=0.3)
+                keywords_response = call_teacher_llm(prompt, temperature=0.3, task="extraction")
                 keywords = [kw.strip().lower() for kw in keywords_response.split(",")]
                 missing_interest_labels.extend(keywords)
             except:
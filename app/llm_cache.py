@@ -0,0 +1,366 @@
+# app/llm_cache.py
+"""
+Backends de cache para as respostas do LLM (call_teacher_llm).
+
+Todos os backends aplicam o TTL e os limites de tamanho (em bytes) no próprio
+armazenamento e contam acertos/erros:
+
+- MemoryResponseCache: LRU em memória do processo (comportamento original)
+- SQLiteResponseCache: arquivo local, persistente e compartilhado entre os
+  processos da mesma máquina (um CLI por aluno)
+- KeyValueResponseCache: armazenamento compartilhado com interface estilo Redis
+  (get / set com expiração / delete); InMemoryKeyValueStore é um substituto
+  local com a mesma interface, para testes
+"""
+
+import os
+import abc
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+
+# Sistema de cache com limite de tamanho
+class LRUCache:
+    """Cache LRU (Least Recently Used) com limite de tamanho."""
+
+    def __init__(self, max_size=1000):
+        self.cache = OrderedDict()
+        self.max_size = max_size
+
+    def get(self, key):
+        if key in self.cache:
+            # Mover para o fim (mais recentemente usado)
+            value = self.cache.pop(key)
+            self.cache[key] = value
+            return value
+        return None
+
+    def set(self, key, value):
+        if key in self.cache:
+            # Remover para atualizar a posição
+            self.cache.pop(key)
+        elif len(self.cache) >= self.max_size:
+            # Remover o item menos recentemente usado
+            self.cache.popitem(last=False)
+
+        # Adicionar ao final (mais recentemente usado)
+        self.cache[key] = value
+
+
+class ResponseCacheBackend(abc.ABC):
+    """Interface comum dos caches de resposta, com contadores de uso."""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._stats_lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0, "sets": 0}
+
+    @abc.abstractmethod
+    def get(self, key: str) -> Optional[str]:
+        """Resposta guardada para a chave, ou None (ausente ou expirada)."""
+
+    @abc.abstractmethod
+    def set(self, key: str, value: str):
+        """Guarda a resposta, respeitando o TTL e os limites de tamanho do backend."""
+
+    def _count(self, name: str, amount: int = 1):
+        with self._stats_lock:
+            self._stats[name] += amount
+
+    def stats(self) -> dict:
+        """Contadores deste processo (acertos, erros, expirações, remoções e gravações)."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        stats["backend"] = type(self).__name__
+        return stats
+
+
+class MemoryResponseCache(ResponseCacheBackend):
+    """LRU em memória, limitado por número de entradas e por bytes."""
+
+    def __init__(self, ttl: float, max_entries: int = 1000, max_bytes: int = None):
+        super().__init__(ttl)
+        self.max_bytes = max_bytes
+        self._lru = LRUCache(max_size=max_entries)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is not None and time.time() - entry[1] >= self.ttl:
+                self._remove(key)
+                self._count("expired")
+                entry = None
+        if entry is None:
+            self._count("misses")
+            return None
+        self._count("hits")
+        return entry[0]
+
+    def set(self, key: str, value: str):
+        size = len(value.encode("utf-8"))
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        with self._lock:
+            self._remove(key)
+            if len(self._lru.cache) >= self._lru.max_size:
+                self._evict_oldest()
+            while self.max_bytes is not None and self._bytes + size > self.max_bytes and self._lru.cache:
+                self._evict_oldest()
+            self._lru.set(key, (value, time.time(), size))
+            self._bytes += size
+        self._count("sets")
+
+    def _remove(self, key: str):
+        entry = self._lru.cache.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+    def _evict_oldest(self):
+        _, entry = self._lru.cache.popitem(last=False)
+        self._bytes -= entry[2]
+        self._count("evictions")
+
+
+class SQLiteResponseCache(ResponseCacheBackend):
+    """
+    Cache em arquivo SQLite, compartilhado entre processos.
+
+    Entradas expiradas são removidas na leitura e, a cada sweep_interval gravações,
+    em uma varredura pelo índice de criação. O total de bytes fica em uma linha
+    mantida por triggers (vale para todos os processos que usam o arquivo); quando
+    passa de max_bytes, as entradas acessadas há mais tempo são removidas.
+    """
+
+    def __init__(self, path: str, ttl: float, max_bytes: int = 256 * 1024 * 1024, sweep_interval: int = 100):
+        super().__init__(ttl)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        self._lock = threading.Lock()
+        self._initialized = False
+        self._sets_since_sweep = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            # Uma transação só: outro processo não grava entre a tabela e os triggers do total
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS llm_responses ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                    "created_at REAL NOT NULL, last_access REAL NOT NULL)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_last_access ON llm_responses (last_access)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_created_at ON llm_responses (created_at)")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS llm_cache_size ("
+                    "id INTEGER PRIMARY KEY CHECK (id = 1), total_bytes INTEGER NOT NULL)"
+                )
+                # Arquivos criados antes do total: começa pela soma do que já existe
+                conn.execute(
+                    "INSERT OR IGNORE INTO llm_cache_size (id, total_bytes) "
+                    "SELECT 1, COALESCE(SUM(size), 0) FROM llm_responses"
+                )
+                conn.execute(
+                    "CREATE TRIGGER IF NOT EXISTS llm_responses_insert AFTER INSERT ON llm_responses "
+                    "BEGIN UPDATE llm_cache_size SET total_bytes = total_bytes + NEW.size; END"
+                )
+                conn.execute(
+                    "CREATE TRIGGER IF NOT EXISTS llm_responses_delete AFTER DELETE ON llm_responses "
+                    "BEGIN UPDATE llm_cache_size SET total_bytes = total_bytes - OLD.size; END"
+                )
+                conn.execute(
+                    "CREATE TRIGGER IF NOT EXISTS llm_responses_resize AFTER UPDATE OF size ON llm_responses "
+                    "BEGIN UPDATE llm_cache_size SET total_bytes = total_bytes + NEW.size - OLD.size; END"
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                conn.close()
+                raise
+            self._initialized = True
+        return conn
+
+    def total_bytes(self) -> int:
+        """Bytes armazenados no arquivo (todas as entradas, de todos os processos)."""
+        with self._lock:
+            conn = self._connect()
+            try:
+                return conn.execute("SELECT total_bytes FROM llm_cache_size").fetchone()[0]
+            finally:
+                conn.close()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        expired = False
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn:
+                    row = conn.execute(
+                        "SELECT value, created_at FROM llm_responses WHERE key = ?", (key,)
+                    ).fetchone()
+                    if row is not None and now - row[1] >= self.ttl:
+                        conn.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+                        row, expired = None, True
+                    elif row is not None:
+                        conn.execute("UPDATE llm_responses SET last_access = ? WHERE key = ?", (now, key))
+            finally:
+                conn.close()
+
+        if expired:
+            self._count("expired")
+        if row is None:
+            self._count("misses")
+            return None
+        self._count("hits")
+        return row[0]
+
+    def set(self, key: str, value: str):
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            self._sets_since_sweep += 1
+            sweep = self._sets_since_sweep >= self.sweep_interval
+            if sweep:
+                self._sets_since_sweep = 0
+            conn = self._connect()
+            try:
+                with conn:
+                    # UPSERT (e não REPLACE) para o trigger de tamanho ver a troca de valor
+                    conn.execute(
+                        "INSERT INTO llm_responses (key, value, size, created_at, last_access) "
+                        "VALUES (?, ?, ?, ?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value, "
+                        "size = excluded.size, created_at = excluded.created_at, "
+                        "last_access = excluded.last_access",
+                        (key, value, size, now, now)
+                    )
+                    evicted = self._enforce_limits(conn, now, sweep)
+            finally:
+                conn.close()
+        self._count("sets")
+        if evicted:
+            self._count("evictions", evicted)
+
+    def _enforce_limits(self, conn, now: float, sweep: bool) -> int:
+        if sweep:
+            conn.execute("DELETE FROM llm_responses WHERE created_at <= ?", (now - self.ttl,))
+        total = conn.execute("SELECT total_bytes FROM llm_cache_size").fetchone()[0]
+        evicted = 0
+        while total > self.max_bytes:
+            # Remove as acessadas há mais tempo, em pequenos lotes pelo índice de acesso
+            oldest = conn.execute(
+                "SELECT key, size FROM llm_responses ORDER BY last_access ASC LIMIT 32").fetchall()
+            if not oldest:
+                break
+            for key, size in oldest:
+                if total <= self.max_bytes:
+                    break
+                conn.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+                total -= size
+                evicted += 1
+        return evicted
+
+
+class InMemoryKeyValueStore:
+    """
+    Substituto local de um armazenamento chave-valor estilo Redis (get, set com ex, delete).
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and time.time() >= expires_at:
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value, ex=None):
+        with self._lock:
+            self._data[key] = (value, time.time() + ex if ex else None)
+        return True
+
+    def delete(self, key):
+        with self._lock:
+            return 1 if self._data.pop(key, None) is not None else 0
+
+
+class KeyValueResponseCache(ResponseCacheBackend):
+    """
+    Cache em um armazenamento chave-valor compartilhado (ex: Redis).
+
+    O TTL é repassado ao armazenamento na gravação (expiração nativa). O limite total
+    de memória fica a cargo do servidor (ex: maxmemory com allkeys-lru); aqui é
+    aplicado o limite por entrada.
+    """
+
+    def __init__(self, store, ttl: float, max_entry_bytes: int = 1024 * 1024, prefix: str = "llm:"):
+        super().__init__(ttl)
+        self.store = store
+        self.max_entry_bytes = max_entry_bytes
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.store.get(self.prefix + key)
+        if value is None:
+            self._count("misses")
+            return None
+        self._count("hits")
+        return value.decode("utf-8") if isinstance(value, bytes) else value
+
+    def set(self, key: str, value: str):
+        if len(value.encode("utf-8")) > self.max_entry_bytes:
+            return
+        self.store.set(self.prefix + key, value, ex=int(self.ttl))
+        self._count("sets")
+
+
+def create_response_cache(backend: str, ttl: float, path: str = None, max_entries: int = 1000,
+                          max_bytes: int = None, max_entry_bytes: int = None,
+                          redis_url: str = None) -> ResponseCacheBackend:
+    """
+    Cria o backend de cache de respostas.
+
+    Args:
+        backend: "memory", "sqlite" ou "redis"
+        ttl: Validade das entradas, em segundos
+        path: Arquivo do backend "sqlite"
+        max_entries: Limite de entradas do backend "memory"
+        max_bytes: Limite total de bytes dos backends "memory" e "sqlite"
+        max_entry_bytes: Tamanho máximo de cada resposta no backend "redis"
+        redis_url: URL do servidor para o backend "redis"
+    """
+    if backend == "memory":
+        return MemoryResponseCache(ttl, max_entries=max_entries, max_bytes=max_bytes)
+    if backend == "sqlite":
+        return SQLiteResponseCache(path, ttl, max_bytes=max_bytes or 256 * 1024 * 1024)
+    if backend == "redis":
+        try:
+            import redis
+        except ImportError as e:
+            raise ImportError("O backend de cache 'redis' requer o pacote redis: pip install redis") from e
+        return KeyValueResponseCache(
+            redis.Redis.from_url(redis_url),
+            ttl,
+            max_entry_bytes=max_entry_bytes or 1024 * 1024
+        )
+    raise ValueError(f"Backend de cache desconhecido: '{backend}'. Opções: memory, sqlite, redis")
@@ -1,13 +1,26 @@
 # app/llm_integration.py
 import os
-from openai import OpenAI
+import queue
+import contextlib
+import concurrent.futures
+import asyncio
+import threading
+import weakref
 
-client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
 import json
 import time
 import hashlib
-from typing import Dict, List, Optional, Union, Any
-from collections import OrderedDict
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple, Union, Any
+from app import config
+from app.llm_cache import LRUCache, MemoryResponseCache, create_response_cache
+from app.single_flight import AsyncSingleFlight
+from app.llm_resilience import LLMError, call_with_retries, classify_error, get_circuit_states
+from app.llm_rate_limit import estimate_prompt_tokens, get_rate_limiter
+from app.llm_routing import get_router
+from app.llm_transport import create_client
+from app.usage_ledger import caller_context, get_usage_ledger, usage_tags
+from app.structured_output import (IncrementalJSONParser, StructuredOutputError, conform, format_path, get_at,
+                                   parse_json, reask_prompt, repair_units, schema_at, set_at, validate)
 
 # Configuração da API
 
@@ -29,40 +42,167 @@ TEACHING_STYLES = {
 }
 
 
-# Sistema de cache com limite de tamanho
-class LRUCache:
-    """Cache LRU (Least Recently Used) com limite de tamanho."""
+# Cache para respostas de LLM
+# Chave: hash do prompt e parâmetros, Valor: resposta (TTL e limites aplicados pelo backend)
+# Tempo máximo de cache (24 horas)
+CACHE_TTL = 24 * 60 * 60  # em segundos
+
+_response_cache = create_response_cache(
+    config.LLM_CACHE_BACKEND,
+    ttl=CACHE_TTL,
+    path=config.LLM_CACHE_PATH,
+    max_entries=config.LLM_CACHE_MAX_ENTRIES,
+    max_bytes=config.LLM_CACHE_MAX_BYTES,
+    max_entry_bytes=config.LLM_CACHE_MAX_ENTRY_BYTES,
+    redis_url=config.LLM_CACHE_REDIS_URL
+)
+
+
+# Deduplicação de requisições em andamento (mesma chave de cache = uma única chamada à API)
+_in_flight = AsyncSingleFlight(
+    lock_dir=config.LLM_SINGLE_FLIGHT_LOCK_DIR if config.LLM_SINGLE_FLIGHT_CROSS_PROCESS else None
+)
+
+
+def get_response_cache_stats() -> Dict[str, Any]:
+    """Retorna os contadores do cache de respostas (acertos, erros, taxa de acerto...)."""
+    stats = _response_cache.stats()
+    stats["in_flight"] = _in_flight.stats()
+    stats["circuits"] = get_circuit_states()
+    rate_limiter = get_rate_limiter()
+    if rate_limiter:
+        stats["rate_limit"] = rate_limiter.stats()
+    stats["routing"] = get_router().stats()
+    return stats
+
+
+# Recursos assíncronos por event loop: o cliente HTTP e os semáforos ficam presos ao
+# loop em que foram criados, então cada loop (o de fundo das funções síncronas ou o
+# de uma aplicação assíncrona) tem os seus.
+_loop_resources = weakref.WeakKeyDictionary()
+
+# Fábrica do cliente (ver set_client_factory); None = app.llm_transport.create_client
+_client_factory = None
+
+
+def set_client_factory(factory: Callable[[], Any] = None):
+    """
+    Injeta a fábrica do cliente do LLM (ex: um ReplayClient em testes de carga).
+
+    A fábrica é chamada uma vez por event loop e deve devolver um objeto com
+    chat.completions.create(...) assíncrono, como o AsyncOpenAI. Sem argumento,
+    volta ao transporte de config.LLM_TRANSPORT.
+    """
+    global _client_factory
+    _client_factory = factory
+    # Os loops recriam o cliente (e os semáforos) na próxima chamada
+    _loop_resources.clear()
+
+
+def _get_loop_resources() -> Dict[str, Any]:
+    loop = asyncio.get_running_loop()
+    resources = _loop_resources.get(loop)
+    if resources is None:
+        resources = {
+            "client": (_client_factory or create_client)(),
+            "global": asyncio.Semaphore(config.LLM_MAX_CONCURRENCY),
+            "models": {}
+        }
+        _loop_resources[loop] = resources
+    return resources
 
-    def __init__(self, max_size=1000):
-        self.cache = OrderedDict()
-        self.max_size = max_size
 
-    def get(self, key):
-        if key in self.cache:
-            # Mover para o fim (mais recentemente usado)
-            value = self.cache.pop(key)
-            self.cache[key] = value
-            return value
+def _get_model_semaphore(resources: Dict[str, Any], model_name: str) -> Optional[asyncio.Semaphore]:
+    limit = config.LLM_MODEL_CONCURRENCY.get(model_name)
+    if not limit:
         return None
+    if model_name not in resources["models"]:
+        resources["models"][model_name] = asyncio.Semaphore(limit)
+    return resources["models"][model_name]
 
-    def set(self, key, value):
-        if key in self.cache:
-            # Remover para atualizar a posição
-            self.cache.pop(key)
-        elif len(self.cache) >= self.max_size:
-            # Remover o item menos recentemente usado
-            self.cache.popitem(last=False)
 
-        # Adicionar ao final (mais recentemente usado)
-        self.cache[key] = value
+class _BackgroundLoop:
+    """
+    Event loop em uma thread daemon, usado pelas funções síncronas.
 
+    Todas as chamadas síncronas (de qualquer thread) compartilham este loop, seus
+    limites de concorrência e a deduplicação de requisições em andamento.
+    """
 
-# Cache para respostas de LLM
-# Chave: hash do prompt e parâmetros, Valor: (resposta, timestamp)
-_response_cache = LRUCache(max_size=1000)
+    def __init__(self):
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever, name="llm-event-loop", daemon=True
+                )
+                self._thread.start()
+            return self._loop
+
+    def run(self, coro):
+        """Executa a corrotina no loop de fundo e bloqueia até o resultado."""
+        loop = self._ensure_started()
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError("Função síncrona do LLM chamada dentro do event loop; use a versão 'a...'.")
+        # O contexto (usuário e função chamadora do registro de uso) segue para o loop de fundo
+        future = caller_context().run(asyncio.run_coroutine_threadsafe, coro, loop)
+        try:
+            return future.result()
+        except KeyboardInterrupt:
+            # Ctrl+C no CLI: cancela a requisição em andamento
+            future.cancel()
+            raise
+
+    def iterate(self, agen) -> Iterator:
+        """Consome um gerador assíncrono no loop de fundo, entregando os itens a esta thread."""
+        loop = self._ensure_started()
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("Função síncrona do LLM chamada dentro do event loop; use a versão 'a...'.")
+        items = queue.Queue()
+        done = object()
+
+        async def pump():
+            try:
+                async for item in agen:
+                    items.put(item)
+            finally:
+                items.put(done)
+
+        future = caller_context().run(asyncio.run_coroutine_threadsafe, pump(), loop)
+        try:
+            while True:
+                item = items.get()
+                if item is done:
+                    break
+                yield item
+            future.result()  # Propaga erros do gerador
+        finally:
+            # Consumidor parou antes do fim (break, Ctrl+C): encerra o stream
+            if not future.done():
+                future.cancel()
+
+
+_background_loop = _BackgroundLoop()
+
+
+def _run_sync(coro):
+    return _background_loop.run(coro)
+
+
+def submit_background(coro) -> concurrent.futures.Future:
+    """
+    Agenda a corrotina no event loop de fundo sem bloquear.
 
-# Tempo máximo de cache (24 horas)
-CACHE_TTL = 24 * 60 * 60  # em segundos
+    Returns:
+        Future cujo cancel() também cancela a corrotina (e a requisição em andamento)
+    """
+    return caller_context().run(asyncio.run_coroutine_threadsafe, coro, _background_loop._ensure_started())
 
 
 class LessonContent:
@@ -143,60 +283,41 @@ def get_cache_key(content: str, **kwargs) -> str:
     return hashlib.md5(combined.encode('utf-8')).hexdigest()
 
 
-def call_teacher_llm(user_content: str,
-                     student_age: Union[int, List[int]] = None,
-                     subject_area: str = None,
-                     teaching_style: str = "didático",
-                     knowledge_level: str = "iniciante",
-                     temperature: float = 0.7,
-                     model: str = "default",
-                     max_tokens: int = 1500,
-                     user_id: str = None,
-                     use_cache: bool = True) -> str:
-    """
-    Chama a API da OpenAI para gerar conteúdo pedagógico adaptado.
+def _teacher_cache_key(user_content: str, age_range: str, subject_area: str, teaching_style: str,
+                       knowledge_level: str, model: str, json_mode: bool = False) -> str:
+    # json_mode só entra na chave quando ativo, para manter as chaves já existentes
+    extra = {"json_mode": True} if json_mode else {}
+    return get_cache_key(
+        user_content,
+        student_age=age_range,
+        subject_area=subject_area,
+        teaching_style=teaching_style,
+        knowledge_level=knowledge_level,
+        model=model,
+        **extra
+    )
 
-    Args:
-        user_content: O conteúdo/pergunta do usuário
-        student_age: Idade(s) do(s) aluno(s) alvo
-        subject_area: Área de conhecimento (ex: matemática, ciências)
-        teaching_style: Estilo de ensino (didático, socrático, storytelling, etc)
-        knowledge_level: Nível de conhecimento (iniciante, intermediário, avançado)
-        temperature: Controle de criatividade (0.0 a 1.0)
-        model: Modelo a ser usado (default, fast, advanced)
-        max_tokens: Limite máximo de tokens na resposta
-        user_id: ID do usuário para personalização contínua
-        use_cache: Se deve usar cache para respostas anteriores
 
-    Returns:
-        Conteúdo educacional gerado
-    """
-    # Normaliza a idade para string
-    if isinstance(student_age, list):
-        age_range = f"{min(student_age)}-{max(student_age)}"
-    elif isinstance(student_age, int):
-        age_range = str(student_age)
-    else:
-        age_range = "11-17"  # Padrão
+async def _cache_get(cache_key: str) -> Optional[str]:
+    # Backends em disco/rede bloqueiam: executa fora do event loop
+    if isinstance(_response_cache, MemoryResponseCache):
+        return _response_cache.get(cache_key)
+    return await asyncio.to_thread(_response_cache.get, cache_key)
 
-    # Verificar cache se habilitado
-    if use_cache:
-        cache_key = get_cache_key(
-            user_content,
-            student_age=age_range,
-            subject_area=subject_area,
-            teaching_style=teaching_style,
-            knowledge_level=knowledge_level,
-            model=model
-        )
-        cached = _response_cache.get(cache_key)
 
-        if cached:
-            response, timestamp = cached
-            # Verificar se o cache ainda é válido
-            if time.time() - timestamp < CACHE_TTL:
-                return response
+async def _cache_set(cache_key: str, content: str):
+    if isinstance(_response_cache, MemoryResponseCache):
+        _response_cache.set(cache_key, content)
+    else:
+        await asyncio.to_thread(_response_cache.set, cache_key, content)
+
 
+def build_teacher_messages(user_content: str,
+                           age_range: str,
+                           subject_area: str = None,
+                           teaching_style: str = "didático",
+                           knowledge_level: str = "iniciante") -> List[Dict[str, str]]:
+    """Monta as mensagens (prompt do sistema do professor + conteúdo do usuário)."""
     # Construir o prompt do sistema
     system_prompt = (
         f"Você é um professor experiente especializado em {subject_area or 'diversas áreas'}. "
@@ -245,59 +366,742 @@ def call_teacher_llm(user_content: str,
             "- Forneça passos claros para implementação\n"
         )
 
-    messages = [
+    return [
         {"role": "system", "content": system_prompt},
         {"role": "user", "content": user_content}
     ]
 
-    # Selecionar o modelo apropriado
-    selected_model = MODELS.get(model, MODELS["default"])
 
-    # Realizar a chamada à API
-    try:
-        response = client.chat.completions.create(model=selected_model,
-        messages=messages,
-        temperature=temperature,
-        max_tokens=max_tokens)
+# Início do texto devolvido no lugar do conteúdo quando a chamada à API falha
+ERROR_RESPONSE_PREFIX = "Ocorreu um erro ao gerar o conteúdo."
+
+
+def _error_response(error: Exception) -> str:
+    return f"{ERROR_RESPONSE_PREFIX} Por favor, tente novamente mais tarde. Detalhes: {str(error)[:100]}..."
+
+
+def is_error_response(text: str) -> bool:
+    """Indica se o texto é a mensagem de erro devolvida por call_teacher_llm (e não conteúdo)."""
+    return text.startswith(ERROR_RESPONSE_PREFIX)
+
+
+def _normalize_age(student_age: Union[int, List[int]]) -> str:
+    # Normaliza a idade para string
+    if isinstance(student_age, list):
+        return f"{min(student_age)}-{max(student_age)}"
+    elif isinstance(student_age, int):
+        return str(student_age)
+    return "11-17"  # Padrão
+
+
+@contextlib.asynccontextmanager
+async def _concurrency_slot(model_name: str):
+    """Ocupa uma vaga no limite global e no limite do modelo; devolve o cliente do loop."""
+    resources = _get_loop_resources()
+    model_semaphore = _get_model_semaphore(resources, model_name)
+    async with resources["global"]:
+        if model_semaphore is None:
+            yield resources["client"]
+        else:
+            async with model_semaphore:
+                yield resources["client"]
+
+
+def _select_tier(model: Optional[str], task: Optional[str], messages: List[Dict[str, str]],
+                 max_tokens: int, structured: bool, latency_slo_ms: Optional[float]) -> str:
+    """Nível de MODELS da chamada: o informado em model ou, sem ele, o escolhido pelo roteador."""
+    if model:
+        return model
+    if task is None and not structured and latency_slo_ms is None:
+        return "default"
+    return get_router().route(task, estimate_prompt_tokens(messages), max_tokens, structured, latency_slo_ms)
+
+
+def _response_format(json_mode: bool) -> Dict[str, Any]:
+    """Argumento response_format da API (modo JSON), se ativo e permitido em config.LLM_JSON_MODE."""
+    if json_mode and config.LLM_JSON_MODE:
+        return {"response_format": {"type": "json_object"}}
+    return {}
+
+
+def _record_usage(tier: str, model_name: str, task: Optional[str], latency_s: float, prompt_tokens: int,
+                  completion_tokens: int, usage: Optional[Dict[str, Optional[str]]], estimated: bool = False):
+    """Latência, tokens, usuário e função chamadora de uma resposta para o roteador (e seu JSONL)."""
+    usage = usage or usage_tags()
+    cost = get_router().record(tier, model_name, task, latency_s, prompt_tokens, completion_tokens,
+                               usage["user_id"], usage["caller"], estimated)
+    get_usage_ledger().record(usage["user_id"], prompt_tokens + completion_tokens, cost)
+
+
+async def _budget_tier(tier: str, user_id: Optional[str], use_cache: bool,
+                       cache_key_for: Callable[[str], str]) -> Tuple[str, Optional[str]]:
+    """
+    Nível da chamada considerando o orçamento diário do usuário (config.USAGE_DAILY_*).
+
+    Acima do orçamento, serve a resposta já em cache para o nível escolhido ou,
+    sem ela, rebaixa a chamada para "fast".
+
+    Returns:
+        (nível, resposta em cache ou None)
+    """
+    ledger = get_usage_ledger()
+    if tier == "fast" or user_id is None or not ledger.has_budget:
+        return tier, None
+    # Os totais vêm do JSONL compartilhado: a leitura roda fora do event loop
+    if not await asyncio.to_thread(ledger.over_budget, user_id):
+        return tier, None
+    ledger.note_degraded(user_id)
+    if use_cache:
+        cached = await _cache_get(cache_key_for(tier))
+        if cached is not None:
+            return tier, cached
+    return "fast", None
+
+
+async def _create_completion(model_name: str, messages: List[Dict[str, str]],
+                             temperature: float, max_tokens: int,
+                             tier: str = "default", task: str = None, json_mode: bool = False,
+                             usage: Dict[str, Optional[str]] = None) -> str:
+    """
+    Faz a requisição respeitando o limite global e o limite do modelo, com novas
+    tentativas e circuit breaker (levanta LLMError quando não há resposta).
+    A latência e o uso de tokens da tentativa bem-sucedida vão para o roteador e
+    para o registro de uso (usage: usuário e função chamadora, ver usage_tags).
+    """
+    rate_limiter = get_rate_limiter()
+    prompt_tokens = estimate_prompt_tokens(messages)
+    estimated_tokens = prompt_tokens + max_tokens
+
+    async def attempt() -> str:
+        # Cada tentativa espera a vez no orçamento de requisições/tokens do modelo
+        if rate_limiter:
+            await rate_limiter.acquire(model_name, estimated_tokens)
+        # A vaga é liberada entre as tentativas, durante o backoff
+        async with _concurrency_slot(model_name) as client:
+            started = time.perf_counter()
+            response = await client.chat.completions.create(
+                model=model_name, messages=messages, temperature=temperature, max_tokens=max_tokens,
+                **_response_format(json_mode)
+            )
+            latency = time.perf_counter() - started
         content = response.choices[0].message.content
+        reported = getattr(response, "usage", None)
+        if rate_limiter:
+            await rate_limiter.settle(model_name, estimated_tokens, getattr(reported, "total_tokens", None))
+        _record_usage(
+            tier, model_name, task, latency,
+            getattr(reported, "prompt_tokens", None) or prompt_tokens,
+            getattr(reported, "completion_tokens", None) or len(content or "") // 4,
+            usage, estimated=reported is None
+        )
+        return content
+
+    return await call_with_retries(attempt, model_name)
+
+
+async def acached_teacher_llm(user_content: str,
+                              student_age: Union[int, List[int]] = None,
+                              subject_area: str = None,
+                              teaching_style: str = "didático",
+                              knowledge_level: str = "iniciante",
+                              model: str = None,
+                              max_tokens: int = 1500,
+                              task: str = None,
+                              structured: bool = False,
+                              latency_slo_ms: float = None) -> Optional[str]:
+    """Retorna a resposta em cache para os mesmos argumentos de call_teacher_llm, sem chamar a API."""
+    age_range = _normalize_age(student_age)
+    messages = build_teacher_messages(user_content, age_range, subject_area, teaching_style, knowledge_level)
+    tier = _select_tier(model, task, messages, max_tokens, structured, latency_slo_ms)
+    return await _cache_get(_teacher_cache_key(user_content, age_range, subject_area,
+                                               teaching_style, knowledge_level, tier))
+
+
+async def acall_teacher_llm(user_content: str,
+                            student_age: Union[int, List[int]] = None,
+                            subject_area: str = None,
+                            teaching_style: str = "didático",
+                            knowledge_level: str = "iniciante",
+                            temperature: float = 0.7,
+                            model: str = None,
+                            max_tokens: int = 1500,
+                            task: str = None,
+                            structured: bool = False,
+                            latency_slo_ms: float = None,
+                            json_mode: bool = False,
+                            user_id: str = None,
+                            use_cache: bool = True,
+                            raise_errors: bool = False) -> str:
+    """
+    Versão assíncrona de call_teacher_llm (mesmos argumentos e mesmo cache).
+
+    As requisições respeitam config.LLM_MAX_CONCURRENCY e o limite por modelo de
+    config.LLM_MODEL_CONCURRENCY. Cancelar a tarefa cancela a requisição, exceto
+    quando outras chamadas com o mesmo prompt ainda aguardam o resultado.
+    """
+    age_range = _normalize_age(student_age)
+    messages = build_teacher_messages(user_content, age_range, subject_area, teaching_style, knowledge_level)
+
+    usage = usage_tags(user_id)
+
+    # Selecionar o modelo apropriado (rebaixado se o usuário passou do orçamento diário)
+    tier = _select_tier(model, task, messages, max_tokens, structured, latency_slo_ms)
+    tier, cached = await _budget_tier(tier, usage["user_id"], use_cache, lambda budget_tier: _teacher_cache_key(
+        user_content, age_range, subject_area, teaching_style, knowledge_level, budget_tier, json_mode))
+    if cached is not None:
+        return cached
+    selected_model = MODELS.get(tier, MODELS["default"])
+
+    # Verificar cache se habilitado
+    if use_cache:
+        cache_key = _teacher_cache_key(user_content, age_range, subject_area, teaching_style,
+                                       knowledge_level, tier, json_mode)
+        # O backend só devolve entradas dentro do CACHE_TTL
+        cached = await _cache_get(cache_key)
+        if cached is not None:
+            return cached
+
+    async def fetch() -> str:
+        # Realizar a chamada à API (erros chegam como LLMError e nunca vão para o cache)
+        content = await _create_completion(selected_model, messages, temperature, max_tokens, tier, task,
+                                           json_mode, usage)
 
         # Guardar no cache se habilitado
         if use_cache:
-            _response_cache.set(cache_key, (content, time.time()))
-
+            await _cache_set(cache_key, content)
         return content
-    except Exception as e:
+
+    try:
+        if not use_cache:
+            return await fetch()
+
+        # Chamadas simultâneas com o mesmo prompt aguardam uma única requisição
+        return await _in_flight.do(cache_key, fetch, recheck=lambda: _cache_get(cache_key))
+    except LLMError as e:
+        if raise_errors:
+            raise
         print(f"Erro ao chamar a API: {e}")
-        return f"Ocorreu um erro ao gerar o conteúdo. Por favor, tente novamente mais tarde. Detalhes: {str(e)[:100]}..."
+        return _error_response(e)
 
 
-def generate_complete_lesson(topic: str,
-                             subject_area: str,
-                             age_range: Union[int, List[int]] = None,
-                             knowledge_level: str = "iniciante",
-                             teaching_style: str = "didático",
-                             lesson_duration_min: int = 30) -> LessonContent:
+def call_teacher_llm(user_content: str,
+                     student_age: Union[int, List[int]] = None,
+                     subject_area: str = None,
+                     teaching_style: str = "didático",
+                     knowledge_level: str = "iniciante",
+                     temperature: float = 0.7,
+                     model: str = None,
+                     max_tokens: int = 1500,
+                     task: str = None,
+                     structured: bool = False,
+                     latency_slo_ms: float = None,
+                     json_mode: bool = False,
+                     user_id: str = None,
+                     use_cache: bool = True,
+                     stream: bool = False,
+                     raise_errors: bool = False) -> Union[str, Iterator[str]]:
     """
-    Gera uma aula completa sobre um tópico específico.
+    Chama a API da OpenAI para gerar conteúdo pedagógico adaptado.
 
     Args:
-        topic: Tópico específico da aula
-        subject_area: Área/disciplina geral
-        age_range: Idade(s) do público-alvo
+        user_content: O conteúdo/pergunta do usuário
+        student_age: Idade(s) do(s) aluno(s) alvo
+        subject_area: Área de conhecimento (ex: matemática, ciências)
+        teaching_style: Estilo de ensino (didático, socrático, storytelling, etc)
         knowledge_level: Nível de conhecimento (iniciante, intermediário, avançado)
-        teaching_style: Estilo de ensino preferido
-        lesson_duration_min: Duração aproximada da aula em minutos
+        temperature: Controle de criatividade (0.0 a 1.0)
+        model: Modelo a ser usado (default, fast, advanced); se omitido, o nível é
+            escolhido por app.llm_routing a partir dos argumentos abaixo ("default"
+            quando nenhum é informado)
+        max_tokens: Limite máximo de tokens na resposta
+        task: Tipo de tarefa para o roteamento (ex: "extraction", "grading", "lesson")
+        structured: Se a resposta precisa seguir um esquema JSON
+        latency_slo_ms: Latência máxima desejada; pode levar a um nível mais rápido
+        json_mode: Pede à API uma resposta em JSON (response_format json_object); o
+            prompt precisa mencionar JSON
+        user_id: ID do usuário para personalização contínua
+        use_cache: Se deve usar cache para respostas anteriores
+        stream: Se True, devolve um iterador com os trechos do texto à medida que
+            chegam (ver stream_teacher_llm)
+        raise_errors: Se True, levanta LLMError em vez de devolver a mensagem de erro
+            como texto
 
     Returns:
-        Um objeto LessonContent com a aula estruturada
+        Conteúdo educacional gerado (ou, com stream=True, um iterador dos trechos)
+    """
+    if stream:
+        return stream_teacher_llm(
+            user_content,
+            student_age=student_age,
+            subject_area=subject_area,
+            teaching_style=teaching_style,
+            knowledge_level=knowledge_level,
+            temperature=temperature,
+            model=model,
+            max_tokens=max_tokens,
+            task=task,
+            structured=structured,
+            latency_slo_ms=latency_slo_ms,
+            json_mode=json_mode,
+            user_id=user_id,
+            use_cache=use_cache
+        )
+
+    return _run_sync(acall_teacher_llm(
+        user_content,
+        student_age=student_age,
+        subject_area=subject_area,
+        teaching_style=teaching_style,
+        knowledge_level=knowledge_level,
+        temperature=temperature,
+        model=model,
+        max_tokens=max_tokens,
+        task=task,
+        structured=structured,
+        latency_slo_ms=latency_slo_ms,
+        json_mode=json_mode,
+        user_id=user_id,
+        use_cache=use_cache,
+        raise_errors=raise_errors
+    ))
+
+
+async def astream_teacher_llm(user_content: str,
+                              student_age: Union[int, List[int]] = None,
+                              subject_area: str = None,
+                              teaching_style: str = "didático",
+                              knowledge_level: str = "iniciante",
+                              temperature: float = 0.7,
+                              model: str = None,
+                              max_tokens: int = 1500,
+                              task: str = None,
+                              structured: bool = False,
+                              latency_slo_ms: float = None,
+                              json_mode: bool = False,
+                              user_id: str = None,
+                              use_cache: bool = True) -> AsyncIterator[str]:
+    """
+    Versão em streaming de acall_teacher_llm: produz os trechos do texto à medida
+    que a API os envia.
+
+    Em um acerto de cache, o texto inteiro é produzido de uma vez. O texto completo
+    só é gravado no cache (na mesma chave de call_teacher_llm) quando o stream
+    termina sem erro nem cancelamento.
+    """
+    age_range = _normalize_age(student_age)
+    messages = build_teacher_messages(user_content, age_range, subject_area, teaching_style, knowledge_level)
+    usage = usage_tags(user_id)
+    tier = _select_tier(model, task, messages, max_tokens, structured, latency_slo_ms)
+    tier, cached = await _budget_tier(tier, usage["user_id"], use_cache, lambda budget_tier: _teacher_cache_key(
+        user_content, age_range, subject_area, teaching_style, knowledge_level, budget_tier, json_mode))
+    if cached is not None:
+        yield cached
+        return
+    selected_model = MODELS.get(tier, MODELS["default"])
+
+    if use_cache:
+        cache_key = _teacher_cache_key(user_content, age_range, subject_area, teaching_style,
+                                       knowledge_level, tier, json_mode)
+        cached = await _cache_get(cache_key)
+        if cached is None:
+            # Uma chamada não-streaming do mesmo prompt (ex: pré-carregamento) já está em
+            # andamento: aguarda o resultado dela em vez de repetir a requisição
+            cached = await _in_flight.join(cache_key)
+        if cached is not None:
+            yield cached
+            return
+
+    rate_limiter = get_rate_limiter()
+    prompt_tokens = estimate_prompt_tokens(messages)
+    reserved_tokens = prompt_tokens + max_tokens
+    acquired = False
+    parts = []
+    try:
+        if rate_limiter:
+            await rate_limiter.acquire(selected_model, reserved_tokens)
+            acquired = True
+        async with _concurrency_slot(selected_model) as client:
+            started = time.perf_counter()
+            # Novas tentativas só até o stream abrir (a vaga fica ocupada durante o backoff)
+            response = await call_with_retries(
+                lambda: client.chat.completions.create(
+                    model=selected_model, messages=messages, temperature=temperature,
+                    max_tokens=max_tokens, stream=True, **_response_format(json_mode)
+                ),
+                selected_model
+            )
+            async for chunk in response:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    parts.append(delta)
+                    yield delta
+    except Exception as e:
+        error = classify_error(e)
+        print(f"Erro ao chamar a API: {error}")
+        yield _error_response(error)
+        return
+    finally:
+        # Devolve ao balde a reserva não usada, também em erro ou cancelamento (uso estimado pelo texto)
+        if acquired:
+            await rate_limiter.settle(selected_model, reserved_tokens,
+                                      prompt_tokens + len("".join(parts)) // 4)
+
+    # Sem o uso informado pela API no streaming: tokens da resposta estimados pelo tamanho
+    text = "".join(parts)
+    _record_usage(tier, selected_model, task, time.perf_counter() - started,
+                  prompt_tokens, len(text) // 4, usage, estimated=True)
+
+    if use_cache and parts:
+        await _cache_set(cache_key, text)
+
+
+def stream_teacher_llm(user_content: str,
+                       student_age: Union[int, List[int]] = None,
+                       subject_area: str = None,
+                       teaching_style: str = "didático",
+                       knowledge_level: str = "iniciante",
+                       temperature: float = 0.7,
+                       model: str = None,
+                       max_tokens: int = 1500,
+                       task: str = None,
+                       structured: bool = False,
+                       latency_slo_ms: float = None,
+                       json_mode: bool = False,
+                       user_id: str = None,
+                       use_cache: bool = True) -> Iterator[str]:
     """
+    Versão síncrona de astream_teacher_llm (mesmos argumentos de call_teacher_llm).
+
+    Returns:
+        Iterador com os trechos do texto gerado; interromper a iteração encerra a
+        requisição
+    """
+    return _background_loop.iterate(astream_teacher_llm(
+        user_content,
+        student_age=student_age,
+        subject_area=subject_area,
+        teaching_style=teaching_style,
+        knowledge_level=knowledge_level,
+        temperature=temperature,
+        model=model,
+        max_tokens=max_tokens,
+        task=task,
+        structured=structured,
+        latency_slo_ms=latency_slo_ms,
+        json_mode=json_mode,
+        user_id=user_id,
+        use_cache=use_cache
+    ))
+
+
+async def _afetch_json(prompt: str, on_item: Optional[Callable[[Tuple, Any], None]],
+                       llm_kwargs: Dict[str, Any]) -> Any:
+    """Pede a resposta em modo JSON e a converte (em streaming quando há on_item)."""
+    if on_item is None:
+        text = await acall_teacher_llm(prompt, structured=True, json_mode=True, raise_errors=True, **llm_kwargs)
+        return parse_json(text)
+
+    parser = IncrementalJSONParser()
+    async for chunk in astream_teacher_llm(prompt, structured=True, json_mode=True, **llm_kwargs):
+        if is_error_response(chunk):
+            raise LLMError(chunk)
+        for path, value in parser.feed(chunk):
+            if path:
+                on_item(path, value)
+    return parser.result()
+
+
+async def _areask_json(prompt: str, schema: Dict, data: Any, unit: Tuple, messages: List[str],
+                       llm_kwargs: Dict[str, Any]) -> Any:
+    """Pede de novo só o trecho unit do JSON; devolve o valor corrigido ou None."""
+    wrapper = {"type": "object", "required": ["valor"], "properties": {"valor": schema_at(schema, unit)}}
+    try:
+        text = await acall_teacher_llm(
+            reask_prompt(prompt, unit, messages, get_at(data, unit), wrapper["properties"]["valor"]),
+            structured=True, json_mode=True, raise_errors=True, **llm_kwargs
+        )
+        answer = conform(parse_json(text), wrapper)
+    except (LLMError, ValueError) as e:
+        # Falha na chamada ou resposta ilegível: o trecho fica como estava (sem perder os demais)
+        print(f"Erro ao corrigir o trecho {format_path(unit)}: {e}")
+        return None
+    if validate(answer, wrapper):
+        return None
+    return answer["valor"]
+
+
+async def agenerate_json(prompt: str,
+                         schema: Dict[str, Any],
+                         on_item: Callable[[Tuple, Any], None] = None,
+                         max_reasks: int = None,
+                         **llm_kwargs) -> Any:
+    """
+    Gera uma resposta JSON validada contra o esquema.
+
+    A resposta é pedida em modo JSON, reparada (cercas, comentários, vírgulas finais,
+    texto cortado) e validada. Se algum trecho ficar inválido ou faltando, só esse
+    trecho (ex: um item de weekly_plan) é pedido de novo, em paralelo, e encaixado
+    no resultado, em até max_reasks rodadas.
+
+    Args:
+        prompt: Prompt que descreve o JSON esperado
+        schema: Esquema (subconjunto de JSON Schema, ver app.structured_output)
+        on_item: Se informado, a resposta vem em streaming e on_item(caminho, valor)
+            é chamado para cada campo da raiz e item de lista da raiz assim que fica
+            completo (ex: (("weekly_plan", 0), {...}))
+        max_reasks: Rodadas de correção (padrão: config.STRUCTURED_MAX_REASKS)
+        **llm_kwargs: Argumentos de acall_teacher_llm (teaching_style, max_tokens, task...)
+
+    Returns:
+        O valor validado
+
+    Raises:
+        LLMError: Falha na chamada principal à API
+        StructuredOutputError: O JSON continuou inválido após as correções
+    """
+    max_reasks = config.STRUCTURED_MAX_REASKS if max_reasks is None else max_reasks
+    data = await _afetch_json(prompt, on_item, llm_kwargs)
+
+    for round_number in range(max_reasks + 1):
+        data = conform(data, schema)
+        errors = validate(data, schema)
+        if not errors:
+            return data
+        if round_number == max_reasks:
+            break
+
+        units = repair_units(errors)
+        print(f"Resposta JSON com {len(errors)} problema(s); refazendo: "
+              f"{', '.join(format_path(unit) for unit in units)}")
+        fixes = await asyncio.gather(*(
+            _areask_json(prompt, schema, data, unit, messages, llm_kwargs) for unit, messages in units.items()
+        ))
+        for unit, fix in zip(units, fixes):
+            if fix is not None:
+                data = set_at(data, unit, fix)
+
+    raise StructuredOutputError(
+        "JSON inválido: " + "; ".join(f"{format_path(path)}: {message}" for path, message in errors[:5]),
+        errors
+    )
+
+
+def generate_json(prompt: str,
+                  schema: Dict[str, Any],
+                  on_item: Callable[[Tuple, Any], None] = None,
+                  max_reasks: int = None,
+                  **llm_kwargs) -> Any:
+    """Versão síncrona de agenerate_json (on_item é chamado na thread do event loop de fundo)."""
+    return _run_sync(agenerate_json(prompt, schema, on_item=on_item, max_reasks=max_reasks, **llm_kwargs))
+
+
+# Esquemas das respostas JSON dos geradores abaixo
+LESSON_SCHEMA = {
+    "type": "object",
+    "required": ["title", "introduction", "main_content", "summary"],
+    "properties": {
+        "title": {"type": "string", "minLength": 1, "description": "Título da aula"},
+        "introduction": {"type": "string", "minLength": 1, "description": "Introdução da aula"},
+        "main_content": {
+            "type": "array",
+            "minItems": 1,
+            "items": {
+                "type": "object",
+                "required": ["subtitle", "content"],
+                "properties": {
+                    "subtitle": {"type": "string", "description": "Subtítulo da seção"},
+                    "content": {"type": "string", "minLength": 1, "description": "Conteúdo da seção"}
+                }
+            }
+        },
+        "examples": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "required": ["title", "content"],
+                "properties": {
+                    "title": {"type": "string", "description": "Título do exemplo"},
+                    "content": {"type": "string", "description": "Descrição do exemplo"}
+                }
+            }
+        },
+        "activities": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "required": ["title", "description"],
+                "properties": {
+                    "title": {"type": "string", "description": "Nome da atividade"},
+                    "description": {"type": "string", "description": "Instruções da atividade"}
+                }
+            }
+        },
+        "summary": {"type": "string", "minLength": 1, "description": "Resumo da aula"}
+    }
+}
+
+_OUTLINE_ITEM = {
+    "type": "object",
+    "required": ["title"],
+    "properties": {
+        "title": {"type": "string", "minLength": 1, "description": "Título"},
+        "focus": {"type": "string", "description": "O que deve ser abordado (1 frase)"}
+    }
+}
+
+# Roteiro da aula gerada por seções (ver agenerate_complete_lesson)
+LESSON_OUTLINE_SCHEMA = {
+    "type": "object",
+    "required": ["title", "sections"],
+    "properties": {
+        "title": {"type": "string", "minLength": 1, "description": "Título da aula"},
+        "sections": {
+            "type": "array",
+            "minItems": 1,
+            "maxItems": 6,
+            "items": {
+                "type": "object",
+                "required": ["subtitle"],
+                "properties": {
+                    "subtitle": {"type": "string", "minLength": 1, "description": "Subtítulo da seção"},
+                    "focus": {"type": "string", "description": "O que a seção deve cobrir (1 frase)"}
+                }
+            }
+        },
+        "examples": {"type": "array", "maxItems": 4, "items": _OUTLINE_ITEM},
+        "activities": {"type": "array", "maxItems": 4, "items": _OUTLINE_ITEM}
+    }
+}
+
+ASSESSMENT_SCHEMA = {
+    "type": "object",
+    "required": ["title", "questions"],
+    "properties": {
+        "title": {"type": "string", "description": "Título da avaliação"},
+        "questions": {
+            "type": "array",
+            "minItems": 1,
+            "items": {
+                "type": "object",
+                "required": ["type", "text"],
+                "properties": {
+                    "type": {"type": "string", "description": "múltipla escolha, verdadeiro/falso ou dissertativa"},
+                    "text": {"type": "string", "minLength": 1, "description": "Texto da pergunta"},
+                    "options": {"type": "array", "items": {"type": "string", "description": "Alternativa"}},
+                    "correct_answer": {"type": ["integer", "boolean", "string"]},
+                    "explanation": {"type": "string", "description": "Explicação da resposta correta"},
+                    "sample_answer": {"type": "string", "description": "Exemplo de resposta adequada"},
+                    "key_points": {"type": "array", "items": {"type": "string", "description": "Ponto chave"}}
+                }
+            }
+        }
+    }
+}
+
+ESSAY_GRADING_SCHEMA = {
+    "type": "object",
+    "required": ["grades"],
+    "properties": {
+        "grades": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "required": ["question", "approved", "feedback"],
+                "properties": {
+                    "question": {"type": "integer", "minimum": 1, "description": "Número da questão"},
+                    "approved": {"type": "boolean", "description": "Se a resposta é satisfatória"},
+                    "feedback": {"type": "string", "minLength": 1, "description": "Feedback construtivo"}
+                }
+            }
+        }
+    }
+}
+
+PATHWAY_SCHEMA = {
+    "type": "object",
+    "required": ["title", "description", "weekly_plan", "final_project", "additional_resources"],
+    "properties": {
+        "title": {"type": "string", "description": "Título do roteiro"},
+        "description": {"type": "string", "description": "Descrição do objetivo geral"},
+        "weekly_plan": {
+            "type": "array",
+            "minItems": 1,
+            "items": {
+                "type": "object",
+                "required": ["week", "focus", "objectives", "activities", "assessment"],
+                "properties": {
+                    "week": {"type": "integer", "minimum": 1},
+                    "focus": {"type": "string", "description": "Foco principal da semana"},
+                    "objectives": {"type": "array", "items": {"type": "string", "description": "Objetivo"}},
+                    "activities": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "required": ["title", "description", "duration_minutes"],
+                            "properties": {
+                                "title": {"type": "string", "description": "Título da atividade"},
+                                "description": {"type": "string", "description": "Descrição detalhada"},
+                                "duration_minutes": {"type": "integer", "minimum": 1},
+                                "resources": {"type": "array", "items": {"type": "string", "description": "Recurso"}}
+                            }
+                        }
+                    },
+                    "assessment": {"type": "string", "description": "Como avaliar o progresso da semana"}
+                }
+            }
+        },
+        "final_project": {"type": "string", "description": "Projeto final"},
+        "additional_resources": {"type": "array", "items": {"type": "string", "description": "Recurso adicional"}}
+    }
+}
+
+_LEVEL_VALUES = {"type": "string", "enum": ["baixo", "médio", "alto"]}
+_SCORE = {"type": "number", "minimum": 0.0, "maximum": 1.0}
+
+DIFFICULTY_SCHEMA = {
+    "type": "object",
+    "required": ["adequação_11_12_anos", "adequação_13_14_anos", "adequação_15_17_anos",
+                 "vocabulário_complexidade", "conceitos_abstratos", "explicações_visuais",
+                 "sugestões_adaptação"],
+    "properties": {
+        "adequação_11_12_anos": _SCORE,
+        "adequação_13_14_anos": _SCORE,
+        "adequação_15_17_anos": _SCORE,
+        "vocabulário_complexidade": _LEVEL_VALUES,
+        "conceitos_abstratos": _LEVEL_VALUES,
+        "explicações_visuais": _LEVEL_VALUES,
+        "sugestões_adaptação": {"type": "array", "items": {"type": "string", "description": "Sugestão"}}
+    }
+}
+
+
+def _lesson_complexity(lesson_duration_min: int) -> str:
     # Converter duração da aula em complexidade aproximada
     complexity = "básica"
     if lesson_duration_min > 45:
         complexity = "detalhada"
     if lesson_duration_min > 90:
         complexity = "aprofundada"
+    return complexity
+
+
+def _lesson_fallback(topic: str, subject_area: str) -> LessonContent:
+    # Criar uma aula básica em caso de erro
+    return LessonContent(
+        title=f"Aula sobre {topic}",
+        introduction=f"Esta é uma introdução sobre {topic} na área de {subject_area}.",
+        main_content=[{"subtitle": "Conceitos básicos", "content": "Conteúdo não disponível devido a um erro."}],
+        examples=[],
+        activities=[],
+        summary=f"Não foi possível gerar o resumo para {topic}."
+    )
+
 
+async def _agenerate_lesson_single(topic: str, subject_area: str, complexity: str, knowledge_level: str,
+                                   llm_kwargs: Dict[str, Any]) -> LessonContent:
+    """A aula inteira em uma única resposta JSON."""
     # Gerar a estrutura da aula
     prompt = f"""
     Crie uma aula {complexity} sobre "{topic}" na área de {subject_area}, para nível {knowledge_level}.
@@ -325,58 +1129,187 @@ def generate_complete_lesson(topic: str,
     Responda APENAS com o JSON válido, sem explicações adicionais.
     """
 
-    try:
-        # Gerar o conteúdo
-        json_content = call_teacher_llm(
-            prompt,
-            student_age=age_range,
-            subject_area=subject_area,
-            teaching_style=teaching_style,
-            knowledge_level=knowledge_level,
-            temperature=0.7,
-            max_tokens=4000  # Aumento do limite para aulas completas
-        )
+    lesson_data = await agenerate_json(
+        prompt,
+        LESSON_SCHEMA,
+        temperature=0.7,
+        max_tokens=4000,  # Aumento do limite para aulas completas
+        task="lesson",
+        **llm_kwargs
+    )
+    return LessonContent.from_dict(lesson_data)
+
+
+async def _agenerate_lesson_sectioned(topic: str, subject_area: str, complexity: str, knowledge_level: str,
+                                      llm_kwargs: Dict[str, Any]) -> LessonContent:
+    """
+    Roteiro primeiro, depois todas as partes da aula em paralelo.
+
+    Cada parte é texto puro (um caractere malformado não invalida a aula inteira) e
+    tem sua própria entrada de cache: gerar de novo a mesma aula só refaz as partes
+    que falharam. O tempo total fica próximo ao da parte mais lenta.
+    """
+    outline = await agenerate_json(
+        f"""
+    Planeje uma aula {complexity} sobre "{topic}" na área de {subject_area}, para nível {knowledge_level}.
+    Não escreva a aula, apenas o roteiro, seguindo a estrutura JSON abaixo:
+    {{
+        "title": "Título envolvente da aula",
+        "sections": [
+            {{"subtitle": "Subtítulo da primeira seção", "focus": "O que a seção deve cobrir (1 frase)"}},
+            {{"subtitle": "Subtítulo da segunda seção", "focus": "O que a seção deve cobrir (1 frase)"}},
+            {{"subtitle": "Subtítulo da terceira seção", "focus": "O que a seção deve cobrir (1 frase)"}}
+        ],
+        "examples": [
+            {{"title": "Título do exemplo 1", "focus": "O que o exemplo mostra (1 frase)"}},
+            {{"title": "Título do exemplo 2", "focus": "O que o exemplo mostra (1 frase)"}}
+        ],
+        "activities": [
+            {{"title": "Nome da atividade 1", "focus": "O que o aluno vai praticar (1 frase)"}},
+            {{"title": "Nome da atividade 2", "focus": "O que o aluno vai praticar (1 frase)"}}
+        ]
+    }}
 
-        # Extrair apenas o JSON da resposta
-        json_match = json_content
-        if "```json" in json_content:
-            json_match = json_content.split("```json")[1].split("```")[0].strip()
-        elif "```" in json_content:
-            json_match = json_content.split("```")[1].strip()
+    Responda APENAS com o JSON válido, sem explicações adicionais.
+    """,
+        LESSON_OUTLINE_SCHEMA,
+        temperature=0.7,
+        max_tokens=config.LESSON_OUTLINE_MAX_TOKENS,
+        task="lesson",
+        **llm_kwargs
+    )
 
-        # Carregar o JSON
-        lesson_data = json.loads(json_match)
-        return LessonContent.from_dict(lesson_data)
+    # O roteiro completo vai em todos os pedidos para as partes não se repetirem
+    plan = "\n".join(f"    {i}. {section['subtitle']}: {section.get('focus', '')}"
+                     for i, section in enumerate(outline["sections"], 1))
+    context = (f'Você está escrevendo a aula {complexity} "{outline["title"]}" sobre "{topic}" '
+               f"na área de {subject_area}, para nível {knowledge_level}.\n"
+               f"    Seções da aula:\n{plan}\n\n")
+    text_only = "\n\n    Responda apenas com o texto, sem título e sem repetir o conteúdo das outras partes."
+    section_tokens = config.LESSON_SECTION_MAX_TOKENS
+
+    parts = [("introduction", None,
+              context + "    Escreva a introdução da aula (2-3 parágrafos), despertando o interesse do aluno."
+              + text_only, section_tokens // 2)]
+    for section in outline["sections"]:
+        parts.append(("main_content", section["subtitle"],
+                      context + f'    Escreva o conteúdo da seção "{section["subtitle"]}" (2-5 parágrafos). '
+                      f"Foco: {section.get('focus', '')}" + text_only, section_tokens))
+    for example in outline.get("examples", []):
+        parts.append(("examples", example["title"],
+                      context + f'    Descreva em detalhes o exemplo "{example["title"]}". '
+                      f"Foco: {example.get('focus', '')}" + text_only, section_tokens // 2))
+    for activity in outline.get("activities", []):
+        parts.append(("activities", activity["title"],
+                      context + f'    Escreva instruções detalhadas para a atividade "{activity["title"]}". '
+                      f"Foco: {activity.get('focus', '')}" + text_only, section_tokens // 2))
+    parts.append(("summary", None,
+                  context + "    Escreva um resumo conciso dos principais pontos da aula (1-2 parágrafos)."
+                  + text_only, section_tokens // 3))
+
+    results = await asyncio.gather(*(
+        acall_teacher_llm(prompt, temperature=0.7, max_tokens=max_tokens, task="lesson", raise_errors=True,
+                          **llm_kwargs)
+        for _, _, prompt, max_tokens in parts
+    ), return_exceptions=True)
+
+    lesson = {"title": outline["title"], "introduction": "", "main_content": [], "examples": [],
+              "activities": [], "summary": ""}
+    failed = 0
+    for (field, title, _, _), result in zip(parts, results):
+        if isinstance(result, BaseException):
+            if not isinstance(result, Exception):
+                raise result
+            failed += 1
+            print(f"Erro ao gerar a parte '{title or field}' da aula: {result}")
+            text = "Conteúdo não disponível devido a um erro."
+        else:
+            text = result.strip()
+
+        if field == "main_content":
+            lesson[field].append({"subtitle": title, "content": text})
+        elif field == "examples":
+            lesson[field].append({"title": title, "content": text})
+        elif field == "activities":
+            lesson[field].append({"title": title, "description": text})
+        else:
+            lesson[field] = text
+
+    if failed == len(parts):
+        raise LLMError(f"Nenhuma das {len(parts)} partes da aula foi gerada")
+    return LessonContent.from_dict(lesson)
+
+
+async def agenerate_complete_lesson(topic: str,
+                                    subject_area: str,
+                                    age_range: Union[int, List[int]] = None,
+                                    knowledge_level: str = "iniciante",
+                                    teaching_style: str = "didático",
+                                    lesson_duration_min: int = 30,
+                                    sectioned: bool = None) -> LessonContent:
+    """Versão assíncrona de generate_complete_lesson."""
+    complexity = _lesson_complexity(lesson_duration_min)
+    llm_kwargs = {
+        "student_age": age_range,
+        "subject_area": subject_area,
+        "teaching_style": teaching_style,
+        "knowledge_level": knowledge_level
+    }
+    sectioned = config.LESSON_SECTIONED if sectioned is None else sectioned
+
+    if sectioned:
+        try:
+            return await _agenerate_lesson_sectioned(topic, subject_area, complexity, knowledge_level, llm_kwargs)
+        except Exception as e:
+            print(f"Erro ao gerar a aula por seções: {e}; tentando em uma única resposta")
 
+    try:
+        # Gerar o conteúdo
+        return await _agenerate_lesson_single(topic, subject_area, complexity, knowledge_level, llm_kwargs)
     except Exception as e:
         print(f"Erro ao gerar a aula completa: {e}")
-        # Criar uma aula básica em caso de erro
-        return LessonContent(
-            title=f"Aula sobre {topic}",
-            introduction=f"Esta é uma introdução sobre {topic} na área de {subject_area}.",
-            main_content=[{"subtitle": "Conceitos básicos", "content": "Conteúdo não disponível devido a um erro."}],
-            examples=[],
-            activities=[],
-            summary=f"Não foi possível gerar o resumo para {topic}."
-        )
+        return _lesson_fallback(topic, subject_area)
 
 
-def generate_assessment(topic: str,
-                        difficulty: str = "médio",
-                        num_questions: int = 5,
-                        question_types: List[str] = ["múltipla escolha", "verdadeiro/falso", "dissertativa"]) -> Dict:
+def generate_complete_lesson(topic: str,
+                             subject_area: str,
+                             age_range: Union[int, List[int]] = None,
+                             knowledge_level: str = "iniciante",
+                             teaching_style: str = "didático",
+                             lesson_duration_min: int = 30,
+                             sectioned: bool = None) -> LessonContent:
     """
-    Gera uma avaliação com questões sobre o tópico específico.
+    Gera uma aula completa sobre um tópico específico.
 
     Args:
-        topic: Tópico a ser avaliado
-        difficulty: Nível de dificuldade (fácil, médio, difícil)
-        num_questions: Quantidade de questões
-        question_types: Tipos de questões desejados
+        topic: Tópico específico da aula
+        subject_area: Área/disciplina geral
+        age_range: Idade(s) do público-alvo
+        knowledge_level: Nível de conhecimento (iniciante, intermediário, avançado)
+        teaching_style: Estilo de ensino preferido
+        lesson_duration_min: Duração aproximada da aula em minutos
+        sectioned: Gera o roteiro e depois as partes da aula em paralelo, em vez de
+            uma única resposta (padrão: config.LESSON_SECTIONED)
 
     Returns:
-        Dicionário com as questões, alternativas e respostas
+        Um objeto LessonContent com a aula estruturada
     """
+    return _run_sync(agenerate_complete_lesson(
+        topic,
+        subject_area=subject_area,
+        age_range=age_range,
+        knowledge_level=knowledge_level,
+        teaching_style=teaching_style,
+        lesson_duration_min=lesson_duration_min,
+        sectioned=sectioned
+    ))
+
+
+async def agenerate_assessment(topic: str,
+                               difficulty: str = "médio",
+                               num_questions: int = 5,
+                               question_types: List[str] = ["múltipla escolha", "verdadeiro/falso", "dissertativa"]) -> Dict:
+    """Versão assíncrona de generate_assessment."""
     prompt = f"""
     Crie uma avaliação sobre "{topic}" com {num_questions} questões de dificuldade {difficulty}.
 
@@ -412,24 +1345,15 @@ def generate_assessment(topic: str,
     """
 
     try:
-        json_content = call_teacher_llm(
+        return await agenerate_json(
             prompt,
+            ASSESSMENT_SCHEMA,
             teaching_style="didático",  # Estilo didático é melhor para avaliações
             temperature=0.7,
-            max_tokens=3000
+            max_tokens=3000,
+            task="assessment"
         )
 
-        # Extrair apenas o JSON da resposta
-        json_match = json_content
-        if "```json" in json_content:
-            json_match = json_content.split("```json")[1].split("```")[0].strip()
-        elif "```" in json_content:
-            json_match = json_content.split("```")[1].strip()
-
-        # Carregar o JSON
-        assessment_data = json.loads(json_match)
-        return assessment_data
-
     except Exception as e:
         print(f"Erro ao gerar a avaliação: {e}")
         return {
@@ -446,24 +1370,139 @@ def generate_assessment(topic: str,
         }
 
 
-def generate_learning_pathway(topic: str,
-                              duration_weeks: int = 8,
-                              hours_per_week: int = 3,
-                              initial_level: str = "iniciante",
-                              target_level: str = "intermediário") -> Dict:
+def generate_assessment(topic: str,
+                        difficulty: str = "médio",
+                        num_questions: int = 5,
+                        question_types: List[str] = ["múltipla escolha", "verdadeiro/falso", "dissertativa"]) -> Dict:
     """
-    Gera um roteiro de aprendizado progressivo para um tópico.
+    Gera uma avaliação com questões sobre o tópico específico.
 
     Args:
-        topic: Tópico principal a ser aprendido
-        duration_weeks: Duração do roteiro em semanas
-        hours_per_week: Horas semanais de estudo
-        initial_level: Nível de conhecimento inicial
-        target_level: Nível de conhecimento alvo
+        topic: Tópico a ser avaliado
+        difficulty: Nível de dificuldade (fácil, médio, difícil)
+        num_questions: Quantidade de questões
+        question_types: Tipos de questões desejados
 
     Returns:
-        Dicionário com o roteiro estruturado de aprendizado
+        Dicionário com as questões, alternativas e respostas
+    """
+    return _run_sync(agenerate_assessment(
+        topic,
+        difficulty=difficulty,
+        num_questions=num_questions,
+        question_types=question_types
+    ))
+
+
+async def _agrade_essay_batch(essays: List[Dict[str, Any]], student_age: Union[int, List[int]],
+                              teaching_style: str) -> List[Dict[str, Any]]:
+    """Corrige um lote de respostas em uma única chamada JSON."""
+    blocks = "\n\n".join(
+        f"Questão {i}: {essay.get('question', '')}\n"
+        f"Resposta do aluno: {essay.get('answer', '')}\n"
+        f"Pontos-chave esperados: {', '.join(essay.get('key_points', []))}\n"
+        f"Exemplo de resposta adequada: {essay.get('sample_answer', '')}"
+        for i, essay in enumerate(essays, 1)
+    )
+    age = student_age if isinstance(student_age, int) or student_age is None else "-".join(map(str, student_age))
+    prompt = f"""
+    Avalie as respostas de um aluno{f" de {age} anos" if age else ""} às questões dissertativas abaixo.
+
+    {blocks}
+
+    Uma resposta é satisfatória quando inclui pelo menos 70% dos pontos-chave. Para cada
+    questão, decida se a resposta é satisfatória e escreva um feedback construtivo.
+
+    Forneça o resultado no seguinte formato JSON, com uma avaliação para cada uma das {len(essays)} questões:
+    {{
+        "grades": [
+            {{"question": 1, "approved": true, "feedback": "Feedback construtivo para o aluno"}}
+        ]
+    }}
+
+    Responda APENAS com o JSON válido, sem explicações adicionais.
+    """
+
+    try:
+        data = await agenerate_json(
+            prompt,
+            ESSAY_GRADING_SCHEMA,
+            student_age=student_age,
+            teaching_style=teaching_style,
+            temperature=0.3,
+            max_tokens=200 + 400 * len(essays),
+            task="grading"
+        )
+        grades = {grade["question"]: grade for grade in data["grades"]}
+    except Exception as e:
+        print(f"Erro ao avaliar as respostas dissertativas: {e}")
+        grades = {}
+
+    missing = [i for i in range(len(essays)) if i + 1 not in grades]
+    if missing and len(essays) > 1:
+        # Questões que ficaram sem avaliação no lote: uma chamada para cada, em paralelo
+        retried = await asyncio.gather(*(
+            _agrade_essay_batch([essays[i]], student_age, teaching_style) for i in missing
+        ))
+        for i, verdicts in zip(missing, retried):
+            grades[i + 1] = verdicts[0]
+
+    return [
+        {"approved": grades[i]["approved"], "feedback": grades[i]["feedback"]} if i in grades
+        else {"approved": None, "feedback": "Não foi possível avaliar a resposta automaticamente."}
+        for i in range(1, len(essays) + 1)
+    ]
+
+
+async def agrade_essay_answers(essays: List[Dict[str, Any]],
+                               student_age: Union[int, List[int]] = None,
+                               teaching_style: str = "didático") -> List[Dict[str, Any]]:
+    """Versão assíncrona de grade_essay_answers."""
+    if not essays:
+        return []
+    size = max(1, config.ESSAY_GRADING_BATCH_SIZE)
+    batches = await asyncio.gather(*(
+        _agrade_essay_batch(essays[i:i + size], student_age, teaching_style) for i in range(0, len(essays), size)
+    ))
+    return [verdict for batch in batches for verdict in batch]
+
+
+def grade_essay_answers(essays: List[Dict[str, Any]],
+                        student_age: Union[int, List[int]] = None,
+                        teaching_style: str = "didático") -> List[Dict[str, Any]]:
+    """
+    Corrige respostas de questões dissertativas de uma só vez.
+
+    As respostas vão em lotes de até config.ESSAY_GRADING_BATCH_SIZE por chamada
+    (lotes corrigidos em paralelo); questões que faltarem na resposta de um lote são
+    corrigidas individualmente.
+
+    Args:
+        essays: Lista de dicionários com question, answer, key_points e sample_answer
+        student_age: Idade do aluno
+        teaching_style: Estilo de ensino do feedback
+
+    Returns:
+        Uma avaliação por resposta, na mesma ordem: {"approved": bool ou None se não
+        foi possível avaliar, "feedback": str}
     """
+    return _run_sync(agrade_essay_answers(essays, student_age=student_age, teaching_style=teaching_style))
+
+
+def _weekly_plan_items(on_week: Callable[[Dict], None]) -> Callable[[Tuple, Any], None]:
+    def on_item(path: Tuple, value: Any):
+        if len(path) == 2 and path[0] == "weekly_plan" and isinstance(value, dict):
+            on_week(value)
+    return on_item
+
+
+async def agenerate_learning_pathway(topic: str,
+                                     duration_weeks: int = 8,
+                                     hours_per_week: int = 3,
+                                     initial_level: str = "iniciante",
+                                     target_level: str = "intermediário",
+                                     on_week: Callable[[Dict], None] = None) -> Dict:
+    """Versão assíncrona de generate_learning_pathway."""
     prompt = f"""
     Crie um roteiro de aprendizado sobre "{topic}" para {duration_weeks} semanas, 
     considerando {hours_per_week} horas de estudo por semana.
@@ -500,24 +1539,16 @@ def generate_learning_pathway(topic: str,
     """
 
     try:
-        json_content = call_teacher_llm(
+        return await agenerate_json(
             prompt,
+            PATHWAY_SCHEMA,
+            on_item=_weekly_plan_items(on_week) if on_week else None,
             teaching_style="projeto",  # Estilo baseado em projetos para roteiro
             temperature=0.7,
-            max_tokens=4000
+            max_tokens=4000,
+            task="pathway"
         )
 
-        # Extrair apenas o JSON da resposta
-        json_match = json_content
-        if "```json" in json_content:
-            json_match = json_content.split("```json")[1].split("```")[0].strip()
-        elif "```" in json_content:
-            json_match = json_content.split("```")[1].strip()
-
-        # Carregar o JSON
-        pathway_data = json.loads(json_match)
-        return pathway_data
-
     except Exception as e:
         print(f"Erro ao gerar o roteiro de aprendizado: {e}")
         return {
@@ -534,6 +1565,52 @@ def generate_learning_pathway(topic: str,
         }
 
 
+def generate_learning_pathway(topic: str,
+                              duration_weeks: int = 8,
+                              hours_per_week: int = 3,
+                              initial_level: str = "iniciante",
+                              target_level: str = "intermediário",
+                              on_week: Callable[[Dict], None] = None) -> Dict:
+    """
+    Gera um roteiro de aprendizado progressivo para um tópico.
+
+    Args:
+        topic: Tópico principal a ser aprendido
+        duration_weeks: Duração do roteiro em semanas
+        hours_per_week: Horas semanais de estudo
+        initial_level: Nível de conhecimento inicial
+        target_level: Nível de conhecimento alvo
+        on_week: Chamada com cada semana de weekly_plan assim que ela chega (a
+            resposta vem em streaming)
+
+    Returns:
+        Dicionário com o roteiro estruturado de aprendizado
+    """
+    return _run_sync(agenerate_learning_pathway(
+        topic,
+        duration_weeks=duration_weeks,
+        hours_per_week=hours_per_week,
+        initial_level=initial_level,
+        target_level=target_level,
+        on_week=on_week
+    ))
+
+
+async def aget_personalized_content(prompt: str,
+                                    user_id: str = None,
+                                    subject_area: str = None,
+                                    age_range: Union[int, List[int]] = None) -> str:
+    """Versão assíncrona de get_personalized_content."""
+    return await acall_teacher_llm(
+        prompt,
+        student_age=age_range,
+        subject_area=subject_area,
+        teaching_style="didático",
+        temperature=0.7,
+        user_id=user_id
+    )
+
+
 def get_personalized_content(prompt: str,
                              user_id: str = None,
                              subject_area: str = None,
@@ -552,26 +1629,16 @@ def get_personalized_content(prompt: str,
     Returns:
         Conteúdo personalizado gerado
     """
-    return call_teacher_llm(
+    return _run_sync(aget_personalized_content(
         prompt,
-        student_age=age_range,
+        user_id=user_id,
         subject_area=subject_area,
-        teaching_style="didático",
-        temperature=0.7,
-        user_id=user_id
-    )
-
+        age_range=age_range
+    ))
 
-def analyze_content_difficulty(text: str) -> Dict[str, float]:
-    """
-    Analisa a dificuldade de um conteúdo para diferentes faixas etárias.
-
-    Args:
-        text: Texto a ser analisado
 
-    Returns:
-        Dicionário com scores de adequação para diferentes idades
-    """
+async def aanalyze_content_difficulty(text: str) -> Dict[str, float]:
+    """Versão assíncrona de analyze_content_difficulty."""
     prompt = f"""
     Analise o seguinte texto e determine quão adequado ele é para diferentes faixas etárias
     em termos de complexidade, vocabulário e conceitos. Considere:
@@ -596,24 +1663,15 @@ def analyze_content_difficulty(text: str) -> Dict[str, float]:
     """
 
     try:
-        json_content = call_teacher_llm(
+        return await agenerate_json(
             prompt,
+            DIFFICULTY_SCHEMA,
             teaching_style="didático",
             temperature=0.3,  # Temperatura mais baixa para análise objetiva
-            max_tokens=1000
+            max_tokens=1000,
+            task="analysis"
         )
 
-        # Extrair apenas o JSON da resposta
-        json_match = json_content
-        if "```json" in json_content:
-            json_match = json_content.split("```json")[1].split("```")[0].strip()
-        elif "```" in json_content:
-            json_match = json_content.split("```")[1].strip()
-
-        # Carregar o JSON
-        analysis_data = json.loads(json_match)
-        return analysis_data
-
     except Exception as e:
         print(f"Erro ao analisar dificuldade: {e}")
         return {
@@ -627,17 +1685,23 @@ def analyze_content_difficulty(text: str) -> Dict[str, float]:
         }
 
 
-def simplify_content(text: str, target_age: int) -> str:
+def analyze_content_difficulty(text: str) -> Dict[str, float]:
     """
-    Simplifica um conteúdo para torná-lo mais adequado para uma determinada idade.
+    Analisa a dificuldade de um conteúdo para diferentes faixas etárias.
 
     Args:
-        text: Texto original
-        target_age: Idade alvo
+        text: Texto a ser analisado
 
     Returns:
-        Texto simplificado e adaptado
+        Dicionário com scores de adequação para diferentes idades
     """
+    return _run_sync(aanalyze_content_difficulty(
+        text
+    ))
+
+
+async def asimplify_content(text: str, target_age: int) -> str:
+    """Versão assíncrona de simplify_content."""
     prompt = f"""
     Simplifique o seguinte texto para que seja adequado e compreensível para um aluno de {target_age} anos.
     Mantenha todos os conceitos importantes, mas adapte o vocabulário, comprimento das frases e explicações.
@@ -650,25 +1714,34 @@ def simplify_content(text: str, target_age: int) -> str:
     Texto simplificado:
     """
 
-    return call_teacher_llm(
+    return await acall_teacher_llm(
         prompt,
         student_age=target_age,
         teaching_style="didático",
-        temperature=0.7
+        temperature=0.7,
+        task="rewrite"
     )
 
 
-def enrich_content(text: str, enrichment_type: str = "exemplos") -> str:
+def simplify_content(text: str, target_age: int) -> str:
     """
-    Enriquece um conteúdo com elementos adicionais.
+    Simplifica um conteúdo para torná-lo mais adequado para uma determinada idade.
 
     Args:
         text: Texto original
-        enrichment_type: Tipo de enriquecimento (exemplos, analogias, perguntas, desafios, etc)
+        target_age: Idade alvo
 
     Returns:
-        Texto enriquecido
+        Texto simplificado e adaptado
     """
+    return _run_sync(asimplify_content(
+        text,
+        target_age=target_age
+    ))
+
+
+async def aenrich_content(text: str, enrichment_type: str = "exemplos") -> str:
+    """Versão assíncrona de enrich_content."""
     prompt = f"""
     Enriqueça o seguinte conteúdo educacional adicionando mais {enrichment_type}.
     Mantenha o texto original e adicione os novos elementos de forma integrada e coerente.
@@ -681,8 +1754,26 @@ def enrich_content(text: str, enrichment_type: str = "exemplos") -> str:
     Texto enriquecido com {enrichment_type}:
     """
 
-    return call_teacher_llm(
+    return await acall_teacher_llm(
         prompt,
         teaching_style="didático",
-        temperature=0.7
-    )
\ No newline at end of file
+        temperature=0.7,
+        task="rewrite"
+    )
+
+
+def enrich_content(text: str, enrichment_type: str = "exemplos") -> str:
+    """
+    Enriquece um conteúdo com elementos adicionais.
+
+    Args:
+        text: Texto original
+        enrichment_type: Tipo de enriquecimento (exemplos, analogias, perguntas, desafios, etc)
+
+    Returns:
+        Texto enriquecido
+    """
+    return _run_sync(aenrich_content(
+        text,
+        enrichment_type=enrichment_type
+    ))
@@ -0,0 +1,151 @@
+# app/llm_rate_limit.py
+"""
+Limitador de taxa (token bucket) do lado do cliente para a API do LLM.
+
+Cada modelo tem dois baldes: requisições por minuto e tokens por minuto (tokens
+estimados do prompt + max_tokens). O estado fica em um arquivo JSON protegido por
+lock de arquivo (fcntl), então todos os processos da máquina (um CLI por aluno,
+workers de jobs em lote) dividem o mesmo orçamento.
+
+Em vez de falhar quando o balde está vazio, cada chamada reserva sua parte na hora
+(o nível pode ficar negativo) e espera até a dívida ser paga pela reposição. Como
+cada reserva aumenta a dívida para as seguintes, as chamadas são atendidas na ordem
+de chegada, sem polling. Depois da resposta, a diferença entre os tokens estimados
+e os efetivamente usados é devolvida ao balde.
+"""
+
+import asyncio
+import contextlib
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: o estado fica só neste processo
+    fcntl = None
+
+from app import config
+
+
+def estimate_prompt_tokens(messages: List[Dict[str, str]]) -> int:
+    """Estimativa barata (~4 caracteres por token, mais o overhead de cada mensagem)."""
+    return sum(len(message.get("content") or "") // 4 + 4 for message in messages) + 2
+
+
+class TokenBucketRateLimiter:
+    """
+    Args:
+        limits: {nome do modelo na API: {"rpm": requisições/min, "tpm": tokens/min}}
+        state_path: Arquivo JSON compartilhado entre processos (None = só em memória)
+    """
+
+    def __init__(self, limits: Dict[str, Dict[str, int]], state_path: str = None):
+        self.limits = limits
+        self.state_path = state_path if fcntl is not None else None
+        self._memory_state = {}
+        self._lock = threading.Lock()
+        self._stats = {"acquired": 0, "delayed": 0, "wait_seconds": 0.0}
+        if self.state_path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.state_path)), exist_ok=True)
+
+    @contextlib.contextmanager
+    def _locked_state(self):
+        with self._lock:
+            if not self.state_path:
+                yield self._memory_state
+                return
+            with open(self.state_path + ".lock", "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    try:
+                        with open(self.state_path, encoding="utf-8") as f:
+                            state = json.load(f)
+                    except (OSError, ValueError):
+                        state = {}
+                    yield state
+                    tmp_path = f"{self.state_path}.{os.getpid()}.tmp"
+                    with open(tmp_path, "w", encoding="utf-8") as f:
+                        json.dump(state, f)
+                    os.replace(tmp_path, self.state_path)
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _refill(self, state: dict, model_name: str, now: float) -> dict:
+        limit = self.limits[model_name]
+        bucket = state.get(model_name)
+        if bucket is None:
+            bucket = {"requests": float(limit["rpm"]), "tokens": float(limit["tpm"]), "updated": now}
+        elapsed = max(0.0, now - bucket["updated"])
+        bucket["requests"] = min(limit["rpm"], bucket["requests"] + elapsed * limit["rpm"] / 60.0)
+        bucket["tokens"] = min(limit["tpm"], bucket["tokens"] + elapsed * limit["tpm"] / 60.0)
+        bucket["updated"] = now
+        state[model_name] = bucket
+        return bucket
+
+    def _reserve(self, model_name: str, tokens: int) -> float:
+        """Reserva 1 requisição e 'tokens' tokens; retorna quantos segundos esperar."""
+        limit = self.limits[model_name]
+        with self._locked_state() as state:
+            bucket = self._refill(state, model_name, time.time())
+            bucket["requests"] -= 1
+            bucket["tokens"] -= tokens
+            return max(0.0,
+                       -bucket["requests"] * 60.0 / limit["rpm"],
+                       -bucket["tokens"] * 60.0 / limit["tpm"])
+
+    def _give_back(self, model_name: str, requests: float, tokens: float):
+        with self._locked_state() as state:
+            bucket = self._refill(state, model_name, time.time())
+            bucket["requests"] += requests
+            bucket["tokens"] += tokens
+
+    async def acquire(self, model_name: str, tokens: int):
+        """
+        Aguarda a vez da chamada (ordem de chegada) no orçamento do modelo.
+        Modelos sem limite configurado passam direto.
+        """
+        if model_name not in self.limits:
+            return
+        wait = await asyncio.to_thread(self._reserve, model_name, tokens)
+        with self._lock:
+            self._stats["acquired"] += 1
+            if wait > 0:
+                self._stats["delayed"] += 1
+                self._stats["wait_seconds"] += wait
+        if wait > 0:
+            try:
+                await asyncio.sleep(wait)
+            except asyncio.CancelledError:
+                # Desistiu antes da vez: devolve a reserva para quem está atrás na fila
+                await asyncio.shield(asyncio.to_thread(self._give_back, model_name, 1, tokens))
+                raise
+
+    async def settle(self, model_name: str, estimated_tokens: int, actual_tokens: Optional[int]):
+        """Devolve ao balde os tokens reservados e não usados (ou cobra os excedentes)."""
+        if model_name not in self.limits or actual_tokens is None:
+            return
+        difference = estimated_tokens - actual_tokens
+        if difference:
+            await asyncio.to_thread(self._give_back, model_name, 0, difference)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._stats)
+
+
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> Optional[TokenBucketRateLimiter]:
+    """Limitador compartilhado, ou None se desativado em config.LLM_RATE_LIMIT_ENABLED."""
+    global _rate_limiter
+    if not config.LLM_RATE_LIMIT_ENABLED:
+        return None
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            _rate_limiter = TokenBucketRateLimiter(config.LLM_RATE_LIMITS, config.LLM_RATE_LIMIT_STATE_PATH)
+        return _rate_limiter
@@ -0,0 +1,276 @@
+# app/llm_resilience.py
+"""
+Resiliência das chamadas ao LLM: classificação de erros, novas tentativas com
+backoff exponencial e circuit breaker por modelo.
+
+- classify_error converte as exceções do cliente (openai, httpx, asyncio) em LLMError,
+  indicando se vale tentar de novo e o Retry-After informado pelo servidor
+- call_with_retries executa a requisição com backoff exponencial com jitter
+  ("full jitter"), respeitando o Retry-After quando presente
+- CircuitBreaker falha imediatamente (LLMCircuitOpenError) depois de uma sequência de
+  falhas do servidor, até passar o tempo de recuperação; então deixa uma chamada de
+  teste passar e fecha de novo se ela tiver sucesso
+
+Para testar contra falhas reais de rede/HTTP, use o servidor local
+benchmarks/fake_openai_server.py com OPENAI_BASE_URL apontando para ele.
+"""
+
+import asyncio
+import email.utils
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app import config
+
+
+class LLMError(Exception):
+    """Falha classificada de uma chamada ao LLM."""
+
+    retryable = False
+    # Falhas que indicam problema no servidor e contam para o circuit breaker
+    counts_for_circuit = False
+
+    def __init__(self, message: str, status_code: int = None, retry_after: float = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class LLMRateLimitError(LLMError):
+    """429: limite de requisições/tokens do provedor."""
+    retryable = True
+
+
+class LLMServerError(LLMError):
+    """5xx ou sobrecarga do provedor."""
+    retryable = True
+    counts_for_circuit = True
+
+
+class LLMTimeoutError(LLMError):
+    retryable = True
+    counts_for_circuit = True
+
+
+class LLMConnectionError(LLMError):
+    retryable = True
+    counts_for_circuit = True
+
+
+class LLMAuthError(LLMError):
+    """401/403: chave inválida ou sem permissão."""
+
+
+class LLMRequestError(LLMError):
+    """Outros 4xx: requisição inválida (não adianta repetir)."""
+
+
+class LLMCircuitOpenError(LLMError):
+    """O circuit breaker do modelo está aberto; a chamada nem foi feita."""
+
+
+def _parse_retry_after(headers) -> Optional[float]:
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        # Formato de data HTTP
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def classify_error(error: BaseException) -> LLMError:
+    """Converte uma exceção do cliente em um LLMError classificado."""
+    if isinstance(error, LLMError):
+        return error
+
+    message = f"{type(error).__name__}: {error}"
+    status_code = getattr(error, "status_code", None)
+    response = getattr(error, "response", None)
+    retry_after = _parse_retry_after(getattr(response, "headers", None)) if response is not None else None
+
+    if status_code is not None:
+        if status_code == 429:
+            return LLMRateLimitError(message, status_code, retry_after)
+        if status_code in (401, 403):
+            return LLMAuthError(message, status_code)
+        if status_code == 408 or status_code >= 500:
+            return LLMServerError(message, status_code, retry_after)
+        return LLMRequestError(message, status_code)
+
+    # Sem código HTTP: problemas de rede ou de tempo limite (nomes das classes do openai/httpx)
+    name = type(error).__name__
+    if isinstance(error, asyncio.TimeoutError) or "Timeout" in name:
+        return LLMTimeoutError(message)
+    if "Connection" in name or isinstance(error, (ConnectionError, OSError)):
+        return LLMConnectionError(message)
+    return LLMError(message)
+
+
+def backoff_delay(attempt: int, base: float, max_delay: float, retry_after: float = None) -> float:
+    """
+    Espera antes da tentativa attempt+1: full jitter sobre base * 2^attempt, limitado a
+    max_delay. Com Retry-After, espera pelo menos o tempo pedido pelo servidor.
+    """
+    delay = random.uniform(0, min(max_delay, base * (2 ** attempt)))
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, config.LLM_RETRY_AFTER_MAX))
+    return delay
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker simples: fechado -> aberto após failure_threshold falhas seguidas;
+    aberto -> meio-aberto após recovery_timeout segundos; meio-aberto deixa uma
+    chamada de teste passar e volta a fechado (sucesso) ou aberto (falha).
+
+    before_call() devolve um token quando a chamada é a de teste; só quem tem esse token
+    libera a vaga de teste, para que o cancelamento ou o erro de outra chamada (iniciada
+    antes de o circuito abrir) não deixe passar uma segunda chamada de teste.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial = None
+        self._lock = threading.Lock()
+
+    def before_call(self) -> Optional[object]:
+        """
+        Levanta LLMCircuitOpenError se a chamada não deve ser feita agora.
+
+        Returns:
+            Token da chamada de teste (meio-aberto) ou None para uma chamada normal
+        """
+        with self._lock:
+            if self.state == self.OPEN:
+                remaining = self.recovery_timeout - (time.monotonic() - self._opened_at)
+                if remaining > 0:
+                    raise LLMCircuitOpenError(
+                        f"Circuit breaker aberto; nova tentativa em {remaining:.0f}s", retry_after=remaining
+                    )
+                self.state = self.HALF_OPEN
+                self._trial = None
+            if self.state == self.HALF_OPEN:
+                if self._trial is not None:
+                    raise LLMCircuitOpenError("Circuit breaker meio-aberto; chamada de teste em andamento")
+                self._trial = object()
+                return self._trial
+            return None
+
+    def _is_trial(self, token) -> bool:
+        return token is not None and token is self._trial
+
+    def record_success(self, token=None):
+        with self._lock:
+            if self.state == self.HALF_OPEN and not self._is_trial(token):
+                # Resposta de uma chamada antiga: quem decide o meio-aberto é a chamada de teste
+                return
+            self.state = self.CLOSED
+            self._failures = 0
+            self._trial = None
+
+    def release_trial(self, token=None):
+        """Libera a chamada de teste cancelada antes de terminar (sem contar sucesso nem falha)."""
+        with self._lock:
+            if self._is_trial(token):
+                self._trial = None
+
+    def record_failure(self, error: LLMError, token=None):
+        with self._lock:
+            if not error.counts_for_circuit:
+                # Erros do cliente não indicam servidor degradado; só liberam a chamada de teste
+                if self._is_trial(token):
+                    self._trial = None
+                return
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._trial = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self._failures}
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(model_name: str) -> CircuitBreaker:
+    """Circuit breaker do modelo (compartilhado por todas as chamadas do processo)."""
+    with _breakers_lock:
+        breaker = _breakers.get(model_name)
+        if breaker is None:
+            breaker = CircuitBreaker(config.LLM_CIRCUIT_FAILURE_THRESHOLD, config.LLM_CIRCUIT_RECOVERY_SECONDS)
+            _breakers[model_name] = breaker
+        return breaker
+
+
+def get_circuit_states() -> Dict[str, Dict[str, Any]]:
+    with _breakers_lock:
+        return {model_name: breaker.snapshot() for model_name, breaker in _breakers.items()}
+
+
+async def call_with_retries(func: Callable[[], Awaitable[Any]], model_name: str,
+                            max_retries: int = None) -> Any:
+    """
+    Executa func() com novas tentativas para erros transitórios e o circuit breaker do modelo.
+
+    Args:
+        func: Função assíncrona que faz a requisição
+        model_name: Nome do modelo na API (um circuit breaker por modelo)
+        max_retries: Tentativas extras (padrão: config.LLM_MAX_RETRIES)
+
+    Returns:
+        O resultado de func()
+
+    Raises:
+        LLMError: Erro classificado da última tentativa (ou LLMCircuitOpenError)
+    """
+    max_retries = config.LLM_MAX_RETRIES if max_retries is None else max_retries
+    breaker = get_circuit_breaker(model_name)
+
+    attempt = 0
+    while True:
+        trial = breaker.before_call()
+        try:
+            result = await func()
+        except asyncio.CancelledError:
+            breaker.release_trial(trial)
+            raise
+        except Exception as e:
+            error = classify_error(e)
+            breaker.record_failure(error, trial)
+            if not error.retryable or attempt >= max_retries:
+                raise error from e
+            delay = backoff_delay(attempt, config.LLM_BACKOFF_BASE, config.LLM_BACKOFF_MAX, error.retry_after)
+            attempt += 1
+            print(f"Falha temporária na API ({type(error).__name__}); "
+                  f"tentativa {attempt + 1} em {delay:.1f}s.")
+            await asyncio.sleep(delay)
+            continue
+
+        breaker.record_success(trial)
+        return result
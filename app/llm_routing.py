@@ -0,0 +1,253 @@
+# app/llm_routing.py
+"""
+Roteamento adaptativo entre os níveis de MODELS ("fast", "default", "advanced").
+
+ModelRouter escolhe o nível de cada chamada a partir de:
+- tipo de tarefa (tabela config.LLM_ROUTING_TABLE; ex: extração de palavras-chave
+  e correção APROVADO/REPROVADO vão para "fast")
+- tamanho estimado (prompt + max_tokens): chamadas grandes demais saem de "fast"
+- saída estruturada (JSON com esquema): exige pelo menos config.LLM_ROUTING_MIN_STRUCTURED_TIER
+- SLO de latência: desce para um nível mais rápido se o esperado não couber no SLO
+
+Quem chama pode forçar o nível passando model=... para call_teacher_llm.
+
+Cada chamada registra latência, tokens e custo por nível; os registros também vão
+para um JSONL (config.LLM_ROUTING_LOG_PATH), gravado por uma thread própria (fora do
+event loop), com o usuário e a função chamadora de cada chamada. O mesmo arquivo
+serve para ajustar a tabela e para o consumo por usuário (app/usage_ledger.py):
+    python -m app.llm_routing            # resumo por nível e por tarefa
+"""
+
+import argparse
+import atexit
+import datetime
+import json
+import os
+import queue
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Dict, Optional
+
+from app import config
+
+# Do mais rápido/barato para o mais capaz
+TIER_ORDER = ["fast", "default", "advanced"]
+
+# Amostras de latência mantidas por nível para estimar o p50 observado
+_LATENCY_WINDOW = 200
+# Amostras mínimas antes de confiar na latência observada em vez da estimativa de config
+_MIN_OBSERVED_SAMPLES = 20
+
+
+def estimate_cost(model_name: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """Custo em dólares segundo config.LLM_MODEL_PRICES (por milhão de tokens)."""
+    prices = config.LLM_MODEL_PRICES.get(model_name)
+    if not prices:
+        return 0.0
+    return (prompt_tokens * prices["input"] + completion_tokens * prices["output"]) / 1_000_000
+
+
+def _percentile(sorted_values, fraction: float) -> float:
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+class _LogWriter:
+    """Acrescenta registros a um JSONL em uma thread própria: quem registra não espera o disco."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def write(self, entry: dict):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="llm-routing-log", daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+        self._queue.put(entry)
+
+    def _run(self):
+        while True:
+            entries = [self._queue.get()]
+            # Junta o que mais estiver na fila em uma única escrita
+            while True:
+                try:
+                    entries.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write("".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries))
+            except OSError as e:
+                print(f"Erro ao registrar métricas de roteamento: {e}")
+            finally:
+                for _ in entries:
+                    self._queue.task_done()
+
+    def flush(self):
+        """Aguarda a gravação dos registros já enfileirados."""
+        self._queue.join()
+
+
+class ModelRouter:
+    """Escolhe o nível de modelo por chamada e acumula latência/custo por nível."""
+
+    def __init__(self, table: Dict[str, str] = None, log_path: str = None):
+        self.table = dict(config.LLM_ROUTING_TABLE if table is None else table)
+        self.log_path = log_path
+        self._writer = _LogWriter(log_path) if log_path else None
+        self._lock = threading.Lock()
+        self._latencies = defaultdict(lambda: deque(maxlen=_LATENCY_WINDOW))
+        self._totals = defaultdict(lambda: {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0,
+                                            "cost_usd": 0.0, "latency_s": 0.0})
+        self._by_task = defaultdict(lambda: defaultdict(int))
+        if self.log_path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.log_path)), exist_ok=True)
+
+    def expected_latency_ms(self, tier: str, max_tokens: int) -> float:
+        """p50 observado do nível, ou a estimativa de config.LLM_TIER_LATENCY_MS."""
+        with self._lock:
+            samples = sorted(self._latencies[tier])
+        if len(samples) >= _MIN_OBSERVED_SAMPLES:
+            return _percentile(samples, 0.5) * 1000
+        base_ms, per_token_ms = config.LLM_TIER_LATENCY_MS[tier]
+        return base_ms + per_token_ms * max_tokens
+
+    def route(self, task: str = None, prompt_tokens: int = 0, max_tokens: int = 0,
+              structured: bool = False, latency_slo_ms: float = None) -> str:
+        """
+        Escolhe o nível para a chamada.
+
+        Args:
+            task: Tipo de tarefa (chave de config.LLM_ROUTING_TABLE)
+            prompt_tokens: Tokens estimados do prompt
+            max_tokens: Limite de tokens da resposta
+            structured: Se a resposta precisa seguir um esquema (JSON)
+            latency_slo_ms: Latência máxima desejada, em milissegundos
+
+        Returns:
+            Nível de MODELS ("fast", "default" ou "advanced")
+        """
+        tier = self.table.get(task, "default")
+
+        if structured and TIER_ORDER.index(tier) < TIER_ORDER.index(config.LLM_ROUTING_MIN_STRUCTURED_TIER):
+            tier = config.LLM_ROUTING_MIN_STRUCTURED_TIER
+
+        if tier == "fast" and prompt_tokens + max_tokens > config.LLM_ROUTING_FAST_MAX_TOKENS:
+            tier = "default"
+
+        if latency_slo_ms is not None:
+            # Do nível escolhido para baixo, o mais capaz que cabe no SLO (ou o mais rápido)
+            for candidate in reversed(TIER_ORDER[:TIER_ORDER.index(tier) + 1]):
+                if self.expected_latency_ms(candidate, max_tokens) <= latency_slo_ms:
+                    return candidate
+            return TIER_ORDER[0]
+
+        return tier
+
+    def record(self, tier: str, model_name: str, task: Optional[str], latency_s: float,
+               prompt_tokens: int, completion_tokens: int, user_id: str = None, caller: str = None,
+               estimated: bool = False) -> float:
+        """
+        Registra uma chamada concluída (latência total, incluindo novas tentativas).
+
+        Args:
+            user_id, caller: Usuário e função que originou a chamada (ver usage_ledger.usage_tags)
+            estimated: Tokens estimados, sem o uso informado pela API (streaming)
+
+        Returns:
+            Custo estimado da chamada em dólares
+        """
+        cost = estimate_cost(model_name, prompt_tokens, completion_tokens)
+        with self._lock:
+            self._latencies[tier].append(latency_s)
+            totals = self._totals[tier]
+            totals["calls"] += 1
+            totals["prompt_tokens"] += prompt_tokens
+            totals["completion_tokens"] += completion_tokens
+            totals["cost_usd"] += cost
+            totals["latency_s"] += latency_s
+            self._by_task[task or "-"][tier] += 1
+
+        if self._writer:
+            self._writer.write({
+                "ts": time.time(), "day": datetime.date.today().isoformat(), "tier": tier,
+                "model": model_name, "task": task, "latency_s": round(latency_s, 4),
+                "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "cost_usd": cost,
+                "user_id": user_id, "caller": caller, "estimated": estimated
+            })
+        return cost
+
+    def flush(self):
+        """Aguarda a gravação dos registros pendentes no JSONL."""
+        if self._writer:
+            self._writer.flush()
+
+    def stats(self) -> Dict[str, Dict]:
+        """Latência (p50/p95), tokens e custo por nível, e a distribuição de níveis por tarefa."""
+        with self._lock:
+            tiers = {}
+            for tier, totals in self._totals.items():
+                samples = sorted(self._latencies[tier])
+                tiers[tier] = dict(totals)
+                tiers[tier]["p50_s"] = _percentile(samples, 0.5) if samples else None
+                tiers[tier]["p95_s"] = _percentile(samples, 0.95) if samples else None
+            by_task = {task: dict(counts) for task, counts in self._by_task.items()}
+        return {"tiers": tiers, "tasks": by_task}
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> ModelRouter:
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = ModelRouter(log_path=config.LLM_ROUTING_LOG_PATH if config.LLM_ROUTING_LOG else None)
+        return _router
+
+
+def summarize_log(path: str) -> Dict[str, Dict]:
+    """Agrega o JSONL de métricas por (tarefa, nível)."""
+    groups = defaultdict(list)
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                groups[(entry.get("task") or "-", entry["tier"])].append(entry)
+
+    summary = {}
+    for (task, tier), entries in sorted(groups.items()):
+        latencies = sorted(entry["latency_s"] for entry in entries)
+        summary[f"{task}/{tier}"] = {
+            "calls": len(entries),
+            "p50_s": _percentile(latencies, 0.5),
+            "p95_s": _percentile(latencies, 0.95),
+            "avg_completion_tokens": sum(e["completion_tokens"] for e in entries) / len(entries),
+            "cost_usd": sum(e["cost_usd"] for e in entries)
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resumo das métricas de roteamento de modelos")
+    parser.add_argument("--log", default=config.LLM_ROUTING_LOG_PATH, help="Arquivo JSONL de métricas")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.log):
+        print(f"Nenhuma métrica registrada em {args.log}.")
+        return
+
+    print(f"{'Tarefa/nível':<28}{'chamadas':>10}{'p50 s':>9}{'p95 s':>9}{'tokens saída':>14}{'custo US$':>12}")
+    for key, row in summarize_log(args.log).items():
+        print(f"{key:<28}{row['calls']:>10}{row['p50_s']:>9.2f}{row['p95_s']:>9.2f}"
+              f"{row['avg_completion_tokens']:>14.0f}{row['cost_usd']:>12.4f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,298 @@
+# app/llm_transport.py
+"""
+Transporte das chamadas ao LLM: ao vivo, gravação e reprodução (cassetes).
+
+O cliente usado por app.llm_integration vem de create_client() (ou da fábrica
+injetada com llm_integration.set_client_factory) e só precisa expor
+chat.completions.create(...) como o AsyncOpenAI. Modos (config.LLM_TRANSPORT):
+
+- "live": AsyncOpenAI, como sempre
+- "record": chama a API ao vivo e grava cada par requisição/resposta (inclusive em
+  streaming) em config.LLM_CASSETTE_DIR
+- "replay": responde a partir das cassetes, sem rede, com latência sintética
+  (config.LLM_REPLAY_LATENCY); requisições sem cassete falham ou recebem uma
+  resposta sintética (config.LLM_REPLAY_ON_MISS)
+
+A chave da cassete é o hash de (model, messages, temperature, max_tokens,
+response_format); a mesma gravação serve chamadas com e sem streaming.
+
+Latências (LLM_REPLAY_LATENCY):
+    none                  sem espera
+    recorded              a latência gravada
+    fixed:300             300 ms
+    uniform:200:900       uniforme entre 200 e 900 ms
+    lognormal:800:0.5     log-normal com mediana 800 ms e sigma 0.5
+"""
+
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional
+
+from openai import AsyncOpenAI
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+
+from app import config
+
+TRANSPORT_MODES = ("live", "record", "replay")
+
+# Campos da requisição que identificam a resposta
+_KEY_FIELDS = ("model", "messages", "temperature", "max_tokens", "response_format")
+
+# No streaming reproduzido: fração da latência até o primeiro trecho e máximo de trechos
+_FIRST_CHUNK_FRACTION = 0.3
+_MAX_STREAM_CHUNKS = 24
+
+
+class CassetteMissError(Exception):
+    """Modo replay sem cassete para a requisição (não adianta tentar de novo)."""
+    status_code = 404
+
+
+def cassette_key(request: Dict[str, Any]) -> str:
+    payload = {field: request.get(field) for field in _KEY_FIELDS}
+    return hashlib.sha256(json.dumps(payload, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class CassetteStore:
+    """
+    Cassetes em disco: um arquivo JSON por requisição (<dir>/<hash[:2]>/<hash>.json)
+    com a requisição e as respostas gravadas (várias gravações são servidas em rodízio).
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._loaded: Dict[str, Optional[Dict[str, Any]]] = {}
+        self._next: Dict[str, int] = {}
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _load(self, key: str) -> Optional[Dict[str, Any]]:
+        if key not in self._loaded:
+            try:
+                with open(self._path(key), encoding="utf-8") as f:
+                    self._loaded[key] = json.load(f)
+            except (OSError, ValueError):
+                self._loaded[key] = None
+        return self._loaded[key]
+
+    def append(self, request: Dict[str, Any], response: Dict[str, Any]):
+        """Grava uma resposta (content, usage, latency_s) para a requisição."""
+        key = cassette_key(request)
+        path = self._path(key)
+        with self._lock:
+            cassette = self._load(key) or {
+                "request": {field: request.get(field) for field in _KEY_FIELDS},
+                "responses": []
+            }
+            cassette["responses"].append(response)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(cassette, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, path)
+            self._loaded[key] = cassette
+
+    def next_response(self, request: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Próxima resposta gravada para a requisição (rodízio), ou None."""
+        key = cassette_key(request)
+        with self._lock:
+            cassette = self._load(key)
+            if not cassette or not cassette["responses"]:
+                return None
+            index = self._next.get(key, 0)
+            self._next[key] = index + 1
+            return cassette["responses"][index % len(cassette["responses"])]
+
+    def count(self) -> int:
+        total = 0
+        for _, _, files in os.walk(self.directory):
+            total += sum(1 for name in files if name.endswith(".json"))
+        return total
+
+
+def parse_latency(spec: str, rng: random.Random) -> Callable[[Optional[float]], float]:
+    """Converte a especificação de latência em uma função (latência gravada) -> segundos."""
+    name, _, args = (spec or "none").partition(":")
+    values = [float(value) for value in args.split(":")] if args else []
+    if name == "none":
+        return lambda recorded: 0.0
+    if name == "recorded":
+        return lambda recorded: recorded or 0.0
+    if name == "fixed":
+        return lambda recorded: values[0] / 1000
+    if name == "uniform":
+        return lambda recorded: rng.uniform(values[0], values[1]) / 1000
+    if name == "lognormal":
+        median_ms, sigma = values
+        return lambda recorded: rng.lognormvariate(math.log(median_ms), sigma) / 1000
+    raise ValueError(f"Latência desconhecida: {spec!r} (use none, recorded, fixed, uniform ou lognormal)")
+
+
+def _completion(model: str, content: str, usage: Optional[Dict[str, int]]) -> ChatCompletion:
+    return ChatCompletion.model_validate({
+        "id": "chatcmpl-replay",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "finish_reason": "stop",
+                     "message": {"role": "assistant", "content": content}}],
+        "usage": usage
+    })
+
+
+def _chunk(model: str, content: str) -> ChatCompletionChunk:
+    return ChatCompletionChunk.model_validate({
+        "id": "chatcmpl-replay",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": {"content": content}, "finish_reason": None}]
+    })
+
+
+def _split_chunks(content: str) -> List[str]:
+    words = re.findall(r"\S+\s*|\s+", content) or [content]
+    size = max(1, math.ceil(len(words) / _MAX_STREAM_CHUNKS))
+    return ["".join(words[i:i + size]) for i in range(0, len(words), size)]
+
+
+def _synthetic_response(request: Dict[str, Any]) -> Dict[str, Any]:
+    """Resposta usada no replay sem cassete quando LLM_REPLAY_ON_MISS = "synthetic"."""
+    if (request.get("response_format") or {}).get("type") == "json_object":
+        content = "{}"
+    else:
+        prompt = (request.get("messages") or [{}])[-1].get("content", "")
+        content = f"Resposta sintética para: {' '.join(prompt.split())[:200]}"
+    return {"content": content, "usage": None, "latency_s": None}
+
+
+class RecordingClient:
+    """Encaminha as chamadas ao cliente real e grava as respostas nas cassetes."""
+
+    def __init__(self, live_client: Any, store: CassetteStore):
+        self._live = live_client
+        self._store = store
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    async def _create(self, **request):
+        started = time.perf_counter()
+        response = await self._live.chat.completions.create(**request)
+        if request.get("stream"):
+            return self._record_stream(response, request, started)
+
+        usage = response.usage.model_dump() if getattr(response, "usage", None) else None
+        await asyncio.to_thread(self._store.append, request, {
+            "content": response.choices[0].message.content,
+            "usage": usage,
+            "latency_s": round(time.perf_counter() - started, 4)
+        })
+        return response
+
+    async def _record_stream(self, response, request: Dict[str, Any], started: float):
+        parts = []
+        async for chunk in response:
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+            yield chunk
+        # Só grava streams completos (interrompidos saem pelo GeneratorExit acima)
+        await asyncio.to_thread(self._store.append, request, {
+            "content": "".join(parts),
+            "usage": None,
+            "latency_s": round(time.perf_counter() - started, 4)
+        })
+
+
+class ReplayClient:
+    """
+    Responde a partir das cassetes, sem rede.
+
+    Args:
+        store: Cassetes gravadas
+        latency: Especificação da latência sintética (ver o topo do módulo)
+        on_miss: "error" (CassetteMissError) ou "synthetic" (resposta genérica)
+        seed: Semente da latência aleatória (reprodutibilidade dos testes de carga)
+    """
+
+    def __init__(self, store: CassetteStore, latency: str = "recorded", on_miss: str = "error",
+                 seed: int = None):
+        self._store = store
+        self._latency = parse_latency(latency, random.Random(seed))
+        self.on_miss = on_miss
+        self.stats = {"hits": 0, "misses": 0}
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    async def _create(self, **request):
+        recorded = self._store.next_response(request)
+        if recorded is None:
+            self.stats["misses"] += 1
+            if self.on_miss != "synthetic":
+                raise CassetteMissError(f"Sem cassete para a requisição {cassette_key(request)[:12]}")
+            recorded = _synthetic_response(request)
+        else:
+            self.stats["hits"] += 1
+
+        delay = self._latency(recorded.get("latency_s"))
+        model = request.get("model", "replay")
+        if request.get("stream"):
+            return self._replay_stream(model, recorded["content"], delay)
+        await asyncio.sleep(delay)
+        return _completion(model, recorded["content"], recorded.get("usage"))
+
+    async def _replay_stream(self, model: str, content: str, delay: float):
+        chunks = _split_chunks(content)
+        await asyncio.sleep(delay * _FIRST_CHUNK_FRACTION)
+        per_chunk = delay * (1 - _FIRST_CHUNK_FRACTION) / len(chunks)
+        for index, text in enumerate(chunks):
+            if index and per_chunk:
+                await asyncio.sleep(per_chunk)
+            yield _chunk(model, text)
+
+
+def create_live_client() -> AsyncOpenAI:
+    # Novas tentativas ficam a cargo de app.llm_resilience (max_retries=0 no cliente)
+    return AsyncOpenAI(
+        api_key=os.environ.get("OPENAI_API_KEY"),
+        base_url=config.LLM_BASE_URL,
+        timeout=config.LLM_REQUEST_TIMEOUT,
+        max_retries=0
+    )
+
+
+_stores: Dict[str, CassetteStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_cassette_store(directory: str = None) -> CassetteStore:
+    """Cassetes do diretório (uma instância por diretório, compartilhada pelos loops)."""
+    directory = os.path.abspath(directory or config.LLM_CASSETTE_DIR)
+    with _stores_lock:
+        if directory not in _stores:
+            _stores[directory] = CassetteStore(directory)
+        return _stores[directory]
+
+
+def create_client(mode: str = None) -> Any:
+    """
+    Cria o cliente do modo de transporte (padrão: config.LLM_TRANSPORT).
+
+    Chamada uma vez por event loop por app.llm_integration.
+    """
+    mode = mode or config.LLM_TRANSPORT
+    if mode == "live":
+        return create_live_client()
+    if mode == "record":
+        return RecordingClient(create_live_client(), get_cassette_store())
+    if mode == "replay":
+        return ReplayClient(get_cassette_store(), latency=config.LLM_REPLAY_LATENCY,
+                            on_miss=config.LLM_REPLAY_ON_MISS, seed=config.LLM_REPLAY_SEED)
+    raise ValueError(f"Transporte desconhecido: {mode!r} (use {', '.join(TRANSPORT_MODES)})")
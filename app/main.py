@@ -5,7 +5,9 @@ from app import config
 from app.firestore_client import get_firestore_client
 from app import mapping
 from app.progress_management import continue_progress_flow, dynamic_progress_flow
-from app.llm_integration import call_teacher_llm, TEACHING_STYLES
+from app.llm_integration import call_teacher_llm, is_error_response, TEACHING_STYLES
+from app.semantic_cache import get_semantic_cache, semantic_partition
+from app.usage_ledger import get_usage_ledger, set_usage_user
 import time
 
 # Importar a nova função de setup das trilhas
@@ -41,6 +43,8 @@ def main():
     # Configuração inicial - coleta informações básicas
     print("=== Configuração Inicial ===")
     user_id = input("Informe seu ID de usuário (ou novo ID para cadastro): ").strip()
+    # Chamadas ao LLM desta sessão contam no uso (e no orçamento diário) deste usuário
+    set_usage_user(user_id)
 
     user_doc = db.collection("users").document(user_id).get()
     user_data = {}
@@ -111,6 +115,10 @@ def run_mapping_process(db, user_id, user_data):
     print("\n========== Mapeamento de Interesses ==========")
     print("Responda às perguntas para identificarmos suas áreas de interesse.\n")
 
+    # Carrega o modelo Zero-Shot em segundo plano enquanto o usuário responde
+    if config.ZERO_SHOT_BACKGROUND_WARMUP:
+        mapping.warm_up_classifier(background=True)
+
     # 1) Perguntar qual grande área atrai mais (opcional), com pequena descrição:
     track_keys = list(config.LEARNING_TRACKS.keys())
     print("1) Selecione UMA grande área que mais te atrai (ou Enter para pular):\n")
@@ -296,32 +304,27 @@ def run_mapping_process(db, user_id, user_data):
 
     candidate_labels = config.CANDIDATE_LABELS
 
-    # 5) Zero-shot para cada texto (caso não estejam vazios)
-    text1_scores = {}
-    text2_scores = {}
-    if text1:
-        text1_scores = mapping.zero_shot_analysis(text1, candidate_labels)
-    if text2:
-        text2_scores = mapping.zero_shot_analysis(text2, candidate_labels)
+    # 5) Zero-shot para as duas respostas abertas em uma única passada (textos vazios são ignorados)
+    text1_scores, text2_scores = mapping.zero_shot_analysis_batch([text1, text2], candidate_labels)
 
     # Combinar respostas textuais para análise de personalidade
     text_responses = f"{text1} {text2} {learning_experience}"
     personality_traits = mapping.analyze_user_personality(text_responses)
 
-    # Calcular pesos dinâmicos baseados nas novas informações
-    dynamic_weights = mapping.calculate_dynamic_weights(user_data)
-
-    # 6) Combinar as pontuações (texto1, texto2, MC, Likert)
-    text_combined = mapping.combine_scores({}, text1_scores, weight=1.0)
-    text_combined = mapping.combine_scores(text_combined, text2_scores, weight=1.0)
-
-    final_scores = {}
-    final_scores = mapping.combine_scores(final_scores, mc_scores, weight=dynamic_weights["hobbies"])
-    final_scores = mapping.combine_scores(final_scores, likert_scores, weight=dynamic_weights["likert"])
-    final_scores = mapping.combine_scores(final_scores, text_combined, weight=dynamic_weights["text"])
-
-    # Agregar em trilhas (mantendo o código original)
-    track_scores = mapping.aggregate_learning_tracks(final_scores, config.LEARNING_TRACKS)
+    # 6) Combinar as pontuações (texto1, texto2, MC, Likert) com pesos dinâmicos e
+    # agregar em trilhas
+    text_scores_list = [text1_scores, text2_scores]
+    final_scores, track_scores = mapping.compute_mapping_scores(
+        user_data, mc_scores, likert_scores, text_scores_list
+    )
+
+    # Entradas do mapeamento, guardadas para permitir re-pontuação em lote (app/remap_users.py)
+    mapping_inputs = {
+        "mc_scores": mc_scores,
+        "likert_scores": likert_scores,
+        "texts": [text1, text2],
+        "text_scores": text_scores_list
+    }
 
     # Refinar recomendações com base nos traços de personalidade
     refined_recommendations = mapping.recommend_learning_paths(track_scores, personality_traits)
@@ -436,6 +439,7 @@ def run_mapping_process(db, user_id, user_data):
             "recommended_track": recommended_track,
             "final_scores": final_scores,
             "track_scores": track_scores,
+            "mapping_inputs": mapping_inputs,
             "personality_traits": personality_traits,
             "progress": {
                 "area": recommended_track,
@@ -457,6 +461,7 @@ def run_mapping_process(db, user_id, user_data):
             "recommended_track": recommended_track,
             "final_scores": final_scores,
             "track_scores": track_scores,
+            "mapping_inputs": mapping_inputs,
             "personality_traits": personality_traits,
             "progress": {
                 "area": recommended_track,
@@ -640,6 +645,13 @@ def show_user_statistics(db, user_id, user_data):
         for subarea in completed_subareas:
             print(f"• {subarea}")
 
+    # Exibir uso do professor virtual hoje
+    usage = get_usage_ledger().daily_usage(user_id)
+    budget = f" de {usage['token_budget']}" if usage["token_budget"] else ""
+    print(f"\nUso do professor virtual hoje: {usage['tokens']}{budget} tokens")
+    if usage["exceeded"]:
+        print("Limite diário atingido: as respostas usam conteúdo em cache ou o modelo rápido até amanhã.")
+
     input("\nPressione Enter para continuar...")
 
 
@@ -819,6 +831,10 @@ def ask_virtual_teacher(user_data):
     user_age = user_data.get("age", 14)
     learning_style = user_data.get("learning_style", "didático")
 
+    semantic_cache = get_semantic_cache()
+    partition = semantic_partition(recommended_track, current_subarea,
+                                   current_progress.get("level", "iniciante"), user_age, learning_style)
+
     while True:
         question = input("\n> ").strip()
 
@@ -828,15 +844,21 @@ def ask_virtual_teacher(user_data):
         if not question:
             continue
 
-        print("\nPensando...")
-        answer = call_teacher_llm(
-            f"O aluno está estudando {context} e pergunta: '{question}'. "
-            f"Responda de forma adequada para um estudante de {user_age} anos, "
-            f"usando linguagem clara e acessível.",
-            student_age=user_age,
-            subject_area=recommended_track,
-            teaching_style=learning_style
-        )
+        # Pergunta equivalente já respondida no mesmo contexto
+        answer = semantic_cache.lookup(question, partition) if semantic_cache else None
+        if answer is None:
+            print("\nPensando...")
+            answer = call_teacher_llm(
+                f"O aluno está estudando {context} e pergunta: '{question}'. "
+                f"Responda de forma adequada para um estudante de {user_age} anos, "
+                f"usando linguagem clara e acessível.",
+                student_age=user_age,
+                subject_area=recommended_track,
+                teaching_style=learning_style,
+                task="chat"
+            )
+            if semantic_cache and not is_error_response(answer):
+                semantic_cache.store(question, partition, answer)
 
         print(f"\n[Professor]: {answer}")
 
@@ -1,8 +1,21 @@
 # app/mapping.py
 
-from transformers import pipeline
+import os
+import re
+import time
+import queue
+import atexit
+import sqlite3
+import hashlib
+import itertools
+import threading
+import collections
+import unicodedata
+import multiprocessing
+from concurrent.futures import Future
+import numpy as np
 from app import config
-from app.llm_integration import call_teacher_llm
+from app.llm_integration import generate_json
 import json
 
 # Ajuste o mínimo de score que você considera relevante para uma label
@@ -12,13 +25,197 @@ MIN_SCORE_LOCAL = 0.10
 # você pode definir aqui. Se não quiser limitar, pode deixar None.
 TOP_N = 10
 
-# Instancia o pipeline Zero-Shot
-classifier = pipeline(
-    "zero-shot-classification",
-    model=config.ZERO_SHOT_MODEL
+# Hipótese usada pelo BART-MNLI para comparar o texto com cada rótulo
+HYPOTHESIS_TEMPLATE = "This text is about {}."
+
+# Backends disponíveis para executar o modelo Zero-Shot (ver config.ZERO_SHOT_BACKEND)
+ZERO_SHOT_BACKENDS = ("transformers", "onnx")
+
+
+class ZeroShotClassifierProvider:
+    """
+    Fornece o pipeline Zero-Shot carregando o modelo apenas no primeiro uso.
+
+    O carregamento do BART-large-MNLI leva dezenas de segundos, então ele não
+    acontece mais na importação do módulo. O acesso é thread-safe: várias
+    threads pedindo o classificador ao mesmo tempo disparam um único
+    carregamento. Opcionalmente, o modelo pode ser "aquecido" em uma thread
+    em segundo plano enquanto o usuário responde o questionário.
+    """
+
+    def __init__(self, model_name: str, backend: str = "transformers", quantize: bool = False):
+        if backend not in ZERO_SHOT_BACKENDS:
+            raise ValueError(
+                f"Backend Zero-Shot desconhecido: '{backend}'. Opções: {', '.join(ZERO_SHOT_BACKENDS)}"
+            )
+        self.model_name = model_name
+        self.backend = backend
+        self.quantize = quantize
+        self._classifier = None
+        self._lock = threading.Lock()
+        self._warmup_thread = None
+
+    def _load(self):
+        if self.backend == "onnx":
+            return self._load_onnx()
+
+        # Import tardio: o transformers (e o torch) também custam segundos para importar
+        from transformers import pipeline
+
+        return pipeline(
+            "zero-shot-classification",
+            model=self.model_name
+        )
+
+    def _load_onnx(self):
+        """
+        Carrega o modelo exportado para ONNX e o executa com o ONNX Runtime.
+
+        Na primeira execução o modelo é exportado para config.ZERO_SHOT_ONNX_DIR e,
+        se quantize=True, recebe quantização dinâmica int8. As execuções seguintes
+        reutilizam os arquivos exportados. O resultado continua sendo um pipeline
+        "zero-shot-classification", então o contrato de saída não muda.
+        """
+        from transformers import AutoTokenizer, pipeline
+        try:
+            from optimum.onnxruntime import ORTModelForSequenceClassification, ORTQuantizer
+            from optimum.onnxruntime.configuration import AutoQuantizationConfig
+        except ImportError as e:
+            raise ImportError(
+                "O backend 'onnx' requer o pacote optimum com ONNX Runtime: "
+                "pip install 'optimum[onnxruntime]'"
+            ) from e
+
+        base_dir = os.path.join(config.ZERO_SHOT_ONNX_DIR, self.model_name.replace("/", "__"))
+        fp32_dir = os.path.join(base_dir, "fp32")
+        int8_dir = os.path.join(base_dir, "int8")
+
+        # Exporta o modelo fp32 para ONNX (apenas uma vez)
+        if not os.path.exists(os.path.join(fp32_dir, "model.onnx")):
+            print(f"Exportando {self.model_name} para ONNX em {fp32_dir} (apenas na primeira vez)...")
+            exported = ORTModelForSequenceClassification.from_pretrained(self.model_name, export=True)
+            exported.save_pretrained(fp32_dir)
+            AutoTokenizer.from_pretrained(self.model_name).save_pretrained(fp32_dir)
+
+        model_dir, file_name = fp32_dir, "model.onnx"
+
+        if self.quantize:
+            # Quantização dinâmica: pesos em int8, ativações quantizadas em tempo de execução
+            if not os.path.exists(os.path.join(int8_dir, "model_quantized.onnx")):
+                print(f"Aplicando quantização dinâmica int8 em {int8_dir}...")
+                quantizer = ORTQuantizer.from_pretrained(fp32_dir, file_name="model.onnx")
+                qconfig = AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+                quantizer.quantize(save_dir=int8_dir, quantization_config=qconfig)
+                AutoTokenizer.from_pretrained(fp32_dir).save_pretrained(int8_dir)
+            model_dir, file_name = int8_dir, "model_quantized.onnx"
+
+        model = ORTModelForSequenceClassification.from_pretrained(model_dir, file_name=file_name)
+        tokenizer = AutoTokenizer.from_pretrained(model_dir)
+
+        return pipeline(
+            "zero-shot-classification",
+            model=model,
+            tokenizer=tokenizer
+        )
+
+    def get(self):
+        """Retorna o pipeline, carregando o modelo se ainda não estiver em memória."""
+        if self._classifier is None:
+            with self._lock:
+                # Verifica novamente: outra thread pode ter carregado enquanto esperávamos
+                if self._classifier is None:
+                    self._classifier = self._load()
+        return self._classifier
+
+    def is_loaded(self) -> bool:
+        return self._classifier is not None
+
+    def set(self, classifier):
+        """Substitui o pipeline (ex: um classificador stub em benchmarks)."""
+        with self._lock:
+            self._classifier = classifier
+
+    def warm_up(self, background: bool = True):
+        """
+        Carrega o modelo antecipadamente.
+
+        Com background=True, o carregamento roda em uma thread daemon e a função
+        retorna imediatamente; a primeira chamada a get() aguarda o término.
+        """
+        if not background:
+            self.get()
+            return None
+
+        with self._lock:
+            if self._classifier is not None:
+                return None
+            if self._warmup_thread is None or not self._warmup_thread.is_alive():
+                self._warmup_thread = threading.Thread(
+                    target=self._warm_up_safely,
+                    name="zero-shot-warmup",
+                    daemon=True
+                )
+                self._warmup_thread.start()
+            return self._warmup_thread
+
+    def _warm_up_safely(self):
+        try:
+            self.get()
+        except Exception as e:
+            # Falhas no aquecimento não devem derrubar o CLI; o erro reaparece no uso real
+            print(f"Erro ao pré-carregar o modelo Zero-Shot: {e}")
+
+
+# Provedor do pipeline Zero-Shot (o modelo só é carregado quando necessário)
+_classifier_provider = ZeroShotClassifierProvider(
+    config.ZERO_SHOT_MODEL,
+    backend=config.ZERO_SHOT_BACKEND,
+    quantize=config.ZERO_SHOT_ONNX_QUANTIZE
 )
 
 
+def get_classifier():
+    """Retorna o pipeline Zero-Shot, carregando-o sob demanda."""
+    return _classifier_provider.get()
+
+
+def set_classifier(classifier):
+    """Injeta um pipeline já construído no lugar do modelo configurado."""
+    _classifier_provider.set(classifier)
+
+
+def warm_up_classifier(background: bool = True):
+    """Inicia o carregamento antecipado do modelo Zero-Shot (ver ZeroShotClassifierProvider.warm_up)."""
+    if config.ZERO_SHOT_WORKERS > 0:
+        # Os processos do serviço carregam o modelo assim que iniciam
+        get_zero_shot_service()
+        return None
+    return _classifier_provider.warm_up(background=background)
+
+
+def _filter_scores(labels: list, scores: list, top_n: int = None) -> dict:
+    """
+    Aplica o threshold MIN_SCORE_LOCAL e, opcionalmente, o corte top_n
+    sobre a saída do classificador, retornando {rótulo: score}.
+    """
+    filtered_dict = {}
+
+    # Primeiro, guardamos TODAS que passarem do threshold
+    for lbl, scr in zip(labels, scores):
+        if scr >= MIN_SCORE_LOCAL:
+            # Passou do threshold, guardamos
+            filtered_dict[lbl.lower()] = float(scr)
+
+    # Se quisermos limitar ao top_n, vamos ordenar e recortar
+    if top_n is not None:
+        # Ordena por score desc
+        sorted_items = sorted(filtered_dict.items(), key=lambda x: x[1], reverse=True)
+        # Pega top_n e converte de volta para dict
+        filtered_dict = dict(sorted_items[:top_n])
+
+    return filtered_dict
+
+
 def zero_shot_analysis(text: str, labels: list, top_n: int = None) -> dict:
     """
     Executa a classificação Zero-Shot no texto e retorna um dicionário {rótulo: score}.
@@ -29,37 +226,826 @@ def zero_shot_analysis(text: str, labels: list, top_n: int = None) -> dict:
     3. Filtra as labels que tenham score >= MIN_SCORE_LOCAL.
     4. (Opcional) Se top_n estiver definido, mantém apenas as 'top_n' melhores.
     """
-    if not text.strip():
-        return {}
+    return zero_shot_analysis_batch([text], labels, top_n=top_n)[0]
+
+
+def _service_outputs(service, groups: dict) -> dict:
+    """
+    Classifica os grupos {rótulos: [(i, texto)]} no ZeroShotService.
+
+    Textos cujo processo caiu são reenviados uma vez aos processos restantes; erros
+    da própria classificação e o prazo config.ZERO_SHOT_RESULT_TIMEOUT propagam.
+    """
+    futures = {
+        group_labels: [service.submit(text, list(group_labels)) for _, text in items]
+        for group_labels, items in groups.items()
+    }
+    group_outputs = {}
+    for group_labels, group_futures in futures.items():
+        outputs = []
+        for (_, text), future in zip(groups[group_labels], group_futures):
+            try:
+                outputs.append(future.result(timeout=config.ZERO_SHOT_RESULT_TIMEOUT))
+            except ZeroShotWorkerCrashed:
+                retry = service.submit(text, list(group_labels))
+                outputs.append(retry.result(timeout=config.ZERO_SHOT_RESULT_TIMEOUT))
+        group_outputs[group_labels] = outputs
+    return group_outputs
+
+
+def zero_shot_analysis_batch(texts: list, labels: list, top_n: int = None,
+                             batch_size: int = None) -> list:
+    """
+    Executa a classificação Zero-Shot de vários textos em uma única passada pelo modelo.
+
+    Todos os pares (texto, rótulo) são enviados ao pipeline de uma vez e o próprio
+    pipeline os agrupa em mini-batches com padding, em vez de uma chamada por texto.
+
+    Args:
+        texts: Lista de textos livres (textos vazios resultam em dict vazio)
+        labels: Rótulos candidatos
+        top_n: Se definido, mantém apenas os 'top_n' melhores rótulos de cada texto
+        batch_size: Pares (texto, rótulo) por forward pass (padrão: config.ZERO_SHOT_BATCH_SIZE)
+
+    Returns:
+        Lista com um dicionário {rótulo: score} por texto, na mesma ordem de 'texts'
+    """
+    results = [{} for _ in texts]
+    pending = [(i, text) for i, text in enumerate(texts) if text and text.strip()]
+    if not pending:
+        return results
+
+    # Resultados já calculados saem do cache em disco, sem carregar o modelo
+    cache = get_zero_shot_cache()
+    keys = {}
+    if cache is not None:
+        keys = {i: zero_shot_cache_key(text, labels) for i, text in pending}
+        cached = cache.get_many(list(keys.values()))
+        for i, _ in pending:
+            raw_scores = cached.get(keys[i])
+            if raw_scores is not None:
+                results[i] = _filter_scores(list(raw_scores), list(raw_scores.values()), top_n)
+        pending = [(i, text) for i, text in pending if keys[i] not in cached]
+        if not pending:
+            return results
+
+    # Etapa 1 (opcional): pré-seleciona os rótulos mais promissores de cada texto
+    shortlists = shortlist_labels([text for _, text in pending], labels)
+
+    # Textos com a mesma lista de rótulos vão juntos para o modelo
+    groups = {}
+    for (i, text), text_labels in zip(pending, shortlists):
+        groups.setdefault(tuple(text_labels), []).append((i, text))
+
+    # Etapa 2: executa o zero-shot, no próprio processo (o modelo é carregado aqui na
+    # primeira chamada) ou no serviço com processos dedicados
+    service = get_zero_shot_service()
+    group_outputs = None
+    if service is not None:
+        try:
+            group_outputs = _service_outputs(service, groups)
+        except ZeroShotServiceClosed as e:
+            # Serviço encerrado: este lote roda no próprio processo (o próximo recria o serviço)
+            print(f"Erro no ZeroShotService: {e} Classificando no próprio processo.")
+    if group_outputs is None:
+        classifier = get_classifier()
+        group_outputs = {
+            group_labels: _classify(classifier, [text for _, text in items], list(group_labels), batch_size)
+            for group_labels, items in groups.items()
+        }
+
+    new_entries = {}
+    for group_labels, items in groups.items():
+        outputs = group_outputs[group_labels]
+
+        # Cada saída contém "labels" e "scores" já ordenados (scores decrescente)
+        for (i, _), result in zip(items, outputs):
+            results[i] = _filter_scores(result["labels"], result["scores"], top_n)
+            if cache is not None:
+                # Guardamos os scores brutos: threshold e top_n são aplicados na leitura
+                new_entries[keys[i]] = {
+                    lbl: float(scr) for lbl, scr in zip(result["labels"], result["scores"])
+                }
+
+    if new_entries:
+        cache.set_many(new_entries)
+
+    return results
+
+
+class TfidfLabelRetriever:
+    """
+    Pré-seleção de rótulos por similaridade TF-IDF de n-gramas de caracteres.
+
+    N-gramas de caracteres toleram variações de flexão ("programar"/"programação")
+    e não exigem download de modelo.
+    """
+
+    def __init__(self, labels: list):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+
+        self.labels = list(labels)
+        self._vectorizer = TfidfVectorizer(
+            analyzer="char_wb",
+            ngram_range=(3, 5),
+            strip_accents="unicode"
+        )
+        self._label_matrix = self._vectorizer.fit_transform(self.labels)
+
+    def similarities(self, texts: list) -> np.ndarray:
+        # As linhas do TF-IDF já são normalizadas (L2), então o produto é o cosseno
+        return (self._vectorizer.transform(texts) @ self._label_matrix.T).toarray()
+
+
+class EmbeddingLabelRetriever:
+    """
+    Pré-seleção de rótulos por similaridade de embeddings (bi-encoder).
+
+    Os embeddings dos rótulos são calculados uma única vez; cada texto exige
+    apenas um forward pass no modelo de embeddings, independente do número de rótulos.
+    """
+
+    def __init__(self, labels: list, model_name: str = None):
+        from transformers import pipeline
+
+        self.labels = list(labels)
+        self._extractor = pipeline(
+            "feature-extraction",
+            model=model_name or config.ZERO_SHOT_PREFILTER_EMBEDDING_MODEL
+        )
+        self._label_vectors = self._embed(self.labels)
+
+    def _embed(self, texts: list) -> np.ndarray:
+        outputs = self._extractor(texts, truncation=True)
+        # Mean pooling dos tokens e normalização para similaridade por cosseno
+        vectors = np.array([np.asarray(out[0]).mean(axis=0) for out in outputs])
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.clip(norms, 1e-12, None)
+
+    def similarities(self, texts: list) -> np.ndarray:
+        return self._embed(texts) @ self._label_vectors.T
+
+
+# Estratégias de pré-seleção disponíveis (ver config.ZERO_SHOT_PREFILTER)
+LABEL_RETRIEVERS = {
+    "tfidf": TfidfLabelRetriever,
+    "embedding": EmbeddingLabelRetriever
+}
+
+# Retrievers já ajustados, por (estratégia, conjunto de rótulos)
+_label_retrievers = {}
+_label_retrievers_lock = threading.Lock()
+
+
+def _get_label_retriever(name: str, labels: list):
+    if name not in LABEL_RETRIEVERS:
+        raise ValueError(
+            f"Pré-filtro de rótulos desconhecido: '{name}'. Opções: {', '.join(LABEL_RETRIEVERS)}"
+        )
+    key = (name, tuple(labels))
+    with _label_retrievers_lock:
+        if key not in _label_retrievers:
+            _label_retrievers[key] = LABEL_RETRIEVERS[name](labels)
+        return _label_retrievers[key]
+
+
+def shortlist_labels(texts: list, labels: list, retriever: str = None, top_k: int = None) -> list:
+    """
+    Seleciona, para cada texto, os top_k rótulos mais similares antes do Zero-Shot.
+
+    O cross-encoder (BART-MNLI) custa um forward pass por par (texto, rótulo); a
+    pré-seleção reduz esse custo de len(labels) para top_k passes por texto.
+    Sem pré-filtro configurado (ou com top_k <= 0 ou top_k >= len(labels)), retorna
+    todos os rótulos.
+
+    Args:
+        texts: Textos a classificar
+        labels: Rótulos candidatos
+        retriever: Estratégia de LABEL_RETRIEVERS (padrão: config.ZERO_SHOT_PREFILTER)
+        top_k: Rótulos mantidos por texto (padrão: config.ZERO_SHOT_PREFILTER_TOP_K)
+
+    Returns:
+        Lista com a lista de rótulos selecionados para cada texto
+    """
+    retriever = retriever if retriever is not None else config.ZERO_SHOT_PREFILTER
+    if top_k is None:
+        top_k = config.ZERO_SHOT_PREFILTER_TOP_K
+
+    if not retriever or retriever == "none" or top_k <= 0 or top_k >= len(labels):
+        return [list(labels) for _ in texts]
+
+    similarities = _get_label_retriever(retriever, labels).similarities(texts)
+
+    shortlists = []
+    for row in similarities:
+        top_idx = np.argpartition(-row, top_k - 1)[:top_k]
+        top_idx = top_idx[np.argsort(-row[top_idx])]
+        shortlists.append([labels[j] for j in top_idx])
+    return shortlists
+
+
+def _normalize_text(text: str) -> str:
+    """Normaliza o texto para a chave de cache (Unicode NFC, caixa e espaços)."""
+    text = unicodedata.normalize("NFC", text)
+    return re.sub(r"\s+", " ", text).strip().casefold()
+
+
+def zero_shot_cache_key(text: str, labels: list) -> str:
+    """
+    Gera a chave de cache de um resultado Zero-Shot.
+
+    A chave combina o texto normalizado, um hash do conjunto de rótulos, a
+    hipótese e a identificação do modelo (incluindo backend e pré-filtro, que
+    também alteram os scores). Mudar qualquer um deles invalida as entradas antigas.
+    """
+    labels_hash = hashlib.sha256("\n".join(sorted(set(labels))).encode("utf-8")).hexdigest()
+    model_id = (
+        f"{config.ZERO_SHOT_MODEL}|{config.ZERO_SHOT_BACKEND}"
+        f"|int8={config.ZERO_SHOT_BACKEND == 'onnx' and config.ZERO_SHOT_ONNX_QUANTIZE}"
+        f"|prefilter={config.ZERO_SHOT_PREFILTER}:{config.ZERO_SHOT_PREFILTER_TOP_K}"
+        f"|chunks={config.ZERO_SHOT_CHUNK_TOKENS}:{config.ZERO_SHOT_CHUNK_OVERLAP}"
+        f":{_chunk_aggregation()}"
+    )
+    payload = json.dumps(
+        [_normalize_text(text), labels_hash, HYPOTHESIS_TEMPLATE, model_id],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
 
-    # Executa o zero-shot
-    result = classifier(
-        sequences=text,
+class ZeroShotResultCache:
+    """
+    Cache persistente (SQLite) dos scores brutos do Zero-Shot.
+
+    Sobrevive a reinicializações e é compartilhado entre processos que usam o
+    mesmo arquivo. Quando o número de entradas passa de max_entries, as menos
+    acessadas recentemente são removidas.
+    """
+
+    def __init__(self, path: str, max_entries: int = 50000):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS zero_shot_cache ("
+                "key TEXT PRIMARY KEY, scores TEXT NOT NULL, last_access REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_zero_shot_last_access ON zero_shot_cache (last_access)"
+            )
+            self._initialized = True
+        return conn
+
+    def get_many(self, keys: list) -> dict:
+        """Retorna {chave: {rótulo: score}} apenas para as chaves encontradas."""
+        if not keys:
+            return {}
+        placeholders = ",".join("?" for _ in keys)
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn:
+                    rows = conn.execute(
+                        f"SELECT key, scores FROM zero_shot_cache WHERE key IN ({placeholders})", keys
+                    ).fetchall()
+                    if rows:
+                        now = time.time()
+                        conn.executemany(
+                            "UPDATE zero_shot_cache SET last_access = ? WHERE key = ?",
+                            [(now, key) for key, _ in rows]
+                        )
+            finally:
+                conn.close()
+        return {key: json.loads(scores) for key, scores in rows}
+
+    def set_many(self, entries: dict):
+        """Grava {chave: {rótulo: score}} e aplica o limite de tamanho."""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO zero_shot_cache (key, scores, last_access) VALUES (?, ?, ?)",
+                        [(key, json.dumps(scores, ensure_ascii=False), now) for key, scores in entries.items()]
+                    )
+                    count = conn.execute("SELECT COUNT(*) FROM zero_shot_cache").fetchone()[0]
+                    if count > self.max_entries:
+                        conn.execute(
+                            "DELETE FROM zero_shot_cache WHERE key IN ("
+                            "SELECT key FROM zero_shot_cache ORDER BY last_access ASC LIMIT ?)",
+                            (count - self.max_entries,)
+                        )
+            finally:
+                conn.close()
+
+
+_zero_shot_cache = None
+_zero_shot_cache_lock = threading.Lock()
+
+
+def get_zero_shot_cache():
+    """Retorna o cache persistente do Zero-Shot, ou None se estiver desabilitado."""
+    global _zero_shot_cache
+    if not config.ZERO_SHOT_CACHE_ENABLED:
+        return None
+    with _zero_shot_cache_lock:
+        if _zero_shot_cache is None:
+            os.makedirs(os.path.dirname(config.ZERO_SHOT_CACHE_PATH), exist_ok=True)
+            _zero_shot_cache = ZeroShotResultCache(
+                config.ZERO_SHOT_CACHE_PATH,
+                max_entries=config.ZERO_SHOT_CACHE_MAX_ENTRIES
+            )
+        return _zero_shot_cache
+
+
+def _classify(classifier, texts: list, labels: list, batch_size: int = None) -> list:
+    """
+    Chama o pipeline Zero-Shot e retorna a saída bruta (sem threshold) de cada texto.
+
+    Textos curtos vão juntos em uma única chamada. Textos maiores que
+    config.ZERO_SHOT_CHUNK_TOKENS são divididos em trechos com sobreposição,
+    classificados trecho a trecho e combinados (ver _classify_chunks), em vez de
+    serem truncados silenciosamente pelo modelo.
+    """
+    # Cada rótulo é avaliado uma única vez por trecho, mesmo se vier repetido
+    labels = list(dict.fromkeys(labels))
+    max_tokens = config.ZERO_SHOT_CHUNK_TOKENS
+
+    outputs = [None] * len(texts)
+    short = []
+    for i, text in enumerate(texts):
+        # Cada token tem ao menos um caractere: textos com até max_tokens caracteres cabem inteiros
+        if len(text) <= max_tokens:
+            short.append(i)
+            continue
+
+        chunks = iter_text_chunks(text, classifier.tokenizer, max_tokens, config.ZERO_SHOT_CHUNK_OVERLAP)
+        first = next(chunks, None)
+        second = next(chunks, None)
+        if second is None:
+            short.append(i)
+        else:
+            outputs[i] = _classify_chunks(
+                classifier, itertools.chain([first, second], chunks), labels, batch_size
+            )
+
+    if short:
+        for i, result in zip(short, _run_pipeline(classifier, [texts[i] for i in short], labels, batch_size)):
+            outputs[i] = result
+    return outputs
+
+
+def _run_pipeline(classifier, texts: list, labels: list, batch_size: int = None) -> list:
+    outputs = classifier(
+        sequences=texts,
         candidate_labels=labels,
         multi_label=True,
-        hypothesis_template="This text is about {}."
+        hypothesis_template=HYPOTHESIS_TEMPLATE,
+        batch_size=batch_size or config.ZERO_SHOT_BATCH_SIZE
     )
 
-    # "result" contém "labels" e "scores" já ordenados (scores decrescente).
-    filtered_dict = {}
+    # Com uma única sequência o pipeline retorna um dict em vez de lista
+    if isinstance(outputs, dict):
+        outputs = [outputs]
+    return outputs
 
-    # Primeiro, guardamos TODAS que passarem do threshold
-    for i, lbl in enumerate(result["labels"]):
-        scr = result["scores"][i]
-        if scr >= MIN_SCORE_LOCAL:
-            # Passou do threshold, guardamos
-            filtered_dict[lbl.lower()] = float(scr)
 
-    # Se quisermos limitar ao top_n, vamos ordenar e recortar
-    if top_n is not None:
-        # Ordena por score desc
-        sorted_items = sorted(filtered_dict.items(), key=lambda x: x[1], reverse=True)
-        # Pega top_n
-        top_items = sorted_items[:top_n]
-        # Converte de volta para dict
-        filtered_dict = dict(top_items)
+def _iter_word_tokens(text: str, tokenizer, max_tokens: int):
+    """Palavras do texto com o número de tokens de cada uma (nenhuma acima de max_tokens)."""
+    for match in re.finditer(r"\S+", text):
+        word = match.group()
+        token_ids = tokenizer(" " + word, add_special_tokens=False)["input_ids"]
+        if len(token_ids) <= max_tokens:
+            yield word, max(1, len(token_ids))
+            continue
+        for start in range(0, len(token_ids), max_tokens):
+            piece_ids = token_ids[start:start + max_tokens]
+            piece = tokenizer.decode(piece_ids).strip()
+            if piece:
+                yield piece, len(piece_ids)
 
-    return filtered_dict
+
+def iter_text_chunks(text: str, tokenizer, max_tokens: int, overlap_tokens: int):
+    """
+    Gera trechos do texto com até max_tokens tokens e overlap_tokens de sobreposição.
+
+    O texto é percorrido palavra a palavra e só a janela atual fica em memória, então
+    o consumo não depende do tamanho da entrada. A contagem de tokens usa o tokenizer
+    do próprio modelo (palavra a palavra, uma aproximação fiel o bastante para BPE).
+    Uma "palavra" com mais de max_tokens tokens (URL, código, texto sem espaços) é
+    dividida pelos ids dos tokens, para nenhum trecho passar do limite.
+    """
+    window = collections.deque()  # (palavra, número de tokens)
+    window_tokens = 0
+    new_words = 0
+
+    for word, n_tokens in _iter_word_tokens(text, tokenizer, max_tokens):
+        if window and window_tokens + n_tokens > max_tokens:
+            yield " ".join(w for w, _ in window)
+            new_words = 0
+            # Mantém o final da janela como sobreposição com o próximo trecho
+            while window and (window_tokens > overlap_tokens or window_tokens + n_tokens > max_tokens):
+                _, removed = window.popleft()
+                window_tokens -= removed
+
+        window.append((word, n_tokens))
+        window_tokens += n_tokens
+        new_words += 1
+
+    if new_words:
+        yield " ".join(w for w, _ in window)
+
+
+CHUNK_AGGREGATIONS = ("max", "mean")
+
+
+def _chunk_aggregation() -> str:
+    """config.ZERO_SHOT_CHUNK_AGGREGATION validado (um valor errado não vira "mean" em silêncio)."""
+    aggregation = config.ZERO_SHOT_CHUNK_AGGREGATION
+    if aggregation not in CHUNK_AGGREGATIONS:
+        raise ValueError(f"ZERO_SHOT_CHUNK_AGGREGATION inválido: '{aggregation}'. "
+                         f"Opções: {', '.join(CHUNK_AGGREGATIONS)}")
+    return aggregation
+
+
+def _classify_chunks(classifier, chunks, labels: list, batch_size: int = None) -> dict:
+    """
+    Classifica os trechos de um texto longo e combina os scores de forma incremental.
+
+    Os trechos são processados em grupos de config.ZERO_SHOT_CHUNK_BATCH e os scores
+    agregados em um único vetor (máximo ou média, conforme
+    config.ZERO_SHOT_CHUNK_AGGREGATION), sem guardar as saídas de cada trecho.
+    """
+    aggregation = _chunk_aggregation()
+    label_pos = {label: j for j, label in enumerate(labels)}
+    running = None
+    count = 0
+
+    while True:
+        group = list(itertools.islice(chunks, config.ZERO_SHOT_CHUNK_BATCH))
+        if not group:
+            break
+        for out in _run_pipeline(classifier, group, labels, batch_size):
+            scores = np.empty(len(labels))
+            for label, score in zip(out["labels"], out["scores"]):
+                scores[label_pos[label]] = score
+
+            if running is None:
+                running = scores
+            elif aggregation == "max":
+                np.maximum(running, scores, out=running)
+            else:
+                running += scores
+            count += 1
+
+    if aggregation == "mean":
+        running /= count
+
+    order = np.argsort(-running)
+    return {
+        "labels": [labels[j] for j in order],
+        "scores": running[order].tolist()
+    }
+
+
+class ZeroShotServiceClosed(RuntimeError):
+    """O ZeroShotService foi encerrado (shutdown ou todos os processos caíram)."""
+
+
+class ZeroShotWorkerCrashed(RuntimeError):
+    """O processo que classificava o texto caiu; o serviço segue com os demais."""
+
+
+def _zero_shot_worker_main(tasks, results, model_name: str, backend: str, quantize: bool,
+                           batch_size: int, num_threads: int):
+    """
+    Laço de um processo do ZeroShotService: carrega o próprio modelo e processa micro-batches.
+
+    Cada tarefa é (id da tarefa, textos, rótulos); a resposta é (id da tarefa, saídas, erro).
+    """
+    try:
+        import torch
+        # Divide os núcleos entre os processos em vez de cada um disputar todos
+        torch.set_num_threads(num_threads)
+    except ImportError:
+        pass
+
+    classifier = ZeroShotClassifierProvider(model_name, backend=backend, quantize=quantize).get()
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        task_id, texts, labels = task
+        try:
+            outputs = _classify(classifier, texts, labels, batch_size)
+            results.put((task_id, outputs, None))
+        except Exception as e:
+            results.put((task_id, None, f"{type(e).__name__}: {e}"))
+
+
+class ZeroShotService:
+    """
+    Serviço de classificação Zero-Shot com N processos, cada um com sua cópia do modelo.
+
+    Chamadas concorrentes (de várias threads) entram em uma fila de submissão; uma
+    thread despachante junta os pedidos que chegam dentro de max_wait_ms em
+    micro-batches (agrupados pelo conjunto de rótulos) e os envia ao processo com
+    menos tarefas em andamento. Cada submissão retorna um Future com a saída bruta
+    do pipeline ({"labels": [...], "scores": [...]}). Como cada processo tem seu
+    próprio GIL, a vazão cresce com o número de núcleos.
+
+    A thread coletora verifica os processos a cada passada: se um cai, os Futures
+    das tarefas dele falham com ZeroShotWorkerCrashed e os demais seguem
+    atendendo; se todos caem, o serviço é encerrado (ZeroShotServiceClosed).
+    """
+
+    def __init__(self, num_workers: int, model_name: str = None, backend: str = None,
+                 quantize: bool = None, batch_size: int = None,
+                 max_batch_texts: int = None, max_wait_ms: float = None,
+                 worker_main=_zero_shot_worker_main):
+        self.num_workers = num_workers
+        self.max_batch_texts = max_batch_texts or config.ZERO_SHOT_MAX_BATCH_TEXTS
+        self.max_wait = (max_wait_ms if max_wait_ms is not None else config.ZERO_SHOT_MAX_BATCH_WAIT_MS) / 1000.0
+
+        # "spawn" evita herdar locks e threads do processo pai (fork + torch é frágil)
+        ctx = multiprocessing.get_context("spawn")
+        # Uma fila por processo: o despachante sabe quais tarefas cada um tem em andamento
+        self._task_queues = [ctx.Queue() for _ in range(num_workers)]
+        self._results = ctx.Queue()
+        num_threads = max(1, (os.cpu_count() or 1) // num_workers)
+        self._workers = [
+            ctx.Process(
+                target=worker_main,
+                args=(
+                    self._task_queues[n],
+                    self._results,
+                    model_name or config.ZERO_SHOT_MODEL,
+                    backend or config.ZERO_SHOT_BACKEND,
+                    config.ZERO_SHOT_ONNX_QUANTIZE if quantize is None else quantize,
+                    batch_size or config.ZERO_SHOT_BATCH_SIZE,
+                    num_threads
+                ),
+                name=f"zero-shot-worker-{n}",
+                daemon=True
+            )
+            for n in range(num_workers)
+        ]
+
+        self._submissions = queue.Queue()
+        self._pending = {}  # id do pedido -> Future
+        self._in_flight = {}  # id da tarefa -> (processo, ids dos pedidos)
+        self._dead_workers = set()
+        self._pending_lock = threading.Lock()
+        self._ids = itertools.count()
+        self._task_ids = itertools.count()
+        self._closed = False
+
+        for worker in self._workers:
+            worker.start()
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name="zero-shot-dispatcher", daemon=True)
+        self._collector = threading.Thread(target=self._collect_loop, name="zero-shot-collector", daemon=True)
+        self._dispatcher.start()
+        self._collector.start()
+
+    def submit(self, text: str, labels: list) -> Future:
+        """Enfileira um texto para classificação e retorna um Future com a saída bruta."""
+        if self._closed:
+            raise ZeroShotServiceClosed("ZeroShotService já foi encerrado.")
+        future = Future()
+        request_id = next(self._ids)
+        with self._pending_lock:
+            self._pending[request_id] = future
+        self._submissions.put((request_id, text, tuple(labels)))
+        return future
+
+    def _dispatch_loop(self):
+        while True:
+            first = self._submissions.get()
+            if first is None:
+                return
+            batch = [first]
+            deadline = time.monotonic() + self.max_wait
+
+            # Junta os pedidos concorrentes que chegarem até o prazo (micro-batching)
+            while len(batch) < self.max_batch_texts:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._submissions.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._submissions.put(None)  # Reprocessa o sinal de parada no próximo laço
+                    break
+                batch.append(item)
+
+            groups = {}
+            for request_id, text, labels in batch:
+                groups.setdefault(labels, []).append((request_id, text))
+            for labels, items in groups.items():
+                request_ids = [rid for rid, _ in items]
+                task_id = next(self._task_ids)
+                with self._pending_lock:
+                    alive = [n for n in range(self.num_workers) if n not in self._dead_workers]
+                    if alive:
+                        loads = collections.Counter(n for n, _ in self._in_flight.values())
+                        worker = min(alive, key=lambda n: loads[n])
+                        self._in_flight[task_id] = (worker, request_ids)
+                if not alive:
+                    self._fail_requests(request_ids, ZeroShotServiceClosed("Nenhum processo do ZeroShotService ativo."))
+                    continue
+                self._task_queues[worker].put((task_id, [text for _, text in items], list(labels)))
+
+    def _fail_requests(self, request_ids: list, exc: Exception):
+        with self._pending_lock:
+            futures = [self._pending.pop(rid, None) for rid in request_ids]
+        for future in futures:
+            if future is not None:
+                future.set_exception(exc)
+
+    def _complete(self, message):
+        task_id, outputs, error = message
+        with self._pending_lock:
+            _, request_ids = self._in_flight.pop(task_id, (None, []))
+            futures = [self._pending.pop(rid, None) for rid in request_ids]
+        for n, future in enumerate(futures):
+            if future is None:
+                continue
+            if error is not None:
+                future.set_exception(RuntimeError(f"Erro no processo Zero-Shot: {error}"))
+            else:
+                future.set_result(outputs[n])
+
+    def _drain_results(self):
+        while True:
+            try:
+                self._complete(self._results.get_nowait())
+            except queue.Empty:
+                return
+
+    def _check_workers(self):
+        # Processos que caíram: falha só as tarefas deles; sem nenhum ativo, encerra o serviço
+        newly_dead = [
+            n for n, worker in enumerate(self._workers)
+            if n not in self._dead_workers and not worker.is_alive()
+        ]
+        if not newly_dead:
+            return
+        # Respostas que o processo entregou antes de cair ainda valem
+        self._drain_results()
+        with self._pending_lock:
+            self._dead_workers.update(newly_dead)
+            lost = [task_id for task_id, (worker, _) in self._in_flight.items() if worker in newly_dead]
+            request_ids = [rid for task_id in lost for rid in self._in_flight.pop(task_id)[1]]
+            all_dead = len(self._dead_workers) == self.num_workers
+        for n in newly_dead:
+            print(f"Processo zero-shot-worker-{n} do ZeroShotService terminou inesperadamente "
+                  f"(código {self._workers[n].exitcode}).")
+        self._fail_requests(request_ids, ZeroShotWorkerCrashed("O processo Zero-Shot caiu durante a classificação."))
+        if all_dead:
+            self._fail_pending(ZeroShotServiceClosed("Todos os processos do ZeroShotService terminaram."))
+
+    def _collect_loop(self):
+        while True:
+            try:
+                self._complete(self._results.get(timeout=0.5))
+            except queue.Empty:
+                pass
+            if self._closed:
+                if not any(worker.is_alive() for worker in self._workers):
+                    self._drain_results()
+                    return
+                continue
+            # A cada passada, não só quando a fila de respostas fica vazia
+            self._check_workers()
+
+    def _fail_pending(self, exc: Exception):
+        self._closed = True
+        with self._pending_lock:
+            futures = list(self._pending.values())
+            self._pending.clear()
+            self._in_flight.clear()
+        for future in futures:
+            future.set_exception(exc)
+
+        # Encerra o despachante e os processos restantes; get_zero_shot_service cria outro serviço
+        self._submissions.put(None)
+        for worker in self._workers:
+            if worker.is_alive():
+                worker.terminate()
+
+    @property
+    def closed(self) -> bool:
+        """Se o serviço foi encerrado (por shutdown ou pela queda de todos os processos)."""
+        return self._closed
+
+    def shutdown(self, wait: bool = True):
+        """Encerra o despachante e os processos."""
+        if self._closed:
+            return
+        self._closed = True
+        self._submissions.put(None)
+        self._dispatcher.join()
+        for task_queue in self._task_queues:
+            task_queue.put(None)
+        if wait:
+            for worker in self._workers:
+                worker.join()
+
+
+_zero_shot_service = None
+_zero_shot_service_lock = threading.Lock()
+
+
+def get_zero_shot_service():
+    """
+    Retorna o ZeroShotService (iniciado no primeiro uso e recriado se foi encerrado
+    porque todos os processos caíram), ou None quando config.ZERO_SHOT_WORKERS é 0 e a classificação roda
+    no próprio processo.
+    """
+    global _zero_shot_service
+    if config.ZERO_SHOT_WORKERS <= 0:
+        return None
+    with _zero_shot_service_lock:
+        if _zero_shot_service is not None and _zero_shot_service.closed:
+            atexit.unregister(_zero_shot_service.shutdown)
+            _zero_shot_service = None
+        if _zero_shot_service is None:
+            _zero_shot_service = ZeroShotService(config.ZERO_SHOT_WORKERS)
+            atexit.register(_zero_shot_service.shutdown)
+        return _zero_shot_service
+
+
+def backend_agreement_report(texts: list, labels: list, backend: str = "onnx",
+                             quantize: bool = True, top_n: int = TOP_N) -> dict:
+    """
+    Compara os scores de um backend alternativo com o modelo fp32 do transformers.
+
+    Para cada texto são calculados a sobreposição dos top_n rótulos, a concordância
+    do rótulo principal e a diferença absoluta dos scores. Serve para verificar se
+    a exportação/quantização mantém as recomendações estáveis.
+
+    Args:
+        texts: Textos de referência (ex: respostas reais anonimizadas)
+        labels: Rótulos candidatos
+        backend: Backend a comparar com a referência fp32
+        quantize: Se o backend alternativo deve usar quantização int8
+        top_n: Quantidade de rótulos considerada na comparação
+
+    Returns:
+        Dicionário com métricas agregadas e o detalhe por texto
+    """
+    texts = [text for text in texts if text and text.strip()]
+    if not texts:
+        return {}
+
+    reference = ZeroShotClassifierProvider(config.ZERO_SHOT_MODEL, backend="transformers")
+    candidate = ZeroShotClassifierProvider(config.ZERO_SHOT_MODEL, backend=backend, quantize=quantize)
+
+    reference_outputs = _classify(reference.get(), texts, labels)
+    candidate_outputs = _classify(candidate.get(), texts, labels)
+
+    per_text = []
+    for text, ref, cand in zip(texts, reference_outputs, candidate_outputs):
+        ref_scores = dict(zip(ref["labels"], ref["scores"]))
+        cand_scores = dict(zip(cand["labels"], cand["scores"]))
+        ref_top = ref["labels"][:top_n]
+        cand_top = cand["labels"][:top_n]
+        diffs = [abs(ref_scores[lbl] - cand_scores.get(lbl, 0.0)) for lbl in ref_scores]
+
+        per_text.append({
+            "text": text[:80],
+            "top1_match": ref_top[:1] == cand_top[:1],
+            "top_n_overlap": len(set(ref_top) & set(cand_top)) / max(len(ref_top), 1),
+            "max_abs_diff": max(diffs),
+            "mean_abs_diff": sum(diffs) / len(diffs),
+            "reference_top": ref_top,
+            "candidate_top": cand_top
+        })
+
+    total = len(per_text)
+    return {
+        "backend": backend,
+        "quantize": quantize,
+        "model": config.ZERO_SHOT_MODEL,
+        "top_n": top_n,
+        "texts": total,
+        "top1_agreement": sum(1 for r in per_text if r["top1_match"]) / total,
+        "mean_top_n_overlap": sum(r["top_n_overlap"] for r in per_text) / total,
+        "min_top_n_overlap": min(r["top_n_overlap"] for r in per_text),
+        "max_abs_diff": max(r["max_abs_diff"] for r in per_text),
+        "mean_abs_diff": sum(r["mean_abs_diff"] for r in per_text) / total,
+        "per_text": per_text
+    }
 
 
 def combine_scores(base_scores: dict, new_scores: dict, weight: float = 1.0) -> dict:
@@ -86,6 +1072,149 @@ def normalize_scale(value: int) -> float:
     return (v - 1.0) / 4.0
 
 
+class LabelSpace:
+    """
+    Espaço de rótulos compilado a partir de CANDIDATE_LABELS e LEARNING_TRACKS.
+
+    Mantém um índice único de rótulos (sem duplicatas) e uma matriz esparsa
+    trilha × rótulo com a pertinência de cada rótulo às trilhas. Com os scores
+    em vetores (ou matrizes, um perfil por linha), combinação, threshold e média
+    por trilha viram operações vetorizadas — re-pontuar milhares de perfis
+    armazenados leva milissegundos.
+
+    Rótulos que não estão no espaço (ex: hobbies e escalas Likert do questionário)
+    podem ser acrescentados com vectorize_many(..., extend=True): viram colunas
+    fora de todas as trilhas, então entram na combinação sem afetar a agregação.
+    """
+
+    def __init__(self, labels: list, learning_tracks: dict):
+        from scipy import sparse
+
+        label_index = {}
+        for label in list(labels) + [lbl for track_labels in learning_tracks.values() for lbl in track_labels]:
+            label_index.setdefault(label, len(label_index))
+
+        self.label_index = label_index
+        self.labels = list(label_index)
+        self.tracks = list(learning_tracks)
+        self._compiled_labels = len(self.labels)
+        self._extend_lock = threading.Lock()
+
+        rows, cols = [], []
+        for t, track_labels in enumerate(learning_tracks.values()):
+            for label in track_labels:
+                rows.append(t)
+                cols.append(label_index[label])
+
+        # Entradas repetidas são somadas, preservando rótulos duplicados dentro de uma trilha
+        self.membership = sparse.csr_matrix(
+            (np.ones(len(rows)), (rows, cols)),
+            shape=(len(self.tracks), len(self.labels))
+        )
+
+    def vectorize(self, scores: dict) -> np.ndarray:
+        """Converte {rótulo: score} em vetor; rótulos fora do espaço são ignorados."""
+        vector = np.zeros(len(self.labels))
+        for label, value in scores.items():
+            j = self.label_index.get(label)
+            if j is not None:
+                vector[j] = value
+        return vector
+
+    def _extend(self, labels):
+        # Acrescenta rótulos novos ao fim do índice (fora da matriz de trilhas)
+        with self._extend_lock:
+            for label in labels:
+                if label not in self.label_index:
+                    self.label_index[label] = len(self.labels)
+                    self.labels.append(label)
+
+    def vectorize_many(self, score_dicts: list, extend: bool = False) -> np.ndarray:
+        """
+        Converte vários {rótulo: score} em uma matriz (um perfil por linha).
+
+        Com extend=True, rótulos fora do espaço são acrescentados a ele em vez de ignorados.
+        """
+        if extend:
+            unknown = [label for scores in score_dicts for label in scores if label not in self.label_index]
+            if unknown:
+                self._extend(unknown)
+        entries = [
+            (i, self.label_index.get(label), value)
+            for i, scores in enumerate(score_dicts)
+            for label, value in scores.items()
+        ]
+        matrix = np.zeros((len(score_dicts), len(self.labels)))
+        for i, j, value in entries:
+            if j is not None:
+                matrix[i, j] = value
+        return matrix
+
+    def to_dict(self, vector: np.ndarray) -> dict:
+        """Converte um vetor de scores em {rótulo: score}, omitindo zeros."""
+        return {self.labels[j]: float(vector[j]) for j in np.flatnonzero(vector)}
+
+    @staticmethod
+    def combine(base: np.ndarray, new: np.ndarray, weight: float = 1.0) -> np.ndarray:
+        """Mesma fórmula de combine_scores, aplicada a vetores ou matrizes."""
+        return (base + weight * new) / 2
+
+    def aggregate_tracks(self, scores: np.ndarray, min_score_threshold: float = 0.05) -> np.ndarray:
+        """
+        Média, por trilha, dos scores acima do threshold.
+
+        Aceita um vetor (um perfil) ou uma matriz (perfis × rótulos). Trilhas sem
+        nenhum rótulo acima do threshold ficam com NaN.
+        """
+        # Colunas acrescentadas por extend não pertencem a nenhuma trilha
+        scores = scores[..., :self._compiled_labels]
+        mask = scores >= min_score_threshold
+        totals = np.asarray((self.membership @ np.where(mask, scores, 0.0).T).T)
+        counts = np.asarray((self.membership @ mask.T.astype(float)).T)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(counts > 0, totals / counts, np.nan)
+
+    def track_scores_to_dict(self, track_vector: np.ndarray) -> dict:
+        """Converte o vetor de aggregate_tracks em {trilha: score}, omitindo NaN."""
+        return {
+            self.tracks[t]: float(track_vector[t])
+            for t in range(len(self.tracks))
+            if not np.isnan(track_vector[t])
+        }
+
+
+# LabelSpaces compilados, pelo hash do conteúdo dos rótulos e trilhas (os mais recentes)
+_label_spaces = collections.OrderedDict()
+_label_spaces_lock = threading.Lock()
+MAX_LABEL_SPACES = 8
+
+
+def _label_space_key(labels: list, learning_tracks: dict) -> str:
+    content = json.dumps([list(labels), learning_tracks], ensure_ascii=False)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def get_label_space(labels: list = None, learning_tracks: dict = None) -> LabelSpace:
+    """
+    Retorna o LabelSpace dos rótulos e trilhas (padrão: config.CANDIDATE_LABELS e
+    config.LEARNING_TRACKS), compilado uma vez por conteúdo: listas iguais, mesmo
+    que sejam outros objetos, reaproveitam o mesmo espaço.
+    """
+    labels = config.CANDIDATE_LABELS if labels is None else labels
+    learning_tracks = config.LEARNING_TRACKS if learning_tracks is None else learning_tracks
+    key = _label_space_key(labels, learning_tracks)
+    with _label_spaces_lock:
+        space = _label_spaces.get(key)
+        if space is None:
+            space = LabelSpace(labels, learning_tracks)
+            _label_spaces[key] = space
+            if len(_label_spaces) > MAX_LABEL_SPACES:
+                _label_spaces.popitem(last=False)
+        else:
+            _label_spaces.move_to_end(key)
+        return space
+
+
 def aggregate_learning_tracks(
         scores: dict,
         learning_tracks: dict,
@@ -99,20 +1228,13 @@ def aggregate_learning_tracks(
        learning_tracks = {"Ciências Exatas": ["programação"], "Artes": ["artes", "canto"]}
        se min_score_threshold=0.2 -> "canto" (0.1) fica de fora, somando 0 para Artes;
        resultado final = {"Ciências Exatas": 0.3, "Artes": 0.5}
+
+    A soma é normalizada pelo número de labels acima do threshold, para evitar viés
+    para trilhas com mais labels. Calculado no LabelSpace compilado das trilhas.
     """
-    track_scores = {}
-    for track, label_list in learning_tracks.items():
-        total = 0.0
-        count = 0
-        for label in label_list:
-            val = scores.get(label, 0.0)
-            if val >= min_score_threshold:
-                total += val
-                count += 1
-        if count > 0:
-            # Normaliza pelo número de labels para evitar viés para trilhas com mais labels
-            track_scores[track] = total / count
-    return track_scores
+    space = get_label_space(learning_tracks=learning_tracks)
+    track_vector = space.aggregate_tracks(space.vectorize(scores), min_score_threshold)
+    return space.track_scores_to_dict(track_vector)
 
 
 def calculate_dynamic_weights(user_data):
@@ -168,6 +1290,66 @@ def calculate_dynamic_weights(user_data):
     return weights
 
 
+def compute_mapping_scores(user_data: dict, mc_scores: dict, likert_scores: dict,
+                           text_scores_list: list) -> tuple:
+    """
+    Parte não interativa do mapeamento: combina as fontes de pontuação e agrega em trilhas.
+
+    Args:
+        user_data: Dados do usuário (usados para os pesos dinâmicos)
+        mc_scores: Pontuações das atividades favoritas (múltipla escolha)
+        likert_scores: Pontuações das escalas Likert
+        text_scores_list: Resultados Zero-Shot das respostas abertas [texto1, texto2];
+            a combinação em pares dá peso 1/4 ao texto1 e 1/2 ao texto2 dentro da
+            parte textual (a resposta sobre experiência de aprendizado só entra na
+            análise de personalidade)
+
+    Returns:
+        Tupla (final_scores, track_scores)
+    """
+    dynamic_weights = calculate_dynamic_weights(user_data)
+    space = get_label_space()
+
+    # Uma linha por fonte, na mesma fórmula de combine_scores (LabelSpace.combine)
+    sources = [mc_scores, likert_scores] + list(text_scores_list)
+    matrix = space.vectorize_many(sources, extend=True)
+
+    # Respostas textuais primeiro entre si, depois com as demais fontes
+    text_combined = np.zeros(matrix.shape[1])
+    for row in matrix[2:]:
+        text_combined = space.combine(text_combined, row, weight=1.0)
+
+    final_vector = np.zeros(matrix.shape[1])
+    final_vector = space.combine(final_vector, matrix[0], weight=dynamic_weights["hobbies"])
+    final_vector = space.combine(final_vector, matrix[1], weight=dynamic_weights["likert"])
+    final_vector = space.combine(final_vector, text_combined, weight=dynamic_weights["text"])
+
+    # Como combine_scores: todo rótulo presente em alguma fonte aparece, mesmo com score 0
+    present = dict.fromkeys(label for scores in sources for label in scores)
+    final_scores = {label: float(final_vector[space.label_index[label]]) for label in present}
+
+    track_scores = space.track_scores_to_dict(space.aggregate_tracks(final_vector))
+    return final_scores, track_scores
+
+
+_TRAIT_SCORE = {"type": "integer", "minimum": 1, "maximum": 5}
+
+# Formato esperado da análise de personalidade (ver llm_integration.generate_json)
+PERSONALITY_SCHEMA = {
+    "type": "object",
+    "required": ["orientacao_detalhes", "pensamento_analitico", "criatividade",
+                 "trabalho_equipe", "auto_motivacao"],
+    "properties": {
+        "orientacao_detalhes": _TRAIT_SCORE,
+        "pensamento_analitico": _TRAIT_SCORE,
+        "criatividade": _TRAIT_SCORE,
+        "trabalho_equipe": _TRAIT_SCORE,
+        "auto_motivacao": _TRAIT_SCORE,
+        "observacoes": {"type": "string", "description": "Observação sobre o estilo de aprendizado ideal"}
+    }
+}
+
+
 def analyze_user_personality(text_responses):
     """
     Analisa as respostas textuais do usuário para identificar traços de personalidade
@@ -208,19 +1390,7 @@ def analyze_user_personality(text_responses):
     """.format(text_responses)
 
     try:
-        result = call_teacher_llm(prompt, temperature=0.3)
-
-        # Extrair JSON da resposta
-        if "```json" in result:
-            json_text = result.split("```json")[1].split("```")[0]
-        elif "```" in result:
-            json_text = result.split("```")[1].split("```")[0]
-        else:
-            json_text = result
-
-        import json
-        personality_traits = json.loads(json_text)
-        return personality_traits
+        return generate_json(prompt, PERSONALITY_SCHEMA, temperature=0.3, task="classification")
     except Exception as e:
         print(f"Erro ao analisar personalidade: {e}")
         return {}
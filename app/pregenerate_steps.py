@@ -0,0 +1,398 @@
+# app/pregenerate_steps.py
+"""
+Pré-geração em lote das explicações de passos de todo o currículo.
+
+Cada passo dos currículos de app/paths.py gera, em present_current_step, sempre o
+mesmo prompt para uma faixa etária e um estilo de ensino. Este job percorre o
+currículo e gera a explicação de cada combinação (passo, faixa etária, estilo de
+TEACHING_STYLES) com um pool de tarefas paralelo e limitado em requisições por
+minuto. As explicações ficam em um armazenamento SQLite endereçado pelo conteúdo:
+a chave é o hash da requisição completa (modelo, mensagens e parâmetros), então
+mudar o prompt ou o modelo gera chaves novas automaticamente.
+
+Nas sessões, present_current_step consulta o armazenamento antes de chamar o LLM
+(lookup_step_explanation) e mostra a explicação pré-gerada sem latência.
+
+O job pode ser interrompido e executado de novo: entradas já geradas são puladas.
+
+Uso:
+    python -m app.pregenerate_steps --dry-run                  # conta as entradas pendentes
+    python -m app.pregenerate_steps --workers 8 --rpm 300
+    python -m app.pregenerate_steps --subareas Programação Física --styles didático visual
+    python -m app.pregenerate_steps --source firestore        # currículo salvo no Firestore
+"""
+
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from app import config
+from app.llm_integration import (
+    MODELS,
+    TEACHING_STYLES,
+    acall_teacher_llm,
+    build_teacher_messages,
+    is_error_response
+)
+from app.step_prefetch import build_step_prompt
+
+# Parâmetros da chamada feita em present_current_step
+STEP_MODEL = "default"
+STEP_KNOWLEDGE_LEVEL = "iniciante"
+STEP_TEMPERATURE = 0.7
+STEP_MAX_TOKENS = 1500
+
+
+def age_band_for(age: int) -> Tuple[int, int]:
+    """Retorna a faixa de config.STEP_AGE_BANDS que contém a idade (ou a mais próxima)."""
+    for band in config.STEP_AGE_BANDS:
+        if band[0] <= age <= band[1]:
+            return band
+    return min(config.STEP_AGE_BANDS, key=lambda band: min(abs(age - band[0]), abs(age - band[1])))
+
+
+def age_band_label(band: Tuple[int, int]) -> str:
+    return f"{band[0]}-{band[1]}"
+
+
+def step_store_key(step_content: str, band: Tuple[int, int], area_name: str, subarea_name: str,
+                   level_name: str, module_title: str, lesson_title: str, teaching_style: str) -> str:
+    """Hash da requisição completa que geraria a explicação deste passo."""
+    label = age_band_label(band)
+    prompt = build_step_prompt(step_content, label, area_name, subarea_name,
+                               level_name, module_title, lesson_title)
+    request = {
+        "model": MODELS[STEP_MODEL],
+        "messages": build_teacher_messages(prompt, label, area_name, teaching_style, STEP_KNOWLEDGE_LEVEL),
+        "temperature": STEP_TEMPERATURE,
+        "max_tokens": STEP_MAX_TOKENS
+    }
+    return hashlib.sha256(json.dumps(request, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class StepExplanationStore:
+    """Armazenamento SQLite das explicações pré-geradas, indexado pela chave da requisição."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with contextlib.closing(sqlite3.connect(path, timeout=30)) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS step_explanations ("
+                "key TEXT PRIMARY KEY, text TEXT NOT NULL, teaching_style TEXT, age_band TEXT, "
+                "area TEXT, subarea TEXT, level TEXT, lesson TEXT, step TEXT, created_at REAL NOT NULL)"
+            )
+
+    def _conn(self) -> sqlite3.Connection:
+        # Uma conexão por thread (sessões do CLI e o job usam threads diferentes)
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[str]:
+        row = self._conn().execute("SELECT text FROM step_explanations WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def existing_keys(self, keys: List[str]) -> set:
+        found = set()
+        conn = self._conn()
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            found.update(row[0] for row in conn.execute(
+                f"SELECT key FROM step_explanations WHERE key IN ({placeholders})", chunk))
+        return found
+
+    def put(self, key: str, text: str, entry: Dict, teaching_style: str, band: Tuple[int, int]):
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO step_explanations "
+                "(key, text, teaching_style, age_band, area, subarea, level, lesson, step, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, text, teaching_style, age_band_label(band), entry["area"], entry["subarea"],
+                 entry["level"], entry["lesson"], entry["step"], time.time())
+            )
+
+    def count(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM step_explanations").fetchone()[0]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_step_store() -> Optional[StepExplanationStore]:
+    """Retorna o armazenamento configurado, ou None se desativado ou ainda não gerado."""
+    global _store
+    if not config.STEP_STORE_ENABLED or not os.path.exists(config.STEP_STORE_PATH):
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = StepExplanationStore(config.STEP_STORE_PATH)
+        return _store
+
+
+def lookup_step_explanation(step_content: str, user_age: int, area_name: str, subarea_name: str,
+                            level_name: str, module_title: str, lesson_title: str,
+                            teaching_style: str) -> Optional[str]:
+    """
+    Busca a explicação pré-gerada do passo para a faixa etária do aluno.
+
+    Returns:
+        O texto pré-gerado, ou None se não houver
+    """
+    store = get_step_store()
+    if store is None:
+        return None
+    key = step_store_key(step_content, age_band_for(user_age), area_name, subarea_name,
+                         level_name, module_title, lesson_title, teaching_style)
+    try:
+        return store.get(key)
+    except sqlite3.Error as e:
+        print(f"Erro ao consultar as explicações pré-geradas: {e}")
+        return None
+
+
+class _CurriculumRecorder:
+    """Banco em memória com a interface usada pelas funções setup_* de app/paths.py."""
+
+    def __init__(self):
+        self.data = {}
+
+    def collection(self, name: str):
+        return _RecorderCollection(self.data.setdefault(name, {}))
+
+
+class _RecorderCollection:
+    def __init__(self, docs: dict):
+        self._docs = docs
+
+    def document(self, doc_id: str):
+        return _RecorderDocument(self._docs, doc_id)
+
+    def stream(self):
+        return [_RecorderDocument(self._docs, doc_id).get() for doc_id in self._docs]
+
+
+class _RecorderDocument:
+    def __init__(self, docs: dict, doc_id: str):
+        self._docs = docs
+        self.id = doc_id
+
+    @property
+    def exists(self) -> bool:
+        return self.id in self._docs
+
+    def get(self):
+        return self
+
+    def to_dict(self) -> dict:
+        return self._docs.get(self.id)
+
+    def set(self, data: dict, merge: bool = False):
+        self._docs[self.id] = data
+
+
+def load_curriculum(source: str = "paths") -> Dict[str, Dict]:
+    """
+    Carrega as áreas do currículo.
+
+    Args:
+        source: "paths" (executa as funções de app/paths.py em memória) ou "firestore"
+            (coleção learning_paths, como as sessões veem)
+    """
+    if source == "firestore":
+        from app.firestore_client import get_firestore_client
+        collection = get_firestore_client().collection("learning_paths")
+        return {doc.id: doc.to_dict() or {} for doc in collection.stream()}
+
+    from app import paths
+    recorder = _CurriculumRecorder()
+    with contextlib.redirect_stdout(io.StringIO()):
+        paths.setup_learning_paths(recorder)
+    return recorder.data.get("learning_paths", {})
+
+
+def iter_curriculum_steps(areas: Dict[str, Dict], subareas: List[str] = None) -> Iterator[Dict]:
+    """Percorre área > subárea > nível > módulo > lição > passo."""
+    for area_name, area_data in areas.items():
+        for subarea_name, subarea_data in (area_data.get("subareas") or {}).items():
+            if subareas and subarea_name not in subareas:
+                continue
+            for level_name, level_data in (subarea_data.get("levels") or {}).items():
+                for module in level_data.get("modules", []):
+                    for lesson in module.get("lessons", []):
+                        for step in lesson.get("steps", []):
+                            yield {
+                                "area": area_name,
+                                "subarea": subarea_name,
+                                "level": level_name,
+                                "module": module.get("module_title", "Sem título"),
+                                "lesson": lesson.get("lesson_title", "Sem título"),
+                                "step": step if isinstance(step, str) else str(step)
+                            }
+
+
+class _RequestPacer:
+    """Espaça o início das requisições para respeitar um limite por minuto."""
+
+    def __init__(self, requests_per_minute: float):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute else 0.0
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+async def _pregenerate(jobs: List[Tuple[str, Dict, str, Tuple[int, int]]], store: StepExplanationStore,
+                       workers: int, requests_per_minute: float, stats: Dict[str, int]):
+    queue = asyncio.Queue()
+    for job in jobs:
+        queue.put_nowait(job)
+    pacer = _RequestPacer(requests_per_minute)
+    started = time.time()
+
+    async def worker():
+        while True:
+            try:
+                key, entry, teaching_style, band = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            await pacer.wait()
+            label = age_band_label(band)
+            text = await acall_teacher_llm(
+                build_step_prompt(entry["step"], label, entry["area"], entry["subarea"],
+                                  entry["level"], entry["module"], entry["lesson"]),
+                student_age=list(band),
+                subject_area=entry["area"],
+                teaching_style=teaching_style,
+                knowledge_level=STEP_KNOWLEDGE_LEVEL,
+                temperature=STEP_TEMPERATURE,
+                model=STEP_MODEL,
+                max_tokens=STEP_MAX_TOKENS,
+                use_cache=False
+            )
+            if is_error_response(text):
+                stats["failed"] += 1
+            else:
+                await asyncio.to_thread(store.put, key, text, entry, teaching_style, band)
+                stats["generated"] += 1
+
+            done = stats["generated"] + stats["failed"]
+            if done % 50 == 0:
+                rate = done / max(time.time() - started, 1e-9)
+                print(f"Geradas: {stats['generated']} | falhas: {stats['failed']} | "
+                      f"restantes: {len(jobs) - done} | {rate * 60:.0f}/min")
+
+    await asyncio.gather(*(worker() for _ in range(max(1, workers))))
+
+
+def run_pregeneration(store: StepExplanationStore, source: str = "paths", subareas: List[str] = None,
+                      styles: List[str] = None, bands: List[Tuple[int, int]] = None, workers: int = 4,
+                      requests_per_minute: float = 120, limit: int = None, dry_run: bool = False) -> Dict[str, int]:
+    """
+    Gera as explicações que ainda não estão no armazenamento.
+
+    Args:
+        store: Armazenamento de destino
+        source: Origem do currículo ("paths" ou "firestore")
+        subareas: Restringe a estas subáreas (padrão: todas)
+        styles: Estilos de ensino (padrão: todos de TEACHING_STYLES)
+        bands: Faixas etárias (padrão: config.STEP_AGE_BANDS)
+        workers: Requisições simultâneas
+        requests_per_minute: Limite de requisições iniciadas por minuto (0 = sem limite)
+        limit: Máximo de explicações geradas nesta execução
+        dry_run: Apenas conta as entradas pendentes
+
+    Returns:
+        Estatísticas da execução
+    """
+    styles = styles or list(TEACHING_STYLES.keys())
+    bands = bands or list(config.STEP_AGE_BANDS)
+
+    jobs = []
+    seen = set()
+    for entry in iter_curriculum_steps(load_curriculum(source), subareas):
+        for teaching_style in styles:
+            for band in bands:
+                key = step_store_key(entry["step"], band, entry["area"], entry["subarea"], entry["level"],
+                                     entry["module"], entry["lesson"], teaching_style)
+                if key not in seen:  # Passos repetidos no mesmo contexto geram a mesma chave
+                    seen.add(key)
+                    jobs.append((key, entry, teaching_style, band))
+
+    existing = store.existing_keys([job[0] for job in jobs])
+    pending = [job for job in jobs if job[0] not in existing]
+    if limit is not None:
+        pending = pending[:limit]
+
+    stats = {"total": len(jobs), "already_stored": len(existing), "pending": len(pending),
+             "generated": 0, "failed": 0}
+    print(f"Combinações: {stats['total']} | já geradas: {stats['already_stored']} | "
+          f"a gerar nesta execução: {stats['pending']}")
+
+    if not dry_run and pending:
+        asyncio.run(_pregenerate(pending, store, workers, requests_per_minute, stats))
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pré-geração das explicações de passos do currículo")
+    parser.add_argument("--source", choices=["paths", "firestore"], default="paths",
+                        help="Origem do currículo")
+    parser.add_argument("--store", default=config.STEP_STORE_PATH, help="Arquivo SQLite de destino")
+    parser.add_argument("--subareas", nargs="+", help="Subáreas a gerar (padrão: todas)")
+    parser.add_argument("--styles", nargs="+", choices=list(TEACHING_STYLES.keys()),
+                        help="Estilos de ensino (padrão: todos)")
+    parser.add_argument("--bands", nargs="+", help="Faixas etárias no formato 13-14 (padrão: config.STEP_AGE_BANDS)")
+    parser.add_argument("--workers", type=int, default=4, help="Requisições simultâneas")
+    parser.add_argument("--rpm", type=float, default=120, help="Requisições por minuto (0 = sem limite)")
+    parser.add_argument("--limit", type=int, default=None, help="Máximo de explicações nesta execução")
+    parser.add_argument("--dry-run", action="store_true", help="Apenas conta as entradas pendentes")
+    args = parser.parse_args()
+
+    bands = None
+    if args.bands:
+        bands = [tuple(int(part) for part in band.split("-")) for band in args.bands]
+
+    store = StepExplanationStore(args.store)
+    stats = run_pregeneration(
+        store,
+        source=args.source,
+        subareas=args.subareas,
+        styles=args.styles,
+        bands=bands,
+        workers=args.workers,
+        requests_per_minute=args.rpm,
+        limit=args.limit,
+        dry_run=args.dry_run
+    )
+
+    if not args.dry_run:
+        print(f"\nConcluído: {stats['generated']} geradas, {stats['failed']} falhas "
+              f"(serão tentadas de novo na próxima execução). Total no armazenamento: {store.count()}.")
+
+
+if __name__ == '__main__':
+    main()
@@ -6,8 +6,16 @@ from app.llm_integration import (
     generate_assessment,
     LessonContent,
     TEACHING_STYLES,
-    generate_learning_pathway
+    generate_learning_pathway,
+    agrade_essay_answers,
+    grade_essay_answers,
+    submit_background,
+    ERROR_RESPONSE_PREFIX
 )
+from app import config
+from app.step_prefetch import build_step_prompt, get_step_prefetcher
+from app.semantic_cache import get_semantic_cache, semantic_partition
+from app.pregenerate_steps import lookup_step_explanation
 import time
 from functools import wraps
 from typing import Dict, List, Any, Optional, Union, Callable
@@ -104,6 +112,22 @@ def llm_operation(func):
     return wrapper
 
 
+def print_streamed(chunks, prefix: str = "") -> str:
+    """
+    Imprime os trechos de uma resposta em streaming à medida que chegam.
+
+    Returns:
+        O texto completo
+    """
+    print(prefix, end="", flush=True)
+    parts = []
+    for chunk in chunks:
+        parts.append(chunk)
+        print(chunk, end="", flush=True)
+    print()
+    return "".join(parts)
+
+
 # Funções utilitárias
 def get_level_order(levels: Dict) -> List[str]:
     """
@@ -345,16 +369,26 @@ def check_level_requirements(db, user_id: str, current: Dict, level_data: Dict)
 
 
 @llm_operation
-def apply_assessment(assessment_data: Dict, user_age: int, teaching_style: str) -> float:
+def apply_assessment(assessment_data: Dict, user_age: int, teaching_style: str,
+                     grading_mode: str = None) -> float:
     """
     Aplica uma avaliação ao usuário e retorna a pontuação obtida.
+
+    As questões dissertativas são corrigidas juntas ao final ("batch") ou em segundo
+    plano enquanto o aluno segue ("background"), um lote de até
+    config.ESSAY_GRADING_BATCH_SIZE respostas por chamada assim que o lote enche (o
+    lote incompleto sai ao final); padrão: config.ESSAY_GRADING_MODE.
     """
     questions = assessment_data.get("questions", [])
     if not questions:
         return 0
 
+    grading_mode = grading_mode or config.ESSAY_GRADING_MODE
     correct_answers = 0
     total_questions = len(questions)
+    essays = []  # (número da questão, resposta dissertativa a corrigir)
+    background_batches = []  # Correções em segundo plano, uma por lote, na ordem de essays
+    pending = []  # Respostas ainda não enviadas para correção em segundo plano
 
     print(f"\n=== {assessment_data.get('title', 'Avaliação')} ===\n")
 
@@ -395,33 +429,45 @@ def apply_assessment(assessment_data: Dict, user_age: int, teaching_style: str)
             print("\nEsta é uma questão dissertativa.")
             user_answer = input("Sua resposta: ").strip()
 
-            # Para questões dissertativas, usamos o LLM para avaliar
-            key_points = question.get("key_points", [])
-            sample_answer = question.get("sample_answer", "")
-
-            prompt = (
-                f"Avalie a resposta de um aluno de {user_age} anos à seguinte questão dissertativa:\n"
-                f"Questão: {question.get('text', '')}\n\n"
-                f"Resposta do aluno: {user_answer}\n\n"
-                f"Pontos-chave esperados: {', '.join(key_points)}\n"
-                f"Exemplo de resposta adequada: {sample_answer}\n\n"
-                f"Decida se a resposta é satisfatória (inclui pelo menos 70% dos pontos-chave) "
-                f"e forneça feedback construtivo. Conclua com uma recomendação clara: APROVADO ou REPROVADO."
-            )
-
-            evaluation = call_teacher_llm(
-                prompt,
-                student_age=user_age,
-                teaching_style=teaching_style,
-                max_tokens=1000
-            )
+            # Para questões dissertativas, usamos o LLM para avaliar (ao final da avaliação)
+            essay = {
+                "question": question.get("text", ""),
+                "answer": user_answer,
+                "key_points": question.get("key_points", []),
+                "sample_answer": question.get("sample_answer", "")
+            }
+            essays.append((i, essay))
+            if grading_mode == "background":
+                pending.append(essay)
+                if len(pending) >= max(1, config.ESSAY_GRADING_BATCH_SIZE):
+                    background_batches.append((len(pending), submit_background(
+                        agrade_essay_answers(pending, user_age, teaching_style))))
+                    pending = []
+                print("Resposta registrada! A correção é feita em segundo plano enquanto você continua.\n")
+            else:
+                print("Resposta registrada! A correção sai ao final da avaliação.\n")
+
+    if essays:
+        print("\nCorrigindo as questões dissertativas...")
+        if grading_mode == "background":
+            if pending:
+                background_batches.append((len(pending), submit_background(
+                    agrade_essay_answers(pending, user_age, teaching_style))))
+            verdicts = []
+            for size, future in background_batches:
+                try:
+                    verdicts.extend(future.result())
+                except Exception as e:
+                    print(f"Erro ao avaliar as respostas: {e}")
+                    verdicts.extend([{"approved": None, "feedback": "Não foi possível avaliar a resposta."}] * size)
+        else:
+            verdicts = grade_essay_answers([essay for _, essay in essays], user_age, teaching_style)
 
-            print("\nAvaliação:")
-            print(evaluation)
+        for (i, _), verdict in zip(essays, verdicts):
+            print(f"\nAvaliação da questão {i}:")
+            print(verdict["feedback"])
 
-            # Verificar se o LLM indicou aprovação
-            is_approved = "APROVADO" in evaluation.upper()
-            if is_approved:
+            if verdict["approved"]:
                 print("\nSua resposta foi considerada satisfatória!")
                 correct_answers += 1
             else:
@@ -648,16 +694,15 @@ def generate_lesson_content(lesson_title: str, objectives: str, user_age: int,
         f"O conteúdo deve ser estruturado, informativo e envolvente."
     )
 
-    content = call_teacher_llm(
+    print("\n" + "=" * 60)
+    print_streamed(call_teacher_llm(
         prompt,
         student_age=user_age,
         subject_area=f"{area_name} - {subarea_name}",
         teaching_style=teaching_style,
-        max_tokens=2000
-    )
-
-    print("\n" + "=" * 60)
-    print(content)
+        max_tokens=2000,
+        stream=True
+    ))
     print("=" * 60)
 
 
@@ -678,16 +723,15 @@ def generate_module_content(module_title: str, module_desc: str, user_age: int,
         f"Use linguagem adequada para a idade do aluno."
     )
 
-    content = call_teacher_llm(
+    print("\n" + "=" * 80)
+    print_streamed(call_teacher_llm(
         prompt,
         student_age=user_age,
         subject_area=f"{area_name} - {subarea_name}",
         teaching_style=teaching_style,
-        max_tokens=3000
-    )
-
-    print("\n" + "=" * 80)
-    print(content)
+        max_tokens=3000,
+        stream=True
+    ))
     print("=" * 80)
 
 
@@ -702,20 +746,31 @@ def ask_teacher_question(user_age: int, area_name: str, subarea_name: str,
         print("Pergunta vazia.")
         return
 
+    # Pergunta equivalente já respondida no mesmo contexto
+    semantic_cache = get_semantic_cache()
+    partition = semantic_partition(area_name, subarea_name, level_name, user_age, teaching_style)
+    cached_answer = semantic_cache.lookup(question, partition) if semantic_cache else None
+    if cached_answer is not None:
+        print(f"\n[Professor]: {cached_answer}")
+        return
+
     # Determinar o contexto atual
     context = f"área de {area_name}, subárea de {subarea_name}, nível {level_name}"
 
-    print("\nPensando...")
-    answer = call_teacher_llm(
+    print()
+    answer = print_streamed(call_teacher_llm(
         f"O aluno está estudando {context} e pergunta: '{question}'. "
         f"Responda de forma adequada para um estudante de {user_age} anos, "
         f"usando linguagem clara e exemplos relevantes.",
         student_age=user_age,
         subject_area=area_name,
-        teaching_style=teaching_style
-    )
+        teaching_style=teaching_style,
+        task="chat",
+        stream=True
+    ), prefix="[Professor]: ")
 
-    print(f"\n[Professor]: {answer}")
+    if semantic_cache and answer and ERROR_RESPONSE_PREFIX not in answer:
+        semantic_cache.store(question, partition, answer)
 
 
 # Funções principais do módulo
@@ -863,8 +918,10 @@ def process_current_module(db, user_id: str, user_data: Dict, area_name: str, su
     # Processar a lição atual
     lesson_data = lessons[lesson_index]
     lesson_title = lesson_data.get("lesson_title", "Sem título")
+    next_lesson = lessons[lesson_index + 1] if lesson_index + 1 < len(lessons) else None
     process_current_lesson(db, user_id, user_data, area_name, subarea_name, level_name,
-                           module_title, lesson_data, lesson_title, step_index, user_age, teaching_style)
+                           module_title, lesson_data, lesson_title, step_index, user_age, teaching_style,
+                           next_lesson=next_lesson)
 
 
 def advance_to_next_module(db, user_id: str, user_data: Dict):
@@ -884,7 +941,8 @@ def advance_to_next_module(db, user_id: str, user_data: Dict):
 
 def process_current_lesson(db, user_id: str, user_data: Dict, area_name: str, subarea_name: str,
                            level_name: str, module_title: str, lesson_data: Dict,
-                           lesson_title: str, step_index: int, user_age: int, teaching_style: str):
+                           lesson_title: str, step_index: int, user_age: int, teaching_style: str,
+                           next_lesson: Dict = None):
     """
     Processa a lição atual, verificando passos e avanços.
     """
@@ -915,7 +973,8 @@ def process_current_lesson(db, user_id: str, user_data: Dict, area_name: str, su
 
     # Apresentar o passo atual
     present_current_step(db, user_id, user_data, area_name, subarea_name, level_name,
-                         module_title, lesson_title, lesson_data, steps, step_index, user_age, teaching_style)
+                         module_title, lesson_title, lesson_data, steps, step_index, user_age, teaching_style,
+                         next_lesson=next_lesson)
 
 
 def advance_to_next_lesson(db, user_id: str, user_data: Dict):
@@ -935,33 +994,39 @@ def advance_to_next_lesson(db, user_id: str, user_data: Dict):
 
 def present_current_step(db, user_id: str, user_data: Dict, area_name: str, subarea_name: str,
                          level_name: str, module_title: str, lesson_title: str, lesson_data: Dict,
-                         steps: List, step_index: int, user_age: int, teaching_style: str):
+                         steps: List, step_index: int, user_age: int, teaching_style: str,
+                         next_lesson: Dict = None):
     """
     Apresenta o passo atual da lição ao usuário.
     """
     step_content = steps[step_index]
 
     print(f"\n=== [Aula: {lesson_title} | Passo {step_index + 1}/{len(steps)}] ===")
-    print("Gerando conteúdo...")
-
-    # Gerar conteúdo para o passo atual
-    context = f"Área: {area_name}, Subárea: {subarea_name}, Nível: {level_name}, Módulo: {module_title}, Lição: {lesson_title}"
 
-    prompt = (
-        f"Explique de forma didática e adequada para um estudante de {user_age} anos: {step_content}. "
-        f"Contexto da aula: {context}. "
-        f"Use linguagem acessível e exemplos práticos. Relacione com o dia a dia quando possível. "
-        f"Mantenha o foco específico neste tópico."
-    )
+    # Explicação pré-gerada para a faixa etária e o estilo (python -m app.pregenerate_steps)
+    explanation = lookup_step_explanation(step_content, user_age, area_name, subarea_name, level_name,
+                                          module_title, lesson_title, teaching_style)
+    if explanation is not None:
+        print(explanation)
+    else:
+        # Gerar conteúdo para o passo atual
+        prompt = build_step_prompt(step_content, user_age, area_name, subarea_name,
+                                   level_name, module_title, lesson_title)
 
-    explanation = call_teacher_llm(
-        prompt,
-        student_age=user_age,
-        subject_area=area_name,
-        teaching_style=teaching_style
-    )
+        print_streamed(call_teacher_llm(
+            prompt,
+            student_age=user_age,
+            subject_area=area_name,
+            teaching_style=teaching_style,
+            stream=True
+        ))
 
-    print(explanation)
+    # Enquanto o aluno lê, gera em segundo plano a explicação do próximo passo
+    prefetcher = get_step_prefetcher()
+    if prefetcher:
+        prefetcher.prefetch_next_steps(user_id, user_age, area_name, subarea_name, level_name,
+                                       module_title, lesson_title, steps, step_index, teaching_style,
+                                       next_lesson=next_lesson)
 
     # Avançar para o próximo passo
     progress = UserProgress(user_data.get("progress", {}))
@@ -975,6 +1040,13 @@ def present_current_step(db, user_id: str, user_data: Dict, area_name: str, suba
     print("Use [1] para continuar ou escolha outra opção.")
 
 
+def cancel_step_prefetch(user_id: str):
+    """Descarta os pré-carregamentos de passos do usuário (o caminho dele mudou)."""
+    prefetcher = get_step_prefetcher()
+    if prefetcher:
+        prefetcher.cancel_user(user_id)
+
+
 def change_level(db, user_id: str, user_data: Dict, subarea_data: Dict) -> bool:
     """
     Permite ao usuário mudar para outro nível dentro da mesma subárea.
@@ -1011,6 +1083,7 @@ def change_level(db, user_id: str, user_data: Dict, subarea_data: Dict) -> bool:
     user_data["progress"] = progress.to_dict()
     db.collection("users").document(user_id).set(user_data, merge=True)
 
+    cancel_step_prefetch(user_id)
     print(f"\nNível alterado para '{selected_level.capitalize()}'.")
     return True
 
@@ -1052,6 +1125,7 @@ def change_subarea(db, user_id: str, user_data: Dict, area_data: Dict) -> bool:
     user_data["progress"] = progress.to_dict()
     db.collection("users").document(user_id).set(user_data, merge=True)
 
+    cancel_step_prefetch(user_id)
     print(f"\nSubárea alterada para '{selected_subarea}'.")
     return True
 
@@ -1308,6 +1382,8 @@ def main_progress_loop(db, user_id: str, user_data: Dict, area_name: str, area_d
                 new_subarea = current.get("subarea", subarea_name)
 
                 if new_level != level_name or new_subarea != subarea_name:
+                    cancel_step_prefetch(user_id)
+
                     # Recarregar dados se necessário
                     if new_subarea != subarea_name:
                         subarea_name = new_subarea
@@ -1454,7 +1530,8 @@ def generate_learning_pathway_topic(user_age: int, area_name: str, subarea_name:
         duration_weeks=duration_weeks,
         hours_per_week=hours_per_week,
         initial_level=level_name,
-        target_level="avançado"
+        target_level="avançado",
+        on_week=lambda week: print(f"  Semana {week.get('week')} pronta: {week.get('focus', '')}")
     )
 
     display_learning_pathway(pathway)
@@ -0,0 +1,290 @@
+# app/remap_users.py
+"""
+Re-mapeamento em lote de toda a coleção "users".
+
+Quando CANDIDATE_LABELS, LEARNING_TRACKS ou os pesos de calculate_dynamic_weights
+mudam, os campos final_scores e track_scores salvos ficam desatualizados. Este job
+percorre os usuários em páginas, refaz a parte não interativa do mapeamento
+(combinação, agregação em trilhas e recommend_learning_paths) em um pool de
+processos e grava os resultados com escritas em lote.
+
+Usuários mapeados antes de existir o campo "mapping_inputs" não têm as pontuações
+por fonte salvas; para eles, apenas a agregação em trilhas e as recomendações são
+recalculadas a partir do final_scores armazenado.
+
+Uso:
+    python -m app.remap_users --dry-run                 # mostra as diferenças sem gravar
+    python -m app.remap_users --workers 8               # executa (retoma do checkpoint, se houver)
+    python -m app.remap_users --reclassify --restart    # reclassifica os textos com o Zero-Shot
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from app import config
+from app import mapping
+from app.firestore_client import get_firestore_client
+
+# O Firestore aceita no máximo 500 operações por escrita em lote
+MAX_BATCH_WRITES = 500
+
+# Diferença mínima em um score de trilha para aparecer no relatório
+DIFF_EPSILON = 1e-6
+
+DEFAULT_CHECKPOINT_PATH = os.path.join(config.CACHE_DIR, "remap_users_checkpoint.json")
+
+
+def remap_user(user_id: str, user_data: dict) -> dict:
+    """
+    Recalcula as pontuações de um usuário (executado nos processos do pool).
+
+    Returns:
+        Dicionário com user_id, os campos a atualizar e o diff em relação ao salvo
+    """
+    mapping_inputs = user_data.get("mapping_inputs")
+    if mapping_inputs:
+        final_scores, track_scores = mapping.compute_mapping_scores(
+            user_data,
+            mapping_inputs.get("mc_scores", {}),
+            mapping_inputs.get("likert_scores", {}),
+            mapping_inputs.get("text_scores", [])
+        )
+    else:
+        # Perfis antigos: só é possível reagregar o final_scores já salvo
+        final_scores = user_data.get("final_scores", {})
+        track_scores = mapping.aggregate_learning_tracks(final_scores, config.LEARNING_TRACKS)
+
+    update = {
+        "final_scores": final_scores,
+        "track_scores": track_scores,
+        "remapped_at": time.time()
+    }
+    if mapping_inputs:
+        update["mapping_inputs"] = mapping_inputs
+
+    return {
+        "user_id": user_id,
+        "update": update,
+        "diff": _diff_user(user_data, track_scores)
+    }
+
+
+def _top_track(track_scores: dict, personality_traits: dict) -> str:
+    suggested = mapping.recommend_learning_paths(track_scores, personality_traits) if track_scores else []
+    return suggested[0][0] if suggested else ""
+
+
+def _diff_user(user_data: dict, new_track_scores: dict) -> dict:
+    """
+    Compara as pontuações de trilha salvas com as recalculadas.
+
+    A recomendação é comparada entre o topo das pontuações salvas e o das novas (com
+    os mesmos traços de personalidade), não com recommended_track: o aluno pode ter
+    escolhido outra área à mão, e essa escolha não é uma mudança do mapeamento.
+    """
+    old_track_scores = user_data.get("track_scores", {})
+    changed_tracks = {}
+    for track in set(old_track_scores) | set(new_track_scores):
+        old = old_track_scores.get(track)
+        new = new_track_scores.get(track)
+        if old is None or new is None or abs(old - new) > DIFF_EPSILON:
+            changed_tracks[track] = {"old": old, "new": new}
+
+    personality_traits = user_data.get("personality_traits", {})
+    old_top = _top_track(old_track_scores, personality_traits)
+    new_top = _top_track(new_track_scores, personality_traits)
+    return {
+        "old_top_track": old_top,
+        "new_top_track": new_top,
+        "recommendation_changed": bool(new_top) and new_top != old_top,
+        "changed_tracks": changed_tracks
+    }
+
+
+def iter_user_pages(db, page_size: int, start_after_id: str = None):
+    """Percorre a coleção "users" em páginas ordenadas pelo ID do documento."""
+    collection = db.collection("users")
+    last_snapshot = None
+    if start_after_id:
+        last_snapshot = collection.document(start_after_id).get()
+        if not last_snapshot.exists:
+            raise ValueError(f"Documento do checkpoint não existe mais: users/{start_after_id}")
+
+    while True:
+        query = collection.order_by("__name__").limit(page_size)
+        if last_snapshot is not None:
+            query = query.start_after(last_snapshot)
+
+        page = list(query.stream())
+        if not page:
+            return
+        yield page
+        last_snapshot = page[-1]
+
+
+def _reclassify_texts(payloads: list):
+    """Refaz o Zero-Shot das respostas abertas salvas, em uma única passada por página."""
+    texts, owners = [], []
+    for _, user_data in payloads:
+        mapping_inputs = user_data.get("mapping_inputs") or {}
+        stored_texts = mapping_inputs.get("texts", [])
+        if stored_texts:
+            mapping_inputs["text_scores"] = [{} for _ in stored_texts]
+            for j, text in enumerate(stored_texts):
+                texts.append(text)
+                owners.append((mapping_inputs, j))
+
+    results = mapping.zero_shot_analysis_batch(texts, config.CANDIDATE_LABELS)
+    for (mapping_inputs, j), scores in zip(owners, results):
+        mapping_inputs["text_scores"][j] = scores
+
+
+def _write_results(db, results: list):
+    """Grava as atualizações em lotes de até MAX_BATCH_WRITES documentos."""
+    for start in range(0, len(results), MAX_BATCH_WRITES):
+        batch = db.batch()
+        for result in results[start:start + MAX_BATCH_WRITES]:
+            # update() substitui os mapas inteiros (set com merge manteria rótulos antigos)
+            batch.update(db.collection("users").document(result["user_id"]), result["update"])
+        batch.commit()
+
+
+def new_checkpoint() -> dict:
+    return {"last_user_id": None, "processed": 0, "updated": 0, "skipped": 0, "recommendation_changes": 0}
+
+
+def load_checkpoint(path: str) -> dict:
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    return new_checkpoint()
+
+
+def save_checkpoint(path: str, checkpoint: dict):
+    # Grava em arquivo temporário e renomeia, para não corromper o checkpoint numa interrupção
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def run_remap(db, page_size: int = 200, workers: int = None, dry_run: bool = False,
+              checkpoint_path: str = DEFAULT_CHECKPOINT_PATH, restart: bool = False,
+              reclassify: bool = False, diff_output: str = None, limit: int = None) -> dict:
+    """
+    Executa o re-mapeamento em lote.
+
+    Args:
+        db: Cliente do Firestore
+        page_size: Documentos lidos por página
+        workers: Processos do pool (padrão: número de CPUs)
+        dry_run: Apenas calcula e reporta as diferenças, sem gravar nada
+        checkpoint_path: Arquivo de checkpoint para retomar execuções interrompidas
+        restart: Ignora o checkpoint existente e começa do início
+        reclassify: Refaz o Zero-Shot das respostas abertas salvas (necessário quando
+            CANDIDATE_LABELS muda)
+        diff_output: Arquivo JSONL onde gravar o diff de cada usuário
+        limit: Número máximo de usuários processados nesta execução
+
+    Returns:
+        Estatísticas da execução
+    """
+    if dry_run or restart:
+        checkpoint = new_checkpoint()
+    else:
+        checkpoint = load_checkpoint(checkpoint_path)
+        if checkpoint["last_user_id"]:
+            print(f"Retomando após o usuário '{checkpoint['last_user_id']}' "
+                  f"({checkpoint['processed']} já processados).")
+
+    diff_file = open(diff_output, "w", encoding="utf-8") if diff_output else None
+    processed_now = 0
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for page in iter_user_pages(db, page_size, checkpoint["last_user_id"]):
+                if limit is not None:
+                    page = page[:limit - processed_now]
+
+                payloads = []
+                for snapshot in page:
+                    user_data = snapshot.to_dict() or {}
+                    if "mapping_inputs" in user_data or "final_scores" in user_data:
+                        payloads.append((snapshot.id, user_data))
+                    else:
+                        checkpoint["skipped"] += 1  # Usuário ainda não fez o mapeamento
+
+                if reclassify and payloads:
+                    _reclassify_texts(payloads)
+
+                chunksize = max(1, len(payloads) // ((workers or os.cpu_count() or 1) * 4))
+                results = list(pool.map(remap_user, *zip(*payloads), chunksize=chunksize)) if payloads else []
+
+                for result in results:
+                    diff = result["diff"]
+                    if diff["recommendation_changed"]:
+                        checkpoint["recommendation_changes"] += 1
+                    if diff_file:
+                        diff_file.write(json.dumps({"user_id": result["user_id"], **diff}, ensure_ascii=False) + "\n")
+                    if dry_run and (diff["changed_tracks"] or diff["recommendation_changed"]):
+                        print(f"[{result['user_id']}] trilhas alteradas: {len(diff['changed_tracks'])}; "
+                              f"recomendação: {diff['old_top_track'] or '-'} -> {diff['new_top_track'] or '-'}")
+
+                if not dry_run:
+                    _write_results(db, results)
+                    checkpoint["updated"] += len(results)
+
+                checkpoint["processed"] += len(page)
+                checkpoint["last_user_id"] = page[-1].id if page else checkpoint["last_user_id"]
+                processed_now += len(page)
+
+                if not dry_run:
+                    save_checkpoint(checkpoint_path, checkpoint)
+                print(f"Processados: {checkpoint['processed']} | atualizados: {checkpoint['updated']} | "
+                      f"ignorados: {checkpoint['skipped']}")
+
+                if limit is not None and processed_now >= limit:
+                    break
+    finally:
+        if diff_file:
+            diff_file.close()
+
+    return checkpoint
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-mapeamento em lote dos usuários")
+    parser.add_argument("--page-size", type=int, default=200, help="Documentos lidos por página")
+    parser.add_argument("--workers", type=int, default=None, help="Processos do pool (padrão: CPUs)")
+    parser.add_argument("--dry-run", action="store_true", help="Mostra as diferenças sem gravar")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT_PATH, help="Arquivo de checkpoint")
+    parser.add_argument("--restart", action="store_true", help="Ignora o checkpoint e começa do início")
+    parser.add_argument("--reclassify", action="store_true",
+                        help="Refaz o Zero-Shot das respostas abertas salvas")
+    parser.add_argument("--diff-output", help="Arquivo JSONL com o diff de cada usuário")
+    parser.add_argument("--limit", type=int, default=None, help="Máximo de usuários nesta execução")
+    args = parser.parse_args()
+
+    stats = run_remap(
+        get_firestore_client(),
+        page_size=args.page_size,
+        workers=args.workers,
+        dry_run=args.dry_run,
+        checkpoint_path=args.checkpoint,
+        restart=args.restart,
+        reclassify=args.reclassify,
+        diff_output=args.diff_output,
+        limit=args.limit
+    )
+
+    mode = "Simulação concluída" if args.dry_run else "Re-mapeamento concluído"
+    print(f"\n{mode}: {stats['processed']} usuários lidos, {stats['updated']} atualizados, "
+          f"{stats['skipped']} sem mapeamento, {stats['recommendation_changes']} com recomendação diferente.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,350 @@
+# app/semantic_cache.py
+"""
+Cache semântico das perguntas livres ao professor virtual.
+
+A chave exata de get_cache_key só acerta perguntas idênticas; aqui, perguntas com o
+mesmo sentido ("o que é uma variável?" / "o que significa variável?") reaproveitam
+a resposta já gerada.
+
+- A pergunta vira um embedding de frase (bi-encoder multilíngue,
+  config.SEMANTIC_CACHE_EMBEDDING_MODEL): o cosseno mede sentido, não grafia
+  ("loop for" x "loop while" escrevem quase igual e pedem respostas diferentes)
+- Cada partição (área, subárea, nível, faixa etária, estilo de ensino) tem seu
+  índice LSH (hiperplanos aleatórios); os candidatos são reordenados pelo cosseno
+  exato e a resposta só é servida acima do limiar
+- O limiar (config.SEMANTIC_CACHE_THRESHOLD = "auto") é calibrado para o modelo com
+  os pares rotulados de app/semantic_cache_pairs.py: fica logo acima do maior
+  cosseno entre perguntas diferentes. Recalibrar: python -m app.semantic_cache
+- Negações ("não", "nunca", "sem"...) e números/operadores ("2+2" x "2-2") pesam
+  pouco no cosseno, mas mudam a pergunta: só perguntas com os mesmos compartilham
+  respostas
+- Entradas expiram após config.SEMANTIC_CACHE_TTL e as menos usadas recentemente
+  saem quando o cache passa de config.SEMANTIC_CACHE_MAX_ENTRIES
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app import config
+from app.pregenerate_steps import age_band_for
+from app.semantic_cache_pairs import PARAPHRASE_PAIRS
+
+Partition = Tuple[str, str, str, Tuple[int, int], str]
+
+# Expressões que só enquadram a pergunta e não mudam o assunto
+_QUESTION_FRAMES = [
+    "o que e", "o que sao", "o que significa", "o que significam", "qual o significado de",
+    "qual e o significado de", "o que quer dizer", "me explique", "me explica", "explique",
+    "explica", "pode explicar", "voce pode explicar", "poderia explicar", "defina",
+    "qual a definicao de", "qual e a definicao de", "eu queria saber", "queria saber",
+    "gostaria de saber", "professor", "por favor"
+]
+
+_STOPWORDS = {
+    "a", "as", "o", "os", "um", "uma", "uns", "umas", "de", "do", "da", "dos", "das",
+    "e", "em", "no", "na", "nos", "nas", "que", "para", "pra", "por", "com", "se",
+    "me", "isso", "esse", "essa", "este", "esta", "ao", "aos", "ou"
+}
+
+
+# Palavras (sem acento) que invertem o sentido da pergunta
+_NEGATIONS = {"nao", "nunca", "jamais", "sem", "nem", "nenhum", "nenhuma", "ninguem", "nada"}
+
+
+def exact_signature(question: str) -> Tuple[str, ...]:
+    """
+    Negações, números e operadores da pergunta ("o que não é..." != "o que é...",
+    "2+2" != "2-2"): precisam coincidir para a resposta ser reaproveitada.
+    """
+    words = normalize_question(question).split()
+    return tuple(sorted(
+        word for word in set(words)
+        if word in _NEGATIONS or re.search(r"[0-9+\-*/=^<>%]", word)
+    ))
+
+
+def normalize_question(question: str) -> str:
+    """Minúsculas, sem acentos, pontuação, enquadramentos ("o que é") e palavras vazias."""
+    text = unicodedata.normalize("NFKD", question.lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    # Operadores ficam: "2+2" e "2-2" são perguntas diferentes
+    text = " " + re.sub(r"[^a-z0-9+\-*/=^<>%]+", " ", text).strip() + " "
+    for frame in _QUESTION_FRAMES:
+        text = text.replace(f" {frame} ", " ")
+    words = [word for word in text.split() if word not in _STOPWORDS]
+    # Sem nada além de palavras vazias: usa o texto inteiro para não igualar tudo
+    return " ".join(words) or text.strip()
+
+
+class SentenceEmbedder:
+    """Embeddings de frase L2-normalizados (mean pooling dos tokens de um bi-encoder)."""
+
+    def __init__(self, model_name: str = None):
+        from transformers import pipeline
+
+        self.model_name = model_name or config.SEMANTIC_CACHE_EMBEDDING_MODEL
+        self._extractor = pipeline("feature-extraction", model=self.model_name)
+        self.dim = len(self.embed("teste"))
+
+    def embed(self, question: str) -> np.ndarray:
+        output = self._extractor(question.strip(), truncation=True)
+        vector = np.asarray(output[0], dtype=np.float32).mean(axis=0)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+
+def calibrate_threshold(embedder, pairs: List[Tuple[str, str, bool]] = None,
+                        margin: float = None) -> Dict[str, Any]:
+    """
+    Escolhe o limiar a partir de pares rotulados (pergunta_a, pergunta_b, mesma_pergunta).
+
+    O limiar fica margin acima do maior cosseno entre perguntas diferentes, então
+    nenhum par negativo do conjunto seria servido do cache. Pares separados por
+    exact_signature não entram: nunca são comparados pelo cache.
+
+    Returns:
+        threshold, max_negative, min_positive, recall (fração das paráfrases que
+        acertam) e pairs (pares usados)
+    """
+    pairs = PARAPHRASE_PAIRS if pairs is None else pairs
+    margin = config.SEMANTIC_CACHE_THRESHOLD_MARGIN if margin is None else margin
+    positives, negatives = [], []
+    for first, second, same in pairs:
+        if exact_signature(first) != exact_signature(second):
+            continue
+        similarity = float(embedder.embed(first) @ embedder.embed(second))
+        (positives if same else negatives).append(similarity)
+
+    threshold = min(1.0, max(negatives) + margin) if negatives else 1.0
+    return {
+        "threshold": threshold,
+        "max_negative": max(negatives) if negatives else None,
+        "min_positive": min(positives) if positives else None,
+        "recall": sum(s >= threshold for s in positives) / len(positives) if positives else 0.0,
+        "pairs": len(positives) + len(negatives)
+    }
+
+
+def resolve_threshold(embedder) -> float:
+    """
+    config.SEMANTIC_CACHE_THRESHOLD, ou, se "auto", o limiar calibrado para o modelo
+    (guardado em config.SEMANTIC_CACHE_CALIBRATION_PATH até o modelo, os pares ou a
+    margem mudarem).
+    """
+    if config.SEMANTIC_CACHE_THRESHOLD != "auto":
+        return float(config.SEMANTIC_CACHE_THRESHOLD)
+
+    key = hashlib.sha256(json.dumps(
+        [getattr(embedder, "model_name", ""), PARAPHRASE_PAIRS, config.SEMANTIC_CACHE_THRESHOLD_MARGIN],
+        ensure_ascii=False
+    ).encode("utf-8")).hexdigest()
+    path = config.SEMANTIC_CACHE_CALIBRATION_PATH
+    try:
+        with open(path, encoding="utf-8") as f:
+            saved = json.load(f)
+        if saved.get("key") == key:
+            return saved["threshold"]
+    except (OSError, ValueError):
+        pass
+
+    calibration = calibrate_threshold(embedder)
+    print(f"Cache semântico: limiar {calibration['threshold']:.3f} calibrado com {calibration['pairs']} pares "
+          f"({calibration['recall']:.0%} das paráfrases acertam)")
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(dict(calibration, key=key), f, indent=2)
+    except OSError as e:
+        print(f"Erro ao salvar a calibração do cache semântico: {e}")
+    return calibration["threshold"]
+
+
+class LSHIndex:
+    """
+    Índice aproximado por hiperplanos aleatórios: n_tables tabelas de n_planes bits.
+    Vetores próximos (cosseno alto) caem no mesmo balde em pelo menos uma tabela com
+    alta probabilidade; os candidatos são conferidos pelo cosseno exato.
+    """
+
+    def __init__(self, planes: np.ndarray):
+        self._planes = planes  # (n_tables, n_planes, dim), compartilhado entre partições
+        self._weights = 1 << np.arange(planes.shape[1])
+        self._tables = [dict() for _ in range(planes.shape[0])]
+        self._vectors = {}
+
+    def __len__(self) -> int:
+        return len(self._vectors)
+
+    def _signatures(self, vector: np.ndarray):
+        bits = (self._planes @ vector) > 0  # (n_tables, n_planes)
+        return (bits @ self._weights).tolist()
+
+    def add(self, entry_id: int, vector: np.ndarray):
+        self._vectors[entry_id] = vector
+        for table, signature in zip(self._tables, self._signatures(vector)):
+            table.setdefault(signature, set()).add(entry_id)
+
+    def remove(self, entry_id: int):
+        vector = self._vectors.pop(entry_id, None)
+        if vector is None:
+            return
+        for table, signature in zip(self._tables, self._signatures(vector)):
+            bucket = table.get(signature)
+            if bucket:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del table[signature]
+
+    def nearest(self, vector: np.ndarray) -> Tuple[Optional[int], float]:
+        """Candidato mais similar (id, cosseno), ou (None, 0.0) se nenhum balde coincide."""
+        candidates = set()
+        for table, signature in zip(self._tables, self._signatures(vector)):
+            candidates.update(table.get(signature, ()))
+        if not candidates:
+            return None, 0.0
+        ids = list(candidates)
+        similarities = np.stack([self._vectors[i] for i in ids]) @ vector
+        best = int(np.argmax(similarities))
+        return ids[best], float(similarities[best])
+
+
+class SemanticCache:
+    """
+    Args:
+        threshold: Cosseno mínimo para servir a resposta guardada (padrão: resolve_threshold)
+        max_entries: Máximo de respostas guardadas (remove as menos usadas recentemente)
+        ttl: Validade de cada resposta, em segundos
+        n_tables, n_planes: Parâmetros do LSH (mais tabelas = mais recall; mais planos = baldes menores)
+        embedder: Objeto com embed(pergunta) -> vetor normalizado e dim (padrão: SentenceEmbedder)
+    """
+
+    def __init__(self, threshold: float = None, max_entries: int = 5000, ttl: float = 24 * 60 * 60,
+                 n_tables: int = 8, n_planes: int = 8, seed: int = 13, embedder=None):
+        self._embedder = embedder or SentenceEmbedder()
+        self.threshold = resolve_threshold(self._embedder) if threshold is None else threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._planes = np.random.default_rng(seed).standard_normal(
+            (n_tables, n_planes, self._embedder.dim)
+        ).astype(np.float32)
+        self._partitions: Dict[Partition, LSHIndex] = {}
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()  # Ordem de uso (LRU)
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._stats = {"lookups": 0, "hits": 0, "misses": 0, "stores": 0,
+                       "evictions": 0, "expired": 0, "hit_similarity_sum": 0.0}
+
+    def lookup(self, question: str, partition: Partition) -> Optional[str]:
+        """Resposta guardada para uma pergunta equivalente na mesma partição, ou None."""
+        vector = self._embedder.embed(question)
+        partition = (partition, exact_signature(question))
+        with self._lock:
+            self._stats["lookups"] += 1
+            index = self._partitions.get(partition)
+            entry_id, similarity = index.nearest(vector) if index else (None, 0.0)
+            if entry_id is not None and similarity >= self.threshold:
+                entry = self._entries[entry_id]
+                if time.time() - entry["created_at"] <= self.ttl:
+                    self._entries.move_to_end(entry_id)
+                    entry["hits"] += 1
+                    self._stats["hits"] += 1
+                    self._stats["hit_similarity_sum"] += similarity
+                    return entry["answer"]
+                self._remove(entry_id)
+                self._stats["expired"] += 1
+            self._stats["misses"] += 1
+            return None
+
+    def store(self, question: str, partition: Partition, answer: str):
+        """Guarda a resposta gerada para a pergunta."""
+        vector = self._embedder.embed(question)
+        partition = (partition, exact_signature(question))
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = {"question": question, "answer": answer, "partition": partition,
+                                       "created_at": time.time(), "hits": 0}
+            self._partitions.setdefault(partition, LSHIndex(self._planes)).add(entry_id, vector)
+            self._stats["stores"] += 1
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+
+    def _remove(self, entry_id: int):
+        entry = self._entries.pop(entry_id)
+        index = self._partitions[entry["partition"]]
+        index.remove(entry_id)
+        if not len(index):
+            del self._partitions[entry["partition"]]
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores, taxa de acerto e similaridade média dos acertos."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["partitions"] = len(self._partitions)
+        similarity_sum = stats.pop("hit_similarity_sum")
+        stats["hit_rate"] = stats["hits"] / stats["lookups"] if stats["lookups"] else 0.0
+        stats["avg_hit_similarity"] = similarity_sum / stats["hits"] if stats["hits"] else None
+        return stats
+
+
+def semantic_partition(area_name: str, subarea_name: str, level_name: str, user_age: int,
+                       teaching_style: str) -> Partition:
+    """Partição do cache: só perguntas com o mesmo contexto de estudo compartilham respostas."""
+    return (area_name or "", subarea_name or "", level_name or "", age_band_for(user_age), teaching_style or "")
+
+
+_semantic_cache = None
+_semantic_cache_unavailable = False
+_semantic_cache_lock = threading.Lock()
+
+
+def get_semantic_cache() -> Optional[SemanticCache]:
+    """
+    Cache compartilhado, ou None se desativado em config.SEMANTIC_CACHE_ENABLED ou se
+    o modelo de embeddings não puder ser carregado (sem ele, nada é servido do cache).
+    """
+    global _semantic_cache, _semantic_cache_unavailable
+    if not config.SEMANTIC_CACHE_ENABLED or _semantic_cache_unavailable:
+        return None
+    with _semantic_cache_lock:
+        if _semantic_cache is None and not _semantic_cache_unavailable:
+            try:
+                _semantic_cache = SemanticCache(
+                    max_entries=config.SEMANTIC_CACHE_MAX_ENTRIES,
+                    ttl=config.SEMANTIC_CACHE_TTL
+                )
+            except (ImportError, OSError) as e:
+                print(f"Cache semântico desativado: modelo de embeddings indisponível ({e})")
+                _semantic_cache_unavailable = True
+        return _semantic_cache
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibra o limiar do cache semântico com os pares rotulados")
+    parser.add_argument("--model", default=None, help="Modelo de embeddings (padrão: config)")
+    parser.add_argument("--margin", type=float, default=None, help="Margem acima do maior par negativo")
+    args = parser.parse_args()
+
+    embedder = SentenceEmbedder(args.model)
+    print(f"{'cosseno':>8}  {'par':<6}  perguntas")
+    for first, second, same in PARAPHRASE_PAIRS:
+        if exact_signature(first) != exact_signature(second):
+            continue
+        similarity = float(embedder.embed(first) @ embedder.embed(second))
+        print(f"{similarity:>8.3f}  {'igual' if same else 'difer.':<6}  {first} | {second}")
+    print(json.dumps(calibrate_threshold(embedder, margin=args.margin), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+# app/semantic_cache_pairs.py
+"""
+Pares rotulados de perguntas usados para calibrar o limiar do cache semântico.
+
+Cada par é (pergunta_a, pergunta_b, mesma_pergunta). Os pares negativos são quase
+iguais na escrita, mas pedem outra resposta (ex: "for" x "while", área x perímetro):
+o limiar precisa ficar acima de todos eles.
+"""
+
+PARAPHRASE_PAIRS = [
+    # Mesma pergunta, outras palavras
+    ("O que é uma variável?", "O que significa variável em programação?", True),
+    ("O que é fotossíntese?", "Pode me explicar o que é a fotossíntese?", True),
+    ("Como calculo a área de um triângulo?", "Qual a fórmula da área do triângulo?", True),
+    ("Para que serve um loop for?", "Qual a utilidade do laço for?", True),
+    ("O que é uma célula?", "Me explica o que é célula", True),
+    ("Quem descobriu o Brasil?", "Quem chegou primeiro ao Brasil em 1500?", True),
+    ("O que é energia cinética?", "Explique o conceito de energia cinética", True),
+    ("Como funciona a digestão?", "Como acontece o processo de digestão no corpo?", True),
+    ("O que é uma fração?", "O que significa fração em matemática?", True),
+    ("Qual a diferença entre vírus e bactéria?", "Vírus e bactéria são diferentes em quê?", True),
+    ("O que é um algoritmo?", "Me explique o que é algoritmo", True),
+    ("Por que o céu é azul?", "Qual o motivo de o céu ser azul?", True),
+    ("O que é o teorema de Pitágoras?", "Pode explicar o teorema de Pitágoras?", True),
+    ("Como se faz uma regra de três?", "Como resolver uma regra de três simples?", True),
+    ("O que é democracia?", "O que significa democracia?", True),
+    ("O que é um substantivo?", "Me explica o que são substantivos", True),
+    ("Como funciona a gravidade?", "O que faz a gravidade funcionar?", True),
+    ("O que é um número primo?", "Qual a definição de número primo?", True),
+    ("O que é ecossistema?", "Explique o que é um ecossistema", True),
+    ("Para que serve uma função em Python?", "Qual a utilidade de criar funções no Python?", True),
+    ("O que é inflação?", "O que quer dizer inflação na economia?", True),
+    ("Como funciona o sistema solar?", "Como o sistema solar está organizado?", True),
+    ("O que é um verbo?", "Qual a definição de verbo?", True),
+    ("O que é ritmo na música?", "O que significa ritmo em música?", True),
+
+    # Quase iguais na escrita, perguntas diferentes
+    ("Como funciona um loop for em Python e quando devo usar esse tipo de repetição?",
+     "Como funciona um loop while em Python e quando devo usar esse tipo de repetição?", False),
+    ("Como calculo a área de um triângulo?", "Como calculo o perímetro de um triângulo?", False),
+    ("O que é fotossíntese?", "O que não é fotossíntese?", False),
+    ("Qual a diferença entre mitose e meiose?", "Qual a semelhança entre mitose e meiose?", False),
+    ("Como somar frações?", "Como multiplicar frações?", False),
+    ("O que é uma lista em Python?", "O que é uma tupla em Python?", False),
+    ("Quem foi o primeiro presidente do Brasil?", "Quem foi o último presidente do Brasil?", False),
+    ("Como calcular a média de uma lista?", "Como calcular a mediana de uma lista?", False),
+    ("O que é energia cinética?", "O que é energia potencial?", False),
+    ("Qual a capital da Argentina?", "Qual a capital da Armênia?", False),
+    ("Como funciona a mitose?", "Como funciona a meiose?", False),
+    ("Quanto é 2+2?", "Quanto é 2-2?", False),
+    ("O que é um número primo?", "O que é um número par?", False),
+    ("Como calcular a área do círculo?", "Como calcular a área do quadrado?", False),
+    ("O que é um substantivo?", "O que é um adjetivo?", False),
+    ("Por que o céu é azul?", "Por que o mar é azul?", False),
+    ("Como faço um loop infinito?", "Como evito um loop infinito?", False),
+    ("O que é uma célula animal?", "O que é uma célula vegetal?", False),
+    ("Quando começou a Primeira Guerra Mundial?", "Quando começou a Segunda Guerra Mundial?", False),
+    ("Como converter Celsius para Fahrenheit?", "Como converter Fahrenheit para Celsius?", False),
+    ("O que é um ácido?", "O que é uma base?", False),
+    ("Qual a fórmula da velocidade média?", "Qual a fórmula da aceleração média?", False),
+    ("Como declarar uma variável em Python?", "Como declarar uma variável em JavaScript?", False),
+    ("O que é inflação?", "O que é deflação?", False),
+]
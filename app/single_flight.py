@@ -0,0 +1,180 @@
+# app/single_flight.py
+"""
+Deduplicação de chamadas em andamento ("single-flight").
+
+Quando vários alunos estão no mesmo passo da aula, todos montam o mesmo prompt e
+disparariam uma chamada ao LLM cada, antes que qualquer uma preenchesse o cache.
+Com AsyncSingleFlight, chamadas concorrentes com a mesma chave esperam uma única
+execução e compartilham o resultado.
+
+As funções síncronas de app.llm_integration executam suas corrotinas em um único
+event loop de fundo, então a deduplicação no loop também cobre chamadas vindas de
+threads diferentes.
+"""
+
+import asyncio
+import hashlib
+import os
+from typing import Any, Awaitable, Callable, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: apenas a deduplicação dentro do processo fica disponível
+    fcntl = None
+
+# Espera máxima (segundos) entre tentativas de obter o lock de arquivo de outro processo
+LOCK_POLL_MAX = 0.05
+
+
+class _Call:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+def _lock_path(lock_dir: str, key: str) -> str:
+    return os.path.join(lock_dir, hashlib.sha256(key.encode("utf-8")).hexdigest()[:32] + ".lock")
+
+
+def _try_file_lock(path: str):
+    """Lock exclusivo sem bloquear: o arquivo travado, ou None se outro processo o tem."""
+    lock_file = open(path, "a")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        return None
+    # O dono anterior apaga o arquivo ao liberar: se o travado não é mais o do caminho, tenta de novo
+    try:
+        current = os.stat(path).st_ino
+    except FileNotFoundError:
+        current = None
+    if current != os.fstat(lock_file.fileno()).st_ino:
+        lock_file.close()
+        return None
+    return lock_file
+
+
+async def _acquire_file_lock(path: str):
+    # Sem threads: tentativas não bloqueantes espaçadas no próprio loop (cancelar é imediato)
+    delay = 0.001
+    while True:
+        lock_file = _try_file_lock(path)
+        if lock_file is not None:
+            return lock_file
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, LOCK_POLL_MAX)
+
+
+def _release_file_lock(path: str, lock_file):
+    # Apaga antes de destravar: o diretório só guarda locks de chamadas em andamento
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+    finally:
+        lock_file.close()
+
+
+class AsyncSingleFlight:
+    """
+    Garante uma única execução em andamento por chave (por event loop).
+
+    A primeira chamada cria a tarefa; as demais aguardam a mesma tarefa. O
+    cancelamento de um participante não afeta os outros; a tarefa só é cancelada
+    quando ninguém mais a aguarda.
+
+    No modo entre processos (lock_dir definido), a tarefa ainda obtém o lock de
+    arquivo da chave e, antes de executar, chama 'recheck' — normalmente uma
+    leitura do cache compartilhado — para aproveitar o resultado que outro processo
+    acabou de gravar. Só processos com a mesma chave esperam uns pelos outros; o
+    arquivo é apagado ao liberar o lock.
+    """
+
+    def __init__(self, lock_dir: str = None):
+        self.lock_dir = lock_dir if fcntl is not None else None
+        if self.lock_dir:
+            os.makedirs(self.lock_dir, exist_ok=True)
+        self._calls = {}
+        self._stats = {"executions": 0, "coalesced": 0}
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]],
+                 recheck: Callable[[], Awaitable[Optional[Any]]] = None) -> Any:
+        """
+        Executa func() uma única vez para chamadas concorrentes com a mesma chave.
+
+        Args:
+            key: Chave da chamada (ex: get_cache_key do prompt)
+            func: Função assíncrona que produz o resultado
+            recheck: Função assíncrona opcional que retorna o resultado já disponível
+                (ou None), consultada após obter o lock entre processos
+
+        Returns:
+            O resultado de func() (ou de recheck()), compartilhado entre os participantes
+        """
+        loop = asyncio.get_running_loop()
+        call_key = (id(loop), key)
+        call = self._calls.get(call_key)
+
+        if call is None:
+            call = _Call(loop.create_task(self._execute(key, func, recheck)))
+            self._calls[call_key] = call
+            self._stats["executions"] += 1
+            call.task.add_done_callback(lambda task: self._finish(call_key, call))
+        else:
+            self._stats["coalesced"] += 1
+
+        call.waiters += 1
+        try:
+            # shield: cancelar um participante não cancela a requisição compartilhada
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                call.task.cancel()
+
+    async def join(self, key: str) -> Optional[Any]:
+        """
+        Aguarda a execução em andamento para a chave, se houver.
+
+        Returns:
+            O resultado compartilhado, ou None quando não há execução em andamento
+        """
+        call = self._calls.get((id(asyncio.get_running_loop()), key))
+        if call is None:
+            return None
+        self._stats["coalesced"] += 1
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                call.task.cancel()
+
+    def _finish(self, call_key, call: _Call):
+        if self._calls.get(call_key) is call:
+            del self._calls[call_key]
+        # Marca a exceção como lida quando todos os participantes já desistiram
+        if not call.task.cancelled():
+            call.task.exception()
+
+    async def _execute(self, key: str, func, recheck) -> Any:
+        if not self.lock_dir:
+            return await func()
+
+        # Lock exclusivo da chave: processos com o mesmo prompt esperam aqui
+        path = _lock_path(self.lock_dir, key)
+        lock_file = await _acquire_file_lock(path)
+        try:
+            if recheck is not None:
+                result = await recheck()
+                if result is not None:
+                    return result
+            return await func()
+        finally:
+            _release_file_lock(path, lock_file)
+
+    def stats(self) -> dict:
+        """Execuções reais e chamadas que aproveitaram uma execução em andamento."""
+        return dict(self._stats)
@@ -0,0 +1,185 @@
+# app/step_prefetch.py
+"""
+Pré-carregamento especulativo da explicação do próximo passo.
+
+Enquanto o aluno lê o passo N, a explicação do passo N+1 (e, no último passo, a do
+primeiro passo da próxima lição) é gerada em segundo plano e fica no cache de
+respostas do LLM. Quando o aluno pede o próximo passo, present_current_step encontra
+a resposta pronta no cache, ou aguarda a geração que já está em andamento em vez de
+repetir a requisição.
+
+Os pré-carregamentos rodam no event loop de fundo de app.llm_integration, com
+concorrência limitada, um limite de pendentes e um orçamento de chamadas por usuário.
+Mudar de nível ou subárea cancela os pré-carregamentos pendentes do usuário.
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Union
+
+from app import config
+from app.llm_integration import acached_teacher_llm, acall_teacher_llm, submit_background
+
+
+def build_step_prompt(step_content: str, user_age: Union[int, str], area_name: str, subarea_name: str,
+                      level_name: str, module_title: str, lesson_title: str) -> str:
+    """
+    Monta o prompt de explicação de um passo (usado na apresentação, no pré-carregamento
+    e na pré-geração, onde user_age é uma faixa como "13-14").
+    """
+    context = f"Área: {area_name}, Subárea: {subarea_name}, Nível: {level_name}, Módulo: {module_title}, Lição: {lesson_title}"
+
+    return (
+        f"Explique de forma didática e adequada para um estudante de {user_age} anos: {step_content}. "
+        f"Contexto da aula: {context}. "
+        f"Use linguagem acessível e exemplos práticos. Relacione com o dia a dia quando possível. "
+        f"Mantenha o foco específico neste tópico."
+    )
+
+
+class StepPrefetcher:
+    """
+    Gera em segundo plano as explicações dos próximos passos de cada usuário.
+
+    Args:
+        max_concurrent: Explicações geradas ao mesmo tempo
+        max_pending: Máximo de pré-carregamentos pendentes; novos pedidos além disso são descartados
+        budget_per_hour: Chamadas à API por usuário por hora (acertos de cache não contam)
+    """
+
+    def __init__(self, max_concurrent: int = 2, max_pending: int = 8, budget_per_hour: int = 20):
+        self.max_concurrent = max_concurrent
+        self.max_pending = max_pending
+        self.budget_per_hour = budget_per_hour
+        self._semaphore = None  # Criado no event loop de fundo
+        self._lock = threading.Lock()
+        self._pending = {}  # user_id -> {prompt: Future}
+        self._spent = {}    # user_id -> deque de timestamps das chamadas à API
+        self._stats = {"scheduled": 0, "generated": 0, "already_cached": 0,
+                       "cancelled": 0, "dropped": 0, "over_budget": 0}
+
+    def prefetch(self, user_id: str, prompt: str, student_age: Union[int, List[int]] = None,
+                 subject_area: str = None, teaching_style: str = "didático") -> bool:
+        """
+        Agenda a geração de uma explicação (mesmos argumentos usados na apresentação).
+
+        Returns:
+            True se o pré-carregamento foi agendado
+        """
+        with self._lock:
+            user_pending = self._pending.setdefault(user_id, {})
+            if prompt in user_pending:
+                return True
+            if sum(len(p) for p in self._pending.values()) >= self.max_pending:
+                self._stats["dropped"] += 1
+                return False
+            future = submit_background(
+                self._run(user_id, prompt, student_age, subject_area, teaching_style)
+            )
+            user_pending[prompt] = future
+            self._stats["scheduled"] += 1
+
+        future.add_done_callback(lambda f: self._forget(user_id, prompt, f))
+        return True
+
+    def prefetch_next_steps(self, user_id: str, user_age: int, area_name: str, subarea_name: str,
+                            level_name: str, module_title: str, lesson_title: str, steps: List,
+                            step_index: int, teaching_style: str, next_lesson: Optional[Dict] = None):
+        """
+        Pré-carrega o passo seguinte a step_index; no último passo da lição, o primeiro
+        passo de next_lesson (se config.STEP_PREFETCH_NEXT_LESSON).
+        """
+        if step_index + 1 < len(steps):
+            target_step, target_lesson = steps[step_index + 1], lesson_title
+        elif next_lesson and config.STEP_PREFETCH_NEXT_LESSON and next_lesson.get("steps"):
+            target_step = next_lesson["steps"][0]
+            target_lesson = next_lesson.get("lesson_title", "Sem título")
+        else:
+            return
+
+        # Import local: app.pregenerate_steps depende deste módulo
+        from app.pregenerate_steps import lookup_step_explanation
+        if lookup_step_explanation(target_step, user_age, area_name, subarea_name, level_name,
+                                   module_title, target_lesson, teaching_style) is not None:
+            return  # Já pré-gerado para a faixa etária do aluno
+
+        prompt = build_step_prompt(target_step, user_age, area_name, subarea_name,
+                                   level_name, module_title, target_lesson)
+        self.prefetch(user_id, prompt, student_age=user_age, subject_area=area_name,
+                      teaching_style=teaching_style)
+
+    def cancel_user(self, user_id: str) -> int:
+        """Cancela os pré-carregamentos pendentes do usuário (ex: mudou de nível ou subárea)."""
+        with self._lock:
+            futures = list(self._pending.pop(user_id, {}).values())
+        cancelled = sum(1 for future in futures if future.cancel())
+        with self._lock:
+            self._stats["cancelled"] += cancelled
+        return cancelled
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["pending"] = sum(len(p) for p in self._pending.values())
+        return stats
+
+    def _forget(self, user_id: str, prompt: str, future):
+        with self._lock:
+            user_pending = self._pending.get(user_id)
+            if user_pending and user_pending.get(prompt) is future:
+                del user_pending[prompt]
+                if not user_pending:
+                    del self._pending[user_id]
+
+    def _take_budget(self, user_id: str) -> bool:
+        now = time.time()
+        with self._lock:
+            spent = self._spent.setdefault(user_id, deque())
+            while spent and now - spent[0] >= 3600:
+                spent.popleft()
+            if len(spent) >= self.budget_per_hour:
+                self._stats["over_budget"] += 1
+                return False
+            spent.append(now)
+            return True
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    async def _run(self, user_id: str, prompt: str, student_age, subject_area: str, teaching_style: str):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+
+        async with self._semaphore:
+            cached = await acached_teacher_llm(prompt, student_age=student_age, subject_area=subject_area,
+                                               teaching_style=teaching_style)
+            if cached is not None:
+                self._count("already_cached")
+                return
+            if not self._take_budget(user_id):
+                return
+            await acall_teacher_llm(prompt, student_age=student_age, subject_area=subject_area,
+                                    teaching_style=teaching_style, user_id=user_id)
+            self._count("generated")
+
+
+_step_prefetcher = None
+_step_prefetcher_lock = threading.Lock()
+
+
+def get_step_prefetcher() -> Optional[StepPrefetcher]:
+    """Retorna o pré-carregador compartilhado, ou None se desativado em config.STEP_PREFETCH_ENABLED."""
+    global _step_prefetcher
+    if not config.STEP_PREFETCH_ENABLED:
+        return None
+    with _step_prefetcher_lock:
+        if _step_prefetcher is None:
+            _step_prefetcher = StepPrefetcher(
+                max_concurrent=config.STEP_PREFETCH_CONCURRENCY,
+                max_pending=config.STEP_PREFETCH_MAX_PENDING,
+                budget_per_hour=config.STEP_PREFETCH_BUDGET_PER_HOUR
+            )
+        return _step_prefetcher
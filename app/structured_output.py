@@ -0,0 +1,473 @@
+# app/structured_output.py
+"""
+Saída estruturada (JSON) do LLM: reparo, parser incremental e validação por esquema.
+
+- IncrementalJSONParser lê o texto aos pedaços (streaming) e ao mesmo tempo o limpa:
+  ignora o que vem antes e depois do JSON (cercas ```json, explicações), remove
+  comentários // e /* */ (os próprios prompts os usam, ex: "// Mais semanas..."),
+  vírgulas finais e troca True/False/None por true/false/null. Avisa cada valor
+  completo até uma profundidade (ex: cada semana de weekly_plan) e, se o texto for
+  cortado (limite de tokens), recupera a parte já completa.
+- validate/conform implementam um subconjunto de JSON Schema (type, properties,
+  required, items, minItems, maxItems, enum, minimum, maximum).
+- repair_units e reask_prompt apontam os trechos inválidos para pedir de novo só
+  eles ao LLM (ver llm_integration.agenerate_json).
+"""
+
+import json
+from typing import Any, Dict, List, Tuple
+
+Path = Tuple[Any, ...]
+
+_LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+
+class StructuredOutputError(ValueError):
+    """A resposta do LLM não pôde ser convertida em JSON válido para o esquema."""
+
+    def __init__(self, message: str, errors: List[Tuple[Path, str]] = None):
+        super().__init__(message)
+        self.errors = errors or []
+
+
+def format_path(path: Path) -> str:
+    """("weekly_plan", 2, "focus") -> "weekly_plan[2].focus"."""
+    text = ""
+    for part in path:
+        text += f"[{part}]" if isinstance(part, int) else (f".{part}" if text else str(part))
+    return text or "(raiz)"
+
+
+class IncrementalJSONParser:
+    """
+    Parser tolerante e incremental para a resposta JSON de um LLM.
+
+    Args:
+        emit_depth: Profundidade máxima dos valores avisados por feed()
+            (1 = campos da raiz, 2 = itens das listas da raiz, ...)
+    """
+
+    def __init__(self, emit_depth: int = 2):
+        self.emit_depth = emit_depth
+        self._out = []              # Texto limpo (JSON estrito)
+        self._stack = []            # Contêineres abertos
+        self._started = False
+        self._done = False
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._string_is_key = False
+        self._comment = None        # None, "//" ou "/*"
+        self._slash = False         # '/' pendente (talvez início de comentário)
+        self._star = False          # '*' dentro de /* */ (talvez fim do comentário)
+        self._comma = None          # Vírgula pendente + espaços depois dela
+        self._token_start = None    # Início de número/literal em andamento
+        self._safe = (0, "")        # (posição, fechamentos) do último ponto consistente
+        self._events = []
+
+    # API
+
+    def feed(self, chunk: str) -> List[Tuple[Path, Any]]:
+        """Processa mais um trecho; devolve os valores que ficaram completos."""
+        for char in chunk:
+            if self._done:
+                break
+            self._consume(char)
+        events, self._events = self._events, []
+        return events
+
+    @property
+    def complete(self) -> bool:
+        """Se o valor raiz já foi fechado."""
+        return self._done
+
+    @property
+    def text(self) -> str:
+        """JSON limpo até agora."""
+        return "".join(self._out)
+
+    def result(self) -> Any:
+        """
+        O valor raiz: completo, ou recuperado do trecho já recebido (fechando a string e os
+        contêineres abertos). None se nenhum JSON foi encontrado.
+        """
+        if not self._started:
+            return None
+        if self._done:
+            try:
+                return json.loads(self.text, strict=False)
+            except ValueError as e:
+                # Fechado, mas malformado (ex: vírgula faltando): recupera o que vem antes do erro
+                salvage = IncrementalJSONParser(emit_depth=-1)
+                salvage.feed(self.text[:getattr(e, "pos", 0)])
+                return salvage.result()
+
+        text = self.text
+        candidates = []
+        if self._in_string and not self._string_is_key:
+            candidates.append(text + ('"' if not self._escape else '\\"') + self._closers())
+        if self._token_start is not None:
+            candidates.append(self._with_literal(text, self._token_start) + self._closers())
+        offset, closers = self._safe
+        candidates.append(text[:offset] + closers)
+        for candidate in candidates:
+            try:
+                return json.loads(candidate, strict=False)
+            except ValueError:
+                continue
+        return None
+
+    # Implementação
+
+    def _closers(self) -> str:
+        return "".join(entry["close"] for entry in reversed(self._stack))
+
+    def _path(self) -> Path:
+        return tuple(entry["key"] if entry["close"] == "}" else entry["index"] for entry in self._stack)
+
+    def _mark_safe(self):
+        self._safe = (len(self._out), self._closers())
+
+    def _value_done(self, start: int):
+        """Um valor (escalar ou contêiner) terminou em self._out[start:]."""
+        path = self._path()
+        if len(path) <= self.emit_depth:
+            try:
+                value = json.loads("".join(self._out[start:]), strict=False)
+            except ValueError:
+                value = None
+            else:
+                self._events.append((path, value))
+        self._mark_safe()
+
+    @staticmethod
+    def _with_literal(text: str, start: int) -> str:
+        token = text[start:]
+        return text[:start] + _LITERALS.get(token, token)
+
+    def _end_token(self):
+        if self._token_start is None:
+            return
+        start = self._token_start
+        token = "".join(self._out[start:])
+        if token in _LITERALS:
+            self._out[start:] = list(_LITERALS[token])
+        self._token_start = None
+        self._value_done(start)
+
+    def _flush_comma(self):
+        if self._comma is None:
+            return
+        self._out.extend(self._comma)
+        self._comma = None
+        top = self._stack[-1]
+        if top["close"] == "}":
+            top["expect_key"] = True
+            top["key"] = None
+        else:
+            top["index"] += 1
+
+    def _consume(self, char: str):
+        if self._in_string:
+            self._consume_string(char)
+            return
+
+        if self._comment == "//":
+            if char == "\n":
+                self._comment = None
+            return
+        if self._comment == "/*":
+            if self._star and char == "/":
+                self._comment = None
+            self._star = char == "*"
+            return
+        if self._slash:
+            self._slash = False
+            if char == "/":
+                self._comment = "//"
+                return
+            if char == "*":
+                self._comment, self._star = "/*", False
+                return
+
+        if not self._started:
+            # Ignora cercas e explicações antes do JSON
+            if char == "/":
+                self._slash = True
+            elif char in "{[":
+                self._started = True
+                self._open(char)
+            return
+
+        if char == "/":
+            self._end_token()
+            self._slash = True
+        elif char.isspace():
+            self._end_token()
+            if self._comma is not None:
+                self._comma.append(char)
+            elif not self._done:
+                self._out.append(char)
+        elif char == ",":
+            self._end_token()
+            if self._comma is None:  # Vírgulas repetidas viram uma só
+                self._comma = [","]
+        elif char in "}]":
+            self._end_token()
+            self._comma = None  # Vírgula final antes do fechamento
+            self._close(char)
+        elif char in "{[":
+            self._flush_comma()
+            self._open(char)
+        elif char == ":":
+            self._end_token()
+            self._flush_comma()
+            self._out.append(char)
+            if self._stack and self._stack[-1]["close"] == "}":
+                self._stack[-1]["expect_key"] = False
+        elif char == '"':
+            self._end_token()
+            self._flush_comma()
+            top = self._stack[-1]
+            self._string_is_key = top["close"] == "}" and top["expect_key"]
+            self._string_start = len(self._out)
+            self._in_string = True
+            self._out.append(char)
+        else:
+            self._flush_comma()
+            if self._token_start is None:
+                self._token_start = len(self._out)
+            self._out.append(char)
+
+    def _consume_string(self, char: str):
+        if self._escape:
+            self._escape = False
+            self._out.append(char)
+            return
+        if char == "\\":
+            self._escape = True
+            self._out.append(char)
+            return
+        if char != '"':
+            self._out.append(char)
+            return
+
+        self._out.append(char)
+        self._in_string = False
+        if self._string_is_key:
+            top = self._stack[-1]
+            top["key"] = json.loads("".join(self._out[self._string_start:]), strict=False)
+            top["expect_key"] = False
+        else:
+            self._value_done(self._string_start)
+
+    def _open(self, char: str):
+        close = "}" if char == "{" else "]"
+        self._stack.append({"close": close, "start": len(self._out), "key": None,
+                            "index": 0, "expect_key": close == "}"})
+        self._out.append(char)
+        self._mark_safe()
+
+    def _close(self, char: str):
+        if not self._stack or self._stack[-1]["close"] != char:
+            # Fechamento trocado: fecha o contêiner aberto de qualquer forma
+            if not self._stack:
+                return
+            char = self._stack[-1]["close"]
+        entry = self._stack.pop()
+        self._out.append(char)
+        if not self._stack:
+            self._done = True
+        self._value_done(entry["start"])
+
+
+def repair_json(text: str) -> str:
+    """Extrai e limpa o JSON de uma resposta (cercas, comentários, vírgulas finais...)."""
+    parser = IncrementalJSONParser(emit_depth=-1)
+    parser.feed(text)
+    return parser.text
+
+
+def parse_json(text: str) -> Any:
+    """
+    Converte a resposta do LLM em um valor Python, reparando defeitos comuns e
+    recuperando a parte completa de respostas cortadas. None se não houver JSON.
+    """
+    parser = IncrementalJSONParser(emit_depth=-1)
+    parser.feed(text)
+    return parser.result()
+
+
+# Esquemas
+
+_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "boolean": bool,
+    "null": type(None)
+}
+
+
+def _matches_type(value: Any, type_name: str) -> bool:
+    if type_name == "integer":
+        return isinstance(value, int) and not isinstance(value, bool)
+    if type_name == "number":
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    return isinstance(value, _TYPES[type_name])
+
+
+def _type_names(schema: Dict) -> List[str]:
+    type_name = schema.get("type")
+    if type_name is None:
+        return []
+    return type_name if isinstance(type_name, list) else [type_name]
+
+
+def conform(value: Any, schema: Dict) -> Any:
+    """Corrige desvios inofensivos: números vindos como texto ("0.8") e texto vindo como número."""
+    types = _type_names(schema)
+    if isinstance(value, str) and not any(_matches_type(value, t) for t in types):
+        for type_name in ("integer", "number"):
+            if type_name in types:
+                try:
+                    number = float(value.strip().replace(",", "."))
+                except ValueError:
+                    continue
+                if type_name == "number" or number.is_integer():
+                    return int(number) if type_name == "integer" else number
+    if "string" in types and isinstance(value, (int, float)) and not isinstance(value, bool) \
+            and not any(_matches_type(value, t) for t in types):
+        return str(value)
+    if isinstance(value, dict):
+        properties = schema.get("properties", {})
+        return {key: conform(item, properties[key]) if key in properties else item
+                for key, item in value.items()}
+    if isinstance(value, list) and "items" in schema:
+        return [conform(item, schema["items"]) for item in value]
+    return value
+
+
+def validate(value: Any, schema: Dict, path: Path = ()) -> List[Tuple[Path, str]]:
+    """
+    Valida value contra o esquema.
+
+    Returns:
+        Lista de (caminho, mensagem); vazia se válido. Campos obrigatórios ausentes
+        aparecem no caminho do próprio campo.
+    """
+    types = _type_names(schema)
+    if types and not any(_matches_type(value, t) for t in types):
+        return [(path, f"esperado {' ou '.join(types)}, recebido {type(value).__name__}")]
+
+    errors = []
+    if "enum" in schema and value not in schema["enum"]:
+        errors.append((path, f"valor fora de {schema['enum']}"))
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        if "minimum" in schema and value < schema["minimum"]:
+            errors.append((path, f"menor que {schema['minimum']}"))
+        if "maximum" in schema and value > schema["maximum"]:
+            errors.append((path, f"maior que {schema['maximum']}"))
+    if isinstance(value, str) and schema.get("minLength") and len(value.strip()) < schema["minLength"]:
+        errors.append((path, "texto vazio"))
+
+    if isinstance(value, dict):
+        for key in schema.get("required", []):
+            if key not in value:
+                errors.append((path + (key,), "campo obrigatório ausente"))
+        for key, sub_schema in schema.get("properties", {}).items():
+            if key in value:
+                errors.extend(validate(value[key], sub_schema, path + (key,)))
+
+    if isinstance(value, list):
+        if "minItems" in schema and len(value) < schema["minItems"]:
+            errors.append((path, f"menos de {schema['minItems']} itens"))
+        if "maxItems" in schema and len(value) > schema["maxItems"]:
+            errors.append((path, f"mais de {schema['maxItems']} itens"))
+        if "items" in schema:
+            for index, item in enumerate(value):
+                errors.extend(validate(item, schema["items"], path + (index,)))
+
+    return errors
+
+
+def schema_at(schema: Dict, path: Path) -> Dict:
+    """Subesquema no caminho (índices de lista usam "items")."""
+    for part in path:
+        schema = schema.get("items", {}) if isinstance(part, int) else schema.get("properties", {}).get(part, {})
+    return schema
+
+
+def schema_example(schema: Dict) -> Any:
+    """Exemplo do formato esperado, montado a partir do esquema (usa "description" quando houver)."""
+    types = _type_names(schema)
+    first = types[0] if types else "string"
+    if "enum" in schema:
+        return schema["enum"][0]
+    if first == "object":
+        return {key: schema_example(sub) for key, sub in schema.get("properties", {}).items()}
+    if first == "array":
+        return [schema_example(schema.get("items", {}))]
+    if first in ("integer", "number"):
+        return schema.get("minimum", 0)
+    if first == "boolean":
+        return True
+    return schema.get("description", "texto")
+
+
+def get_at(value: Any, path: Path, default: Any = None) -> Any:
+    for part in path:
+        try:
+            value = value[part]
+        except (KeyError, IndexError, TypeError):
+            return default
+    return value
+
+
+def set_at(value: Any, path: Path, new_value: Any) -> Any:
+    """Substitui o valor no caminho (criando objetos intermediários); devolve a raiz."""
+    if not path:
+        return new_value
+    target = value
+    for part in path[:-1]:
+        if isinstance(target, dict) and not isinstance(target.get(part), (dict, list)):
+            target[part] = {}
+        target = target[part]
+    last = path[-1]
+    if isinstance(target, list) and isinstance(last, int) and last >= len(target):
+        target.append(new_value)
+    else:
+        target[last] = new_value
+    return value
+
+
+def repair_units(errors: List[Tuple[Path, str]]) -> Dict[Path, List[str]]:
+    """
+    Agrupa os erros pelo menor trecho que vale pedir de novo: o item de lista mais
+    próximo da raiz no caminho (ex: weekly_plan[2]) ou, sem lista, o campo da raiz.
+    """
+    units = {}
+    for path, message in errors:
+        cut = next((i + 1 for i, part in enumerate(path) if isinstance(part, int)), min(len(path), 1))
+        unit = path[:cut]
+        units.setdefault(unit, []).append(f"{format_path(path)}: {message}")
+
+    # Um trecho que já será refeito por inteiro cobre os trechos dentro dele
+    return {unit: messages for unit, messages in units.items()
+            if not any(other != unit and unit[:len(other)] == other for other in units)}
+
+
+def reask_prompt(original_prompt: str, unit: Path, messages: List[str], current: Any, schema: Dict) -> str:
+    """Prompt que pede de novo apenas o trecho inválido, no formato {"valor": ...}."""
+    current_text = json.dumps(current, ensure_ascii=False) if current is not None else "ausente"
+    example = json.dumps({"valor": schema_example(schema)}, ensure_ascii=False, indent=2)
+    problems = "\n".join(f"- {message}" for message in messages)
+    return (
+        f"Em uma resposta JSON ao pedido abaixo, o trecho \"{format_path(unit)}\" ficou inválido:\n"
+        f"{problems}\n\n"
+        f"Trecho atual: {current_text}\n\n"
+        f"Gere SOMENTE esse trecho corrigido, coerente com o pedido, como um objeto JSON no formato:\n"
+        f"{example}\n\n"
+        f"Pedido original:\n{original_prompt}\n\n"
+        f"Responda APENAS com o JSON válido, sem explicações adicionais."
+    )
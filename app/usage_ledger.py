@@ -0,0 +1,314 @@
+# app/usage_ledger.py
+"""
+Uso do LLM por usuário, funcionalidade e nível de modelo.
+
+O registro é o próprio JSONL de métricas do roteador (config.LLM_ROUTING_LOG_PATH):
+cada resposta da API vira uma linha com os tokens informados pela API (estimados no
+streaming), o custo, a tarefa e o nível de modelo, marcada com o usuário e a função
+que originou a chamada (ex: "progress_management.apply_assessment").
+
+- O usuário vem do argumento user_id das funções do LLM ou de set_usage_user /
+  usage_context (vale também para as funções síncronas, que rodam no loop de fundo)
+- A função chamadora é a primeira fora das camadas do LLM na pilha
+- Com orçamento diário por usuário (config.USAGE_DAILY_TOKEN_BUDGET e
+  config.USAGE_DAILY_COST_BUDGET), quem passou do limite recebe respostas já em
+  cache ou do nível "fast" (ver llm_integration._budget_tier). Os totais do dia
+  são lidos do JSONL compartilhado, então somam o uso de todos os processos que
+  gravam nele (com o atraso da gravação em segundo plano)
+
+Consultas:
+    python -m app.usage_ledger                       # por usuário
+    python -m app.usage_ledger --by caller,tier --since 2026-10-01
+"""
+
+import argparse
+import contextlib
+import contextvars
+import datetime
+import json
+import os
+import sys
+import threading
+from collections import defaultdict
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from app import config
+
+_user = contextvars.ContextVar("usage_user", default=None)
+_caller = contextvars.ContextVar("usage_caller", default=None)
+
+# Módulos ignorados ao procurar a função chamadora
+_INTERNAL_MODULES = ("app.llm_", "app.usage_ledger", "app.structured_output", "app.single_flight",
+                     "asyncio", "concurrent", "threading", "contextlib")
+
+GROUP_FIELDS = ("day", "user_id", "caller", "task", "tier", "model")
+
+
+def set_usage_user(user_id: Optional[str]):
+    """Usuário das chamadas ao LLM feitas a partir daqui no contexto atual (ex: a sessão do CLI)."""
+    _user.set(user_id)
+
+
+@contextlib.contextmanager
+def usage_context(user_id: str = None, caller: str = None):
+    """Marca com o usuário e/ou a funcionalidade as chamadas ao LLM feitas dentro do bloco."""
+    tokens = []
+    if user_id is not None:
+        tokens.append((_user, _user.set(user_id)))
+    if caller is not None:
+        tokens.append((_caller, _caller.set(caller)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+def external_caller() -> Optional[str]:
+    """Primeira função da pilha fora das camadas do LLM, como "modulo.funcao"."""
+    frame = sys._getframe(1)
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if not module.startswith(_INTERNAL_MODULES):
+            return f"{module.rsplit('.', 1)[-1]}.{frame.f_code.co_name}"
+        frame = frame.f_back
+    return None
+
+
+def caller_context() -> contextvars.Context:
+    """
+    Cópia do contexto atual com a função chamadora marcada, para agendar corrotinas
+    no loop de fundo sem perder o usuário e a origem da chamada.
+    """
+    context = contextvars.copy_context()
+    if context.get(_caller) is None:
+        context.run(_caller.set, external_caller())
+    return context
+
+
+def usage_tags(user_id: str = None) -> Dict[str, Optional[str]]:
+    """Usuário e função chamadora de uma chamada ao LLM."""
+    return {"user_id": user_id or _user.get(), "caller": _caller.get() or external_caller()}
+
+
+def _today() -> str:
+    return datetime.date.today().isoformat()
+
+
+def _parse_entry(line) -> Optional[Dict[str, Any]]:
+    if not line.strip():
+        return None
+    try:
+        entry = json.loads(line)
+    except ValueError:
+        return None  # Linha cortada por uma gravação interrompida
+    if "day" not in entry:
+        # Registros gravados antes de o roteador marcar o dia
+        entry["day"] = datetime.date.fromtimestamp(entry["ts"]).isoformat()
+    return entry
+
+
+def read_entries(path: str, since: str = None, until: str = None,
+                 user_id: str = None) -> Iterator[Dict[str, Any]]:
+    """Registros do JSONL, filtrados por dia (AAAA-MM-DD, inclusivo) e usuário."""
+    if not os.path.exists(path):
+        return
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            entry = _parse_entry(line)
+            if entry is None:
+                continue
+            if since and entry["day"] < since:
+                continue
+            if until and entry["day"] > until:
+                continue
+            if user_id is not None and entry.get("user_id") != user_id:
+                continue
+            yield entry
+
+
+def aggregate(path: str, group_by: Sequence[str] = ("user_id",), since: str = None, until: str = None,
+              user_id: str = None) -> List[Dict[str, Any]]:
+    """
+    Soma chamadas, tokens e custo do registro agrupando pelos campos informados.
+
+    Args:
+        path: Arquivo JSONL do registro
+        group_by: Campos de GROUP_FIELDS (ex: ("user_id", "caller"))
+        since, until: Intervalo de dias (AAAA-MM-DD, inclusivo)
+        user_id: Apenas os registros deste usuário
+
+    Returns:
+        Uma linha por grupo, da mais cara para a mais barata
+    """
+    unknown = set(group_by) - set(GROUP_FIELDS)
+    if unknown:
+        raise ValueError(f"Campos de agrupamento desconhecidos: {', '.join(sorted(unknown))}")
+
+    groups = defaultdict(lambda: {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0})
+    for entry in read_entries(path, since, until, user_id):
+        totals = groups[tuple(entry.get(field) or "-" for field in group_by)]
+        totals["calls"] += 1
+        totals["prompt_tokens"] += entry["prompt_tokens"]
+        totals["completion_tokens"] += entry["completion_tokens"]
+        totals["cost_usd"] += entry["cost_usd"]
+
+    rows = []
+    for key, totals in groups.items():
+        row = dict(zip(group_by, key))
+        row.update(totals)
+        row["total_tokens"] = totals["prompt_tokens"] + totals["completion_tokens"]
+        rows.append(row)
+    return sorted(rows, key=lambda row: (-row["cost_usd"], -row["total_tokens"]))
+
+
+class UsageLedger:
+    """
+    Totais diários por usuário para o orçamento, lidos do JSONL de métricas.
+
+    A cada consulta, só as linhas acrescentadas desde a anterior são lidas, então o
+    uso de outros processos que gravam no mesmo arquivo também conta. Sem arquivo
+    (config.LLM_ROUTING_LOG desligado), conta apenas as chamadas deste processo.
+
+    Args:
+        path: JSONL do roteador (None para contar em memória via record)
+        token_budget: Tokens por usuário por dia (0 = sem limite)
+        cost_budget: Custo em dólares por usuário por dia (0 = sem limite)
+    """
+
+    def __init__(self, path: str = None, token_budget: int = 0, cost_budget: float = 0.0):
+        self.path = path
+        self.token_budget = token_budget
+        self.cost_budget = cost_budget
+        self._lock = threading.Lock()
+        self._daily = defaultdict(lambda: {"tokens": 0, "cost_usd": 0.0})  # usuário -> totais de hoje
+        self._day = None
+        self._offset = 0
+        self._degraded = defaultdict(int)  # (dia, usuário) -> chamadas rebaixadas
+
+    @property
+    def has_budget(self) -> bool:
+        return bool(self.token_budget or self.cost_budget)
+
+    def _refresh(self, day: str):
+        # Chamado com o lock: troca de dia zera os totais; lê as linhas novas do arquivo
+        if self._day != day:
+            self._daily.clear()
+            self._day = day
+            self._offset = 0
+        if not self.path:
+            return
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return
+        if size < self._offset:
+            # Arquivo truncado ou trocado: relê do começo
+            self._daily.clear()
+            self._offset = 0
+        if size == self._offset:
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            data = f.read(size - self._offset)
+        # Só linhas completas; a última pode estar no meio da gravação
+        end = data.rfind(b"\n") + 1
+        self._offset += end
+        for line in data[:end].decode("utf-8", errors="replace").splitlines():
+            entry = _parse_entry(line)
+            if entry is None or entry["day"] != day:
+                continue
+            totals = self._daily[entry.get("user_id")]
+            totals["tokens"] += entry["prompt_tokens"] + entry["completion_tokens"]
+            totals["cost_usd"] += entry["cost_usd"]
+
+    def record(self, user_id: Optional[str], tokens: int, cost: float):
+        """Conta o uso de uma resposta (só sem arquivo: com ele, o uso vem das linhas gravadas)."""
+        if self.path:
+            return
+        with self._lock:
+            self._refresh(_today())
+            totals = self._daily[user_id]
+            totals["tokens"] += tokens
+            totals["cost_usd"] += cost
+
+    def daily_usage(self, user_id: Optional[str]) -> Dict[str, Any]:
+        """
+        Tokens e custo do usuário hoje, com os limites e se algum foi ultrapassado.
+
+        Lê o arquivo: chame fora do event loop (ver llm_integration._budget_tier).
+        """
+        day = _today()
+        with self._lock:
+            self._refresh(day)
+            totals = dict(self._daily.get(user_id, {"tokens": 0, "cost_usd": 0.0}))
+            degraded = self._degraded.get((day, user_id), 0)
+        exceeded = bool(
+            (self.token_budget and totals["tokens"] >= self.token_budget)
+            or (self.cost_budget and totals["cost_usd"] >= self.cost_budget)
+        )
+        return {"day": day, "tokens": totals["tokens"], "cost_usd": totals["cost_usd"],
+                "token_budget": self.token_budget or None, "cost_budget": self.cost_budget or None,
+                "exceeded": exceeded, "degraded_calls": degraded}
+
+    def over_budget(self, user_id: Optional[str]) -> bool:
+        """Se o usuário passou do orçamento diário (sem usuário ou sem limites: nunca)."""
+        if user_id is None or not self.has_budget:
+            return False
+        return self.daily_usage(user_id)["exceeded"]
+
+    def note_degraded(self, user_id: Optional[str]):
+        """Conta uma chamada atendida pelo cache ou pelo nível "fast" por falta de orçamento."""
+        key = (_today(), user_id)
+        with self._lock:
+            self._degraded[key] += 1
+            first = self._degraded[key] == 1
+        if first:
+            print(f"Orçamento diário de uso do LLM esgotado para {user_id}: "
+                  f"usando respostas em cache ou o modelo rápido até amanhã.")
+
+
+_ledger = None
+_ledger_lock = threading.Lock()
+
+
+def get_usage_ledger() -> UsageLedger:
+    """Totais de uso compartilhados (sobre o JSONL do roteador, se config.LLM_ROUTING_LOG)."""
+    global _ledger
+    with _ledger_lock:
+        if _ledger is None:
+            _ledger = UsageLedger(
+                path=config.LLM_ROUTING_LOG_PATH if config.LLM_ROUTING_LOG else None,
+                token_budget=config.USAGE_DAILY_TOKEN_BUDGET,
+                cost_budget=config.USAGE_DAILY_COST_BUDGET
+            )
+        return _ledger
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Consumo de tokens e custo do LLM")
+    parser.add_argument("--log", default=config.LLM_ROUTING_LOG_PATH, help="Arquivo JSONL de métricas do roteador")
+    parser.add_argument("--by", default="user_id",
+                        help=f"Campos de agrupamento separados por vírgula ({', '.join(GROUP_FIELDS)})")
+    parser.add_argument("--since", help="Primeiro dia (AAAA-MM-DD)")
+    parser.add_argument("--until", help="Último dia (AAAA-MM-DD)")
+    parser.add_argument("--user", help="Apenas este usuário")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.log):
+        print(f"Nenhum uso registrado em {args.log}.")
+        return
+
+    group_by = [field.strip() for field in args.by.split(",") if field.strip()]
+    rows = aggregate(args.log, group_by, args.since, args.until, args.user)
+    width = max([len(" / ".join(group_by))] + [len(" / ".join(str(row[f]) for f in group_by)) for row in rows])
+    print(f"{' / '.join(group_by):<{width + 2}}{'chamadas':>10}{'tokens entrada':>16}"
+          f"{'tokens saída':>14}{'custo US$':>12}")
+    for row in rows:
+        label = " / ".join(str(row[field]) for field in group_by)
+        print(f"{label:<{width + 2}}{row['calls']:>10}{row['prompt_tokens']:>16}"
+              f"{row['completion_tokens']:>14}{row['cost_usd']:>12.4f}")
+
+
+if __name__ == '__main__':
+    main()
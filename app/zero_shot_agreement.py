@@ -0,0 +1,69 @@
+# app/zero_shot_agreement.py
+"""
+Relatório de concordância entre o backend Zero-Shot fp32 (transformers) e o
+backend ONNX Runtime (opcionalmente quantizado em int8).
+
+Uso:
+    python -m app.zero_shot_agreement                      # textos de exemplo
+    python -m app.zero_shot_agreement respostas.txt        # um texto por linha
+    python -m app.zero_shot_agreement respostas.txt --no-quantize --output relatorio.json
+"""
+
+import argparse
+import json
+
+from app import config
+from app import mapping
+
+# Respostas de exemplo no estilo das perguntas abertas do mapeamento
+SAMPLE_TEXTS = [
+    "Quero trabalhar com programação e criar jogos para celular.",
+    "Gosto muito de desenhar e pintar, sonho em ser ilustradora de quadrinhos.",
+    "Tenho interesse em biologia marinha e na preservação dos oceanos.",
+    "Me motiva entender como as coisas funcionam, principalmente física e matemática.",
+    "Quero ser advogado para defender os direitos humanos.",
+    "Adoro tocar violão e compor músicas com meus amigos.",
+    "Penso em abrir meu próprio negócio e aprender sobre marketing digital.",
+    "Aprendi a cozinhar com minha avó e foi muito divertido porque era prático.",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara os scores Zero-Shot entre backends.")
+    parser.add_argument("texts_file", nargs="?", help="Arquivo com um texto por linha")
+    parser.add_argument("--backend", default="onnx", choices=mapping.ZERO_SHOT_BACKENDS)
+    parser.add_argument("--no-quantize", action="store_true", help="Compara com o ONNX fp32")
+    parser.add_argument("--top-n", type=int, default=mapping.TOP_N)
+    parser.add_argument("--output", help="Salva o relatório completo em JSON")
+    args = parser.parse_args()
+
+    texts = SAMPLE_TEXTS
+    if args.texts_file:
+        with open(args.texts_file, encoding="utf-8") as f:
+            texts = [line.strip() for line in f if line.strip()]
+
+    report = mapping.backend_agreement_report(
+        texts,
+        config.CANDIDATE_LABELS,
+        backend=args.backend,
+        quantize=not args.no_quantize,
+        top_n=args.top_n
+    )
+    if not report:
+        print("Nenhum texto para comparar.")
+        return
+
+    print(f"Backend: {report['backend']} (int8: {report['quantize']}) | Textos: {report['texts']}")
+    print(f"Concordância do rótulo principal: {report['top1_agreement']:.1%}")
+    print(f"Sobreposição média top-{report['top_n']}: {report['mean_top_n_overlap']:.1%} "
+          f"(mínima: {report['min_top_n_overlap']:.1%})")
+    print(f"Diferença absoluta de score: média {report['mean_abs_diff']:.4f}, máxima {report['max_abs_diff']:.4f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Relatório salvo em {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+# benchmarks/fake_openai_server.py
+"""
+Servidor HTTP local que imita POST /v1/chat/completions da OpenAI.
+
+Serve para exercitar o cliente real (httpx/openai) contra latência e falhas
+controladas: novas tentativas, Retry-After, circuit breaker, streaming e limites
+de concorrência. Não depende de nenhum pacote além da biblioteca padrão.
+
+Uso:
+    python -m benchmarks.fake_openai_server --port 8089 --latency-ms 300 --fail-rate 0.2
+    OPENAI_BASE_URL=http://127.0.0.1:8089/v1 OPENAI_API_KEY=teste python main.py
+
+Em código (ex: scripts de verificação):
+    server = FakeOpenAIServer(script=[503, 429, 200]).start()
+    ...  # OPENAI_BASE_URL=server.url
+    server.stop()
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+
+
+class FakeOpenAIServer:
+    """
+    Args:
+        latency_ms: Latência de cada resposta
+        fail_rate: Fração de requisições que falham com fail_status
+        fail_status: Código HTTP das falhas aleatórias
+        retry_after: Valor do cabeçalho Retry-After nas respostas 429/503 (segundos)
+        script: Sequência de códigos para as primeiras requisições (ex: [503, 503, 200])
+        host, port: Endereço (porta 0 escolhe uma livre)
+    """
+
+    def __init__(self, latency_ms: float = 0, fail_rate: float = 0.0, fail_status: int = 503,
+                 retry_after: float = None, script: List[int] = None, host: str = "127.0.0.1", port: int = 0):
+        self.latency_ms = latency_ms
+        self.fail_rate = fail_rate
+        self.fail_status = fail_status
+        self.retry_after = retry_after
+        self.script = list(script or [])
+        self.requests = 0
+        self.max_concurrent = 0
+        self._active = 0
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "FakeOpenAIServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def _next_status(self) -> int:
+        with self._lock:
+            self.requests += 1
+            if self.script:
+                return self.script.pop(0)
+        return self.fail_status if random.random() < self.fail_rate else 200
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                if not self.path.endswith("/chat/completions"):
+                    self._send_json(404, {"error": {"message": "Not found", "type": "invalid_request_error"}})
+                    return
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+
+                with server._lock:
+                    server._active += 1
+                    server.max_concurrent = max(server.max_concurrent, server._active)
+                try:
+                    time.sleep(server.latency_ms / 1000)
+                    status = server._next_status()
+                    if status != 200:
+                        headers = {}
+                        if server.retry_after is not None and status in (429, 503):
+                            headers["Retry-After"] = str(server.retry_after)
+                        self._send_json(status, {"error": {"message": f"Erro simulado {status}",
+                                                           "type": "server_error"}}, headers)
+                    elif body.get("stream"):
+                        self._send_stream(body)
+                    else:
+                        self._send_json(200, self._completion(body))
+                finally:
+                    with server._lock:
+                        server._active -= 1
+
+            def _content(self, body) -> str:
+                messages = body.get("messages") or [{}]
+                prompt = messages[-1].get("content", "")
+                return f"Resposta simulada para: {prompt[:60]}"
+
+            def _completion(self, body) -> dict:
+                content = self._content(body)
+                return {
+                    "id": "chatcmpl-fake",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body.get("model", "fake"),
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": content}}],
+                    "usage": {"prompt_tokens": 10, "completion_tokens": len(content.split()),
+                              "total_tokens": 10 + len(content.split())}
+                }
+
+            def _send_json(self, status: int, payload: dict, headers: dict = None):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_stream(self, body):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                for word in self._content(body).split(" "):
+                    chunk = {
+                        "id": "chatcmpl-fake",
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": body.get("model", "fake"),
+                        "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}]
+                    }
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local que imita a API de chat da OpenAI")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Fração de respostas com erro")
+    parser.add_argument("--fail-status", type=int, default=503)
+    parser.add_argument("--retry-after", type=float, default=None, help="Retry-After (s) nas respostas 429/503")
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(latency_ms=args.latency_ms, fail_rate=args.fail_rate, fail_status=args.fail_status,
+                              retry_after=args.retry_after, host=args.host, port=args.port)
+    print(f"Servidor simulado em {server.url} (Ctrl+C para encerrar)")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+# benchmarks/lesson_load_test.py
+"""
+Teste de carga do fluxo de lições, sem rede e sem custo de API.
+
+Cada sessão simulada escolhe uma lição do currículo (app/paths.py), uma idade e um
+estilo de ensino, e percorre os passos como present_current_step: consulta as
+explicações pré-geradas e, se não houver, pede a explicação em streaming pelo
+caminho normal (cache, deduplicação, limites de concorrência, novas tentativas).
+
+Transportes (ver app/llm_transport.py):
+    replay   cassetes gravadas + latência sintética (padrão; sem cassete, resposta sintética)
+    record   grava cassetes chamando a API configurada (ou o servidor simulado com --server)
+    live     chama a API configurada (ou o servidor simulado com --server)
+
+Uso:
+    python -m benchmarks.lesson_load_test --sessions 2000 --latency lognormal:900:0.4
+    python -m benchmarks.lesson_load_test --transport record --server --sessions 50 --cassettes /tmp/cassetes
+    python -m benchmarks.lesson_load_test --cassettes /tmp/cassetes --latency recorded --on-miss error
+    python -m benchmarks.lesson_load_test --transport live --server --server-latency-ms 300 --sessions 200
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+STYLES = ["didático", "socrático", "storytelling", "visual", "gamificado", "projeto"]
+
+
+def _percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def _summary(values):
+    summary = {"p50": _percentile(values, 0.5), "p95": _percentile(values, 0.95),
+               "p99": _percentile(values, 0.99), "max": max(values) if values else None}
+    return {name: round(value, 4) if value is not None else None for name, value in summary.items()}
+
+
+def _configure_environment(args):
+    """Configuração lida por app.config na importação: precisa vir antes dos imports do app."""
+    os.environ["LLM_TRANSPORT"] = args.transport
+    os.environ["LLM_REPLAY_LATENCY"] = args.latency
+    os.environ["LLM_REPLAY_ON_MISS"] = args.on_miss
+    os.environ["LLM_REPLAY_SEED"] = str(args.seed)
+    if args.cassettes:
+        os.environ["LLM_CASSETTE_DIR"] = args.cassettes
+    if not args.rate_limit:
+        os.environ["LLM_RATE_LIMIT_ENABLED"] = "0"
+    if args.api_concurrency:
+        for name in ("LLM_MAX_CONCURRENCY", "LLM_CONCURRENCY_GPT_4O", "LLM_CONCURRENCY_GPT_35_TURBO"):
+            os.environ[name] = str(args.api_concurrency)
+    # Sem registros de roteamento/uso nem pré-carregamento: medimos só o fluxo das sessões
+    os.environ["LLM_ROUTING_LOG"] = "0"
+    os.environ["STEP_PREFETCH_ENABLED"] = "0"
+    os.environ.setdefault("OPENAI_API_KEY", "teste-de-carga")
+
+
+def _collect_lessons(areas):
+    lessons = []
+    for area_name, area_data in areas.items():
+        for subarea_name, subarea_data in (area_data.get("subareas") or {}).items():
+            for level_name, level_data in (subarea_data.get("levels") or {}).items():
+                for module in level_data.get("modules", []):
+                    for lesson in module.get("lessons", []):
+                        steps = [s if isinstance(s, str) else str(s) for s in lesson.get("steps", [])]
+                        if steps:
+                            lessons.append((area_name, subarea_name, level_name,
+                                            module.get("module_title", "Sem título"),
+                                            lesson.get("lesson_title", "Sem título"), steps))
+    return lessons
+
+
+async def _run_sessions(args, lessons):
+    from app.llm_integration import astream_teacher_llm, is_error_response
+    from app.pregenerate_steps import lookup_step_explanation
+    from app.step_prefetch import build_step_prompt
+
+    metrics = {"steps": 0, "pregenerated": 0, "errors": 0, "first_chunk_s": [], "total_s": []}
+    semaphore = asyncio.Semaphore(args.concurrency or args.sessions)
+
+    async def session(index):
+        rng = random.Random(args.seed * 100003 + index)
+        user_age = rng.randint(11, 17)
+        style = rng.choice(STYLES)
+        async with semaphore:
+            for _ in range(args.lessons_per_session):
+                area, subarea, level, module, lesson, steps = rng.choice(lessons)
+                for step in steps[:args.max_steps]:
+                    metrics["steps"] += 1
+                    stored = await asyncio.to_thread(lookup_step_explanation, step, user_age, area, subarea,
+                                                     level, module, lesson, style)
+                    if stored is not None:
+                        metrics["pregenerated"] += 1
+                        continue
+
+                    prompt = build_step_prompt(step, user_age, area, subarea, level, module, lesson)
+                    started = time.perf_counter()
+                    first_chunk = None
+                    failed = False
+                    async for chunk in astream_teacher_llm(prompt, student_age=user_age, subject_area=area,
+                                                           teaching_style=style, use_cache=not args.no_cache):
+                        if first_chunk is None:
+                            first_chunk = time.perf_counter() - started
+                        failed = failed or is_error_response(chunk)
+                    if failed:
+                        metrics["errors"] += 1
+                    else:
+                        metrics["first_chunk_s"].append(first_chunk or 0.0)
+                        metrics["total_s"].append(time.perf_counter() - started)
+                    if args.think_ms:
+                        await asyncio.sleep(rng.uniform(0.5, 1.5) * args.think_ms / 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(session(i) for i in range(args.sessions)))
+    metrics["duration_s"] = time.perf_counter() - started
+    return metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga do fluxo de lições (replay de cassetes)")
+    parser.add_argument("--sessions", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=0, help="Sessões ao mesmo tempo (0 = todas)")
+    parser.add_argument("--lessons-per-session", type=int, default=1)
+    parser.add_argument("--max-steps", type=int, default=5, help="Passos por lição")
+    parser.add_argument("--think-ms", type=float, default=0, help="Tempo médio de leitura entre passos")
+    parser.add_argument("--transport", choices=["replay", "record", "live"], default="replay")
+    parser.add_argument("--cassettes", default=None, help="Diretório das cassetes (padrão: config)")
+    parser.add_argument("--latency", default="lognormal:900:0.4", help="Latência sintética do replay")
+    parser.add_argument("--on-miss", choices=["synthetic", "error"], default="synthetic")
+    parser.add_argument("--server", action="store_true",
+                        help="Usa benchmarks.fake_openai_server como API (transportes live/record)")
+    parser.add_argument("--server-latency-ms", type=float, default=200)
+    parser.add_argument("--no-cache", action="store_true", help="Ignora o cache de respostas")
+    parser.add_argument("--rate-limit", action="store_true", help="Mantém o limitador de taxa do cliente")
+    parser.add_argument("--api-concurrency", type=int, default=0,
+                        help="Sobrescreve os limites de requisições simultâneas (global e por modelo)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Salva o resultado em JSON")
+    args = parser.parse_args()
+
+    server = None
+    if args.server:
+        from benchmarks.fake_openai_server import FakeOpenAIServer
+        server = FakeOpenAIServer(latency_ms=args.server_latency_ms).start()
+        os.environ["OPENAI_BASE_URL"] = server.url
+
+    _configure_environment(args)
+    from app.llm_integration import get_response_cache_stats
+    from app.pregenerate_steps import load_curriculum
+
+    lessons = _collect_lessons(load_curriculum("paths"))
+    if not lessons:
+        print("Currículo sem lições.")
+        sys.exit(1)
+
+    print(f"{args.sessions} sessões, transporte {args.transport}"
+          f"{' (latência ' + args.latency + ')' if args.transport == 'replay' else ''}...")
+    try:
+        metrics = asyncio.run(_run_sessions(args, lessons))
+    finally:
+        if server:
+            server.stop()
+
+    cache = get_response_cache_stats()
+    report = {
+        "sessions": args.sessions,
+        "transport": args.transport,
+        "steps": metrics["steps"],
+        "pregenerated": metrics["pregenerated"],
+        "errors": metrics["errors"],
+        "duration_s": round(metrics["duration_s"], 3),
+        "steps_per_s": round(metrics["steps"] / metrics["duration_s"], 1) if metrics["duration_s"] else None,
+        "first_chunk_s": _summary(metrics["first_chunk_s"]),
+        "total_s": _summary(metrics["total_s"]),
+        "response_cache": {key: cache.get(key) for key in ("hits", "misses", "hit_rate")},
+        "in_flight": cache.get("in_flight")
+    }
+    if server:
+        report["server"] = {"requests": server.requests, "max_concurrent": server.max_concurrent}
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
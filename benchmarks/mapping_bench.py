@@ -0,0 +1,283 @@
+# benchmarks/mapping_bench.py
+"""
+Benchmark do pipeline de mapeamento com corpus fixo.
+
+Mede, por etapa (zero_shot_analysis, combine_scores, aggregate_learning_tracks,
+recommend_learning_paths e complete_user_profile), a latência p50/p95, a vazão e o
+pico de memória da etapa, para conjuntos de rótulos de tamanhos crescentes. Por padrão usa
+um classificador stub local (determinístico, sem download de modelo), o que isola
+o custo do nosso código; com --real, usa o modelo configurado em app/config.py.
+
+Uso:
+    python -m benchmarks.mapping_bench
+    python -m benchmarks.mapping_bench --scales 1 2 4 8 --output bench/mapeamento.json
+    python -m benchmarks.mapping_bench --real --iterations 3
+    python -m benchmarks.mapping_bench --compare bench/anterior.json
+"""
+
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import platform
+import random
+import subprocess
+import time
+import tracemalloc
+
+from app import config
+from app import mapping
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus", "respostas_pt.json")
+
+# Perfis de usuário variando os campos que influenciam os pesos dinâmicos
+USER_PROFILES = [
+    {"age": 14, "learning_style": "1", "learning_goal": "1", "hours_per_week": "2"},
+    {"age": 16, "learning_style": "2", "learning_goal": "2", "hours_per_week": "5"},
+    {"age": 12, "learning_style": "3", "learning_goal": "3", "hours_per_week": "12"},
+    {"age": 17, "learning_style": "4", "learning_goal": "4", "hours_per_week": "8"},
+    {"age": 15, "learning_style": "5", "learning_goal": "5", "hours_per_week": ""},
+]
+
+PERSONALITY = {
+    "orientacao_detalhes": 4,
+    "pensamento_analitico": 5,
+    "criatividade": 3,
+    "trabalho_equipe": 2,
+    "auto_motivacao": 4
+}
+
+
+class _StubTokenizer:
+    """Tokenizer aproximado (um token por palavra) para exercitar o chunking."""
+
+    def __call__(self, text, add_special_tokens=True, **kwargs):
+        return {"input_ids": list(range(len(text.split())))}
+
+
+class StubZeroShotClassifier:
+    """
+    Substituto determinístico do pipeline "zero-shot-classification".
+
+    Os scores vêm de um hash de (texto, rótulo) e o custo cresce com o número de
+    pares, como no modelo real, mas sem a inferência.
+    """
+
+    tokenizer = _StubTokenizer()
+
+    def __call__(self, sequences, candidate_labels, multi_label=True, hypothesis_template="", batch_size=1):
+        single = isinstance(sequences, str)
+        outputs = []
+        for sequence in ([sequences] if single else sequences):
+            scores = {
+                label: int(hashlib.md5(f"{sequence}|{label}".encode("utf-8")).hexdigest()[:8], 16) / 0xFFFFFFFF
+                for label in candidate_labels
+            }
+            ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+            outputs.append({
+                "sequence": sequence,
+                "labels": [label for label, _ in ranked],
+                "scores": [score for _, score in ranked]
+            })
+        return outputs[0] if single else outputs
+
+
+def load_corpus() -> list:
+    with open(CORPUS_PATH, encoding="utf-8") as f:
+        return json.load(f)["answers"]
+
+
+def scaled_label_set(scale: int) -> tuple:
+    """
+    Multiplica o conjunto de rótulos por 'scale', criando variantes sintéticas de
+    cada rótulo e incluindo-as nas mesmas trilhas.
+    """
+    labels = list(config.CANDIDATE_LABELS)
+    tracks = {track: list(track_labels) for track, track_labels in config.LEARNING_TRACKS.items()}
+    for k in range(2, scale + 1):
+        labels += [f"{label} {k}" for label in config.CANDIDATE_LABELS]
+        for track, track_labels in config.LEARNING_TRACKS.items():
+            tracks[track] += [f"{label} {k}" for label in track_labels]
+    return labels, tracks
+
+
+@contextlib.contextmanager
+def label_set(labels: list, tracks: dict):
+    """Troca temporariamente os rótulos e trilhas configurados (o LabelSpace segue o conteúdo)."""
+    original = (config.CANDIDATE_LABELS, config.LEARNING_TRACKS)
+    config.CANDIDATE_LABELS, config.LEARNING_TRACKS = labels, tracks
+    try:
+        yield
+    finally:
+        config.CANDIDATE_LABELS, config.LEARNING_TRACKS = original
+
+
+def _percentile(sorted_values: list, fraction: float) -> float:
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+def _current_rss_mb():
+    """RSS atual do processo (Linux: /proc/self/statm); None em outros sistemas."""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+def measure(func, inputs: list, iterations: int) -> dict:
+    """
+    Executa func(*args) para cada entrada, 'iterations' vezes, e resume a latência e a memória.
+
+    A memória é da própria etapa: pico das alocações Python (tracemalloc) e quanto o
+    RSS do processo cresceu durante ela (o pico de RSS do processo acumularia as
+    etapas anteriores).
+    """
+    rss_before = _current_rss_mb()
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for args in inputs:
+            t0 = time.perf_counter()
+            func(*args)
+            latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - started
+
+    # Passada separada com tracemalloc, para não distorcer as latências acima
+    tracemalloc.start()
+    for args in inputs:
+        func(*args)
+    _, peak_traced = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_after = _current_rss_mb()
+
+    latencies.sort()
+    return {
+        "calls": len(latencies),
+        "p50_ms": _percentile(latencies, 0.50) * 1000,
+        "p95_ms": _percentile(latencies, 0.95) * 1000,
+        "throughput_per_s": len(latencies) / elapsed if elapsed > 0 else None,
+        "peak_traced_mb": peak_traced / (1024 * 1024),
+        "rss_delta_mb": rss_after - rss_before if rss_before is not None and rss_after is not None else None
+    }
+
+
+def bench_scale(answers: list, scale: int, iterations: int) -> dict:
+    labels, tracks = scaled_label_set(scale)
+    rng = random.Random(scale)
+
+    with label_set(labels, tracks):
+        zero_shot_inputs = [(text, labels) for text in answers]
+        text_scores = [mapping.zero_shot_analysis(text, labels) for text in answers]
+
+        # Entradas das demais etapas derivadas do corpus de forma determinística
+        combine_inputs = []
+        profiles = []
+        for i, user_data in enumerate(USER_PROFILES * max(1, len(answers) // len(USER_PROFILES))):
+            mc_scores = {label: rng.random() for label in rng.sample(labels, 5)}
+            likert_scores = {label: rng.random() for label in rng.sample(labels, 5)}
+            scores_list = [text_scores[(i + k) % len(text_scores)] for k in range(2)]
+            combine_inputs.append((scores_list[0], scores_list[1], 1.1))
+            profiles.append((user_data, mc_scores, likert_scores, scores_list))
+
+        mapped = [mapping.compute_mapping_scores(*profile) for profile in profiles]
+        aggregate_inputs = [(final_scores, config.LEARNING_TRACKS) for final_scores, _ in mapped]
+        recommend_inputs = [(track_scores, PERSONALITY) for _, track_scores in mapped]
+        profile_inputs = [
+            (user_data, final_scores, track_scores, PERSONALITY)
+            for (user_data, _, _, _), (final_scores, track_scores) in zip(profiles, mapped)
+        ]
+
+        return {
+            "labels": len(labels),
+            "stages": {
+                "zero_shot_analysis": measure(mapping.zero_shot_analysis, zero_shot_inputs, iterations),
+                "combine_scores": measure(mapping.combine_scores, combine_inputs, iterations),
+                "aggregate_learning_tracks": measure(mapping.aggregate_learning_tracks, aggregate_inputs, iterations),
+                "recommend_learning_paths": measure(mapping.recommend_learning_paths, recommend_inputs, iterations),
+                "complete_user_profile": measure(mapping.complete_user_profile, profile_inputs, iterations)
+            }
+        }
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def _format_mb(value) -> str:
+    return "-" if value is None else f"{value:.1f}"
+
+
+def print_results(results: dict, baseline: dict = None):
+    baseline_runs = {run["scale"]: run for run in (baseline or {}).get("runs", [])}
+    for run in results["runs"]:
+        print(f"\n=== Rótulos: {run['labels']} (escala x{run['scale']}) ===")
+        print(f"{'Etapa':<28}{'p50 ms':>10}{'p95 ms':>10}{'chamadas/s':>14}{'pico MB':>10}{'ΔRSS MB':>10}{'vs. base':>10}")
+        for stage, stats in run["stages"].items():
+            comparison = ""
+            base_stats = baseline_runs.get(run["scale"], {}).get("stages", {}).get(stage)
+            if base_stats and base_stats["p50_ms"] > 0:
+                comparison = f"{stats['p50_ms'] / base_stats['p50_ms']:.2f}x"
+            print(f"{stage:<28}{stats['p50_ms']:>10.3f}{stats['p95_ms']:>10.3f}"
+                  f"{stats['throughput_per_s'] or 0:>14.1f}{stats['peak_traced_mb']:>10.2f}"
+                  f"{_format_mb(stats.get('rss_delta_mb')):>10}{comparison:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do pipeline de mapeamento")
+    parser.add_argument("--real", action="store_true", help="Usa o modelo Zero-Shot real em vez do stub")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 2, 4],
+                        help="Multiplicadores do conjunto de rótulos")
+    parser.add_argument("--iterations", type=int, default=5, help="Repetições sobre o corpus por etapa")
+    parser.add_argument("--output", help="Arquivo JSON de saída (padrão: bench_results/mapping_<commit>.json)")
+    parser.add_argument("--compare", help="JSON de uma execução anterior para comparar o p50")
+    args = parser.parse_args()
+
+    # O benchmark mede o cálculo: sem cache em disco e sem processos auxiliares
+    config.ZERO_SHOT_CACHE_ENABLED = False
+    config.ZERO_SHOT_WORKERS = 0
+    if not args.real:
+        mapping.set_classifier(StubZeroShotClassifier())
+
+    answers = load_corpus()
+    commit = _git_commit()
+    results = {
+        "commit": commit,
+        "timestamp": time.time(),
+        "mode": "real" if args.real else "stub",
+        "model": config.ZERO_SHOT_MODEL if args.real else "stub",
+        "backend": config.ZERO_SHOT_BACKEND if args.real else "stub",
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "corpus_size": len(answers),
+        "iterations": args.iterations,
+        "runs": []
+    }
+    for scale in args.scales:
+        run = bench_scale(answers, scale, args.iterations)
+        run["scale"] = scale
+        results["runs"].append(run)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+
+    output = args.output or os.path.join("bench_results", f"mapping_{commit or int(time.time())}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"\nResultados salvos em {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+# tests/test_circuit_breaker.py
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app import config, llm_resilience
+from app.llm_resilience import (CircuitBreaker, LLMCircuitOpenError, LLMRequestError, LLMServerError,
+                                call_with_retries)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    # Relógio só do módulo: o event loop continua usando o time.monotonic real
+    monkeypatch.setattr(llm_resilience, "time", SimpleNamespace(monotonic=lambda: now[0], time=time.time))
+    return now
+
+
+def _open(breaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure(LLMServerError("500"), breaker.before_call())
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_abre_apos_falhas_seguidas_e_fecha_com_sucesso_do_teste(clock):
+    breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=30)
+    _open(breaker)
+    with pytest.raises(LLMCircuitOpenError):
+        breaker.before_call()
+
+    clock[0] += 30
+    trial = breaker.before_call()
+    assert trial is not None and breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(LLMCircuitOpenError):
+        breaker.before_call()  # Só uma chamada de teste por vez
+    breaker.record_success(trial)
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.before_call() is None
+
+
+def test_falha_do_teste_reabre(clock):
+    breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=30)
+    _open(breaker)
+    clock[0] += 30
+    breaker.record_failure(LLMServerError("500"), breaker.before_call())
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_so_o_dono_do_token_libera_a_chamada_de_teste(clock):
+    breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=30)
+    stale = breaker.before_call()  # Chamada iniciada com o circuito fechado
+    _open(breaker)
+    clock[0] += 30
+    trial = breaker.before_call()
+
+    # Cancelamento, erro do cliente ou sucesso da chamada antiga não liberam um segundo teste
+    breaker.release_trial(stale)
+    breaker.record_failure(LLMRequestError("400"), stale)
+    breaker.record_success(stale)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(LLMCircuitOpenError):
+        breaker.before_call()
+
+    breaker.release_trial(trial)
+    assert breaker.before_call() is not None
+
+
+def test_cancelar_a_chamada_de_teste_libera_a_vaga(clock, monkeypatch):
+    monkeypatch.setattr(llm_resilience, "_breakers", {})
+    monkeypatch.setattr(config, "LLM_CIRCUIT_FAILURE_THRESHOLD", 1)
+    monkeypatch.setattr(config, "LLM_CIRCUIT_RECOVERY_SECONDS", 30)
+    breaker = llm_resilience.get_circuit_breaker("modelo")
+    _open(breaker)
+    clock[0] += 30
+
+    async def hang():
+        await asyncio.sleep(10)
+
+    async def succeed():
+        return "ok"
+
+    async def run():
+        trial = asyncio.ensure_future(call_with_retries(hang, "modelo", max_retries=0))
+        await asyncio.sleep(0.01)
+        with pytest.raises(LLMCircuitOpenError):
+            await call_with_retries(succeed, "modelo", max_retries=0)
+        trial.cancel()
+        await asyncio.gather(trial, return_exceptions=True)
+        return await call_with_retries(succeed, "modelo", max_retries=0)
+
+    assert asyncio.run(run()) == "ok"
+    assert breaker.state == CircuitBreaker.CLOSED
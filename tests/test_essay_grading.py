@@ -0,0 +1,70 @@
+# tests/test_essay_grading.py
+import json
+import re
+from types import SimpleNamespace
+
+import pytest
+
+from app import config
+from app import llm_integration as li
+from app import progress_management
+from app.llm_cache import MemoryResponseCache
+from app.llm_transport import _completion
+
+
+class GradingClient:
+    """Aprova toda resposta que contém "certo" e conta as chamadas."""
+
+    def __init__(self):
+        self.batches = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, model, messages, **kwargs):
+        prompt = messages[-1]["content"]
+        answers = re.findall(r"Resposta do aluno: (.*)", prompt)
+        self.batches.append(answers)
+        grades = [{"question": n, "approved": "certo" in answer, "feedback": f"Feedback {answer}"}
+                  for n, answer in enumerate(answers, 1)]
+        return _completion(model, json.dumps({"grades": grades}),
+                           {"prompt_tokens": 10, "completion_tokens": 10, "total_tokens": 20})
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(li, "_response_cache", MemoryResponseCache(ttl=3600))
+    monkeypatch.setattr(config, "ESSAY_GRADING_BATCH_SIZE", 2)
+    fake = GradingClient()
+    li.set_client_factory(lambda: fake)
+    yield fake
+    li.set_client_factory()
+
+
+def _assessment(answers):
+    questions = [{"type": "dissertativa", "text": f"Questão {n}", "key_points": ["p"]} for n in range(len(answers))]
+    return {"title": "Avaliação", "questions": questions}
+
+
+def _run(monkeypatch, answers, grading_mode):
+    # "n" para a pergunta de reavaliação das respostas reprovadas
+    replies = iter(answers + ["n"] * len(answers))
+    monkeypatch.setattr("builtins.input", lambda prompt="": next(replies))
+    return progress_management.apply_assessment(_assessment(answers), 12, "didático", grading_mode=grading_mode)
+
+
+@pytest.mark.parametrize("grading_mode", ["batch", "background"])
+def test_respostas_sao_corrigidas_em_lotes(client, monkeypatch, capsys, grading_mode):
+    answers = ["certo 1", "errado 2", "certo 3", "certo 4", "errado 5"]
+    score = _run(monkeypatch, answers, grading_mode)
+
+    assert score == pytest.approx(60.0)
+    assert sorted(client.batches) == [["certo 1", "errado 2"], ["certo 3", "certo 4"], ["errado 5"]]
+    output = capsys.readouterr().out
+    assert [line for line in output.splitlines() if line.startswith("Feedback")] == [f"Feedback {a}" for a in answers]
+
+
+def test_mensagem_de_registro_depende_do_modo(client, monkeypatch, capsys):
+    _run(monkeypatch, ["certo"], "background")
+    assert "segundo plano" in capsys.readouterr().out
+
+    _run(monkeypatch, ["certo"], "batch")
+    assert "A correção sai ao final da avaliação." in capsys.readouterr().out
@@ -0,0 +1,83 @@
+# tests/test_lesson_generation.py
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from app import llm_integration as li
+from app.llm_cache import MemoryResponseCache
+from app.llm_transport import _completion
+
+OUTLINE = {
+    "title": "Frações no dia a dia",
+    "sections": [{"subtitle": f"Seção {n}", "focus": "foco"} for n in (1, 2, 3)],
+    "examples": [{"title": f"Exemplo {n}", "focus": "foco"} for n in (1, 2)],
+    "activities": [{"title": f"Atividade {n}", "focus": "foco"} for n in (1, 2)]
+}
+
+LESSON = {
+    "title": "Frações", "introduction": "Intro",
+    "main_content": [{"subtitle": "Seção 1", "content": "Texto"}],
+    "examples": [{"title": "Exemplo 1", "content": "Texto"}],
+    "activities": [{"title": "Atividade 1", "description": "Texto"}],
+    "summary": "Resumo"
+}
+
+
+class BadRequest(Exception):
+    status_code = 400
+
+
+class LessonClient:
+    """Responde roteiro, aula inteira ou parte de texto conforme o prompt."""
+
+    def __init__(self, fail_once=()):
+        self.prompts = []
+        self.fail_once = set(fail_once)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, model, messages, **kwargs):
+        prompt = messages[-1]["content"]
+        self.prompts.append(prompt)
+        for marker in list(self.fail_once):
+            if marker in prompt:
+                self.fail_once.discard(marker)
+                raise BadRequest("falha simulada")
+        if "apenas o roteiro" in prompt:
+            content = json.dumps(OUTLINE)
+        elif "A aula deve seguir a estrutura JSON" in prompt:
+            content = json.dumps(LESSON)
+        else:
+            content = "Texto da parte."
+        return _completion(model, content, {"prompt_tokens": 10, "completion_tokens": 10, "total_tokens": 20})
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(li, "_response_cache", MemoryResponseCache(ttl=3600))
+    fake = LessonClient(fail_once=['exemplo "Exemplo 2"'])
+    li.set_client_factory(lambda: fake)
+    yield fake
+    li.set_client_factory()
+
+
+def test_por_padrao_a_aula_sai_em_uma_chamada(client):
+    lesson = li.generate_complete_lesson("frações", "Matemática")
+    assert lesson.title == "Frações"
+    assert len(client.prompts) == 1
+
+
+def test_aula_por_secoes_gera_o_roteiro_e_as_partes(client):
+    lesson = li.generate_complete_lesson("frações", "Matemática", sectioned=True)
+    assert "apenas o roteiro" in client.prompts[0]
+    assert len(client.prompts) == 1 + 1 + 3 + 2 + 2 + 1
+    assert [section["subtitle"] for section in lesson.main_content] == ["Seção 1", "Seção 2", "Seção 3"]
+    # A parte que falhou vira aviso; as outras seguem
+    assert lesson.examples[1]["content"] == "Conteúdo não disponível devido a um erro."
+    assert lesson.examples[0]["content"] == "Texto da parte."
+
+    # Gerar de novo só refaz a parte que falhou (as demais vêm do cache)
+    client.prompts.clear()
+    lesson = li.generate_complete_lesson("frações", "Matemática", sectioned=True)
+    assert len(client.prompts) == 1 and 'exemplo "Exemplo 2"' in client.prompts[0]
+    assert lesson.examples[1]["content"] == "Texto da parte."
@@ -0,0 +1,125 @@
+# tests/test_llm_cache.py
+import sqlite3
+
+import pytest
+
+from app import llm_cache
+from app.llm_cache import (InMemoryKeyValueStore, KeyValueResponseCache, MemoryResponseCache,
+                           ResponseCacheBackend, SQLiteResponseCache)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(llm_cache.time, "time", lambda: now[0])
+    return now
+
+
+def test_backend_sem_get_e_set_nao_pode_ser_instanciado():
+    class Incompleto(ResponseCacheBackend):
+        def get(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        Incompleto(ttl=10)
+
+
+def test_memoria_expira_pelo_ttl(clock):
+    cache = MemoryResponseCache(ttl=10)
+    cache.set("a", "resposta")
+    clock[0] += 9
+    assert cache.get("a") == "resposta"
+    clock[0] += 1
+    assert cache.get("a") is None
+    assert cache.stats()["expired"] == 1
+
+
+def test_memoria_remove_o_menos_usado_pelo_limite_de_entradas():
+    cache = MemoryResponseCache(ttl=60, max_entries=2)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    cache.get("a")
+    cache.set("c", "3")
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == ("1", None, "3")
+    assert cache.stats()["evictions"] == 1
+
+
+def test_memoria_respeita_o_limite_de_bytes():
+    cache = MemoryResponseCache(ttl=60, max_entries=100, max_bytes=10)
+    cache.set("grande", "x" * 11)
+    assert cache.get("grande") is None
+    cache.set("a", "x" * 6)
+    cache.set("b", "é" * 3)  # 6 bytes em UTF-8
+    assert cache.get("a") is None and cache.get("b") == "é" * 3
+
+
+def _sum_sizes(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_responses").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_sqlite_mantem_o_total_de_bytes_igual_a_soma(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = SQLiteResponseCache(path, ttl=60, max_bytes=1000)
+    cache.set("a", "x" * 100)
+    cache.set("b", "y" * 50)
+    cache.set("a", "z" * 10)  # Substituição troca o tamanho
+    assert cache.total_bytes() == _sum_sizes(path) == 60
+
+    # Outro processo usando o mesmo arquivo enxerga e atualiza o mesmo total
+    other = SQLiteResponseCache(path, ttl=60, max_bytes=1000)
+    other.set("c", "w" * 40)
+    assert cache.total_bytes() == _sum_sizes(path) == 100
+
+
+def test_sqlite_remove_as_acessadas_ha_mais_tempo_acima_do_limite(tmp_path, clock):
+    cache = SQLiteResponseCache(str(tmp_path / "cache.sqlite3"), ttl=600, max_bytes=250)
+    for key in ("a", "b", "c"):
+        clock[0] += 1
+        cache.set(key, key * 100)
+    # "c" passou do limite: sai "a", a acessada há mais tempo
+    assert cache.get("a") is None
+    clock[0] += 1
+    cache.get("b")
+    clock[0] += 1
+    cache.set("d", "d" * 100)
+    assert [cache.get(key) is not None for key in ("b", "c", "d")] == [True, False, True]
+    assert cache.total_bytes() <= 250
+    assert cache.stats()["evictions"] == 2
+
+
+def test_sqlite_expira_na_leitura_e_varre_expiradas_a_cada_n_gravacoes(tmp_path, clock):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = SQLiteResponseCache(path, ttl=10, sweep_interval=3)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    clock[0] += 10
+    assert cache.get("a") is None
+    assert cache.total_bytes() == 1  # "b" expirou, mas só sai na varredura
+
+    cache.set("c", "3")  # Terceira gravação: varre as expiradas
+    assert cache.total_bytes() == _sum_sizes(path) == 1
+    assert cache.get("c") == "3"
+
+
+def test_sqlite_adota_arquivo_criado_antes_do_total(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE llm_responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                 "created_at REAL NOT NULL, last_access REAL NOT NULL)")
+    conn.execute("INSERT INTO llm_responses VALUES ('velha', 'xxxx', 4, 1e12, 1e12)")
+    conn.commit()
+    conn.close()
+
+    cache = SQLiteResponseCache(path, ttl=60)
+    assert cache.total_bytes() == 4
+
+
+def test_chave_valor_respeita_o_limite_por_entrada():
+    cache = KeyValueResponseCache(InMemoryKeyValueStore(), ttl=60, max_entry_bytes=4)
+    cache.set("a", "12345")
+    cache.set("b", "1234")
+    assert cache.get("a") is None and cache.get("b") == "1234"
@@ -0,0 +1,71 @@
+# tests/test_llm_rate_limit.py
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app import llm_rate_limit
+from app.llm_rate_limit import TokenBucketRateLimiter
+
+LIMITS = {"modelo": {"rpm": 60, "tpm": 6000}}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    # Relógio só do módulo: o event loop continua usando o relógio real
+    monkeypatch.setattr(llm_rate_limit, "time", SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+def test_reservas_acima_do_limite_esperam_em_ordem_de_chegada(clock):
+    limiter = TokenBucketRateLimiter(LIMITS)
+    waits = [limiter._reserve("modelo", 100) for _ in range(62)]
+    assert waits[:60] == [0.0] * 60
+    assert waits[60:] == pytest.approx([1.0, 2.0])  # 1 requisição por segundo de reposição
+
+    clock[0] += 2
+    assert limiter._reserve("modelo", 100) == pytest.approx(1.0)
+
+
+def test_tokens_tambem_limitam_e_a_diferenca_volta_ao_balde(clock):
+    limiter = TokenBucketRateLimiter(LIMITS)
+    assert limiter._reserve("modelo", 6000) == 0.0
+    assert limiter._reserve("modelo", 100) == pytest.approx(1.0)  # 100 tokens = 1s de reposição
+
+    # A primeira chamada só usou 1000 dos 6000 tokens reservados
+    asyncio.run(limiter.settle("modelo", 6000, 1000))
+    assert limiter._reserve("modelo", 100) == 0.0
+
+
+def test_modelo_sem_limite_passa_direto(clock):
+    limiter = TokenBucketRateLimiter(LIMITS)
+    asyncio.run(limiter.acquire("outro", 10 ** 9))
+    assert limiter.stats()["acquired"] == 0
+
+
+def test_desistir_na_fila_devolve_a_reserva(clock):
+    limiter = TokenBucketRateLimiter({"modelo": {"rpm": 1, "tpm": 10 ** 6}})
+
+    async def run():
+        await limiter.acquire("modelo", 10)
+        waiter = asyncio.ensure_future(limiter.acquire("modelo", 10))
+        await asyncio.sleep(0.05)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+
+    asyncio.run(run())
+    assert limiter.stats()["delayed"] == 1
+    # Sem a devolução, a próxima esperaria 120s
+    assert limiter._reserve("modelo", 10) == pytest.approx(60.0)
+
+
+def test_processos_dividem_o_mesmo_balde_pelo_arquivo(clock, tmp_path):
+    if llm_rate_limit.fcntl is None:
+        pytest.skip("Sem fcntl o estado fica só no processo")
+    path = str(tmp_path / "rate_limit.json")
+    first, second = TokenBucketRateLimiter(LIMITS, path), TokenBucketRateLimiter(LIMITS, path)
+    for _ in range(30):
+        assert first._reserve("modelo", 1) == 0.0
+        assert second._reserve("modelo", 1) == 0.0
+    assert first._reserve("modelo", 1) == pytest.approx(1.0)
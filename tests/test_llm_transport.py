@@ -0,0 +1,104 @@
+# tests/test_llm_transport.py
+import asyncio
+import random
+from types import SimpleNamespace
+
+import pytest
+
+from app import llm_integration as li
+from app.llm_transport import (CassetteMissError, CassetteStore, RecordingClient, ReplayClient, _chunk,
+                               _completion, parse_latency)
+
+REQUEST = {"model": "gpt-4o-mini", "messages": [{"role": "user", "content": "Explique frações"}],
+           "temperature": 0.7, "max_tokens": 100}
+
+
+class LiveClient:
+    """Faz o papel da API ao vivo durante a gravação."""
+
+    def __init__(self):
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, stream=False, **request):
+        self.calls += 1
+        if stream:
+            return self._stream(request["model"])
+        return _completion(request["model"], "Frações são partes de um todo.",
+                           {"prompt_tokens": 10, "completion_tokens": 7, "total_tokens": 17})
+
+    async def _stream(self, model):
+        for text in ("Frações ", "são partes ", "de um todo."):
+            yield _chunk(model, text)
+
+
+def test_gravacao_e_reproducao_devolvem_a_mesma_resposta_sem_rede(tmp_path):
+    store = CassetteStore(str(tmp_path))
+    live = LiveClient()
+    recorder = RecordingClient(live, store)
+
+    async def record():
+        response = await recorder.chat.completions.create(**REQUEST)
+        return response.choices[0].message.content
+
+    recorded = asyncio.run(record())
+    assert store.count() == 1
+
+    replay = ReplayClient(CassetteStore(str(tmp_path)), latency="none")
+
+    async def play():
+        response = await replay.chat.completions.create(**REQUEST)
+        stream = await replay.chat.completions.create(stream=True, **REQUEST)
+        parts = [chunk.choices[0].delta.content async for chunk in stream]
+        return response, "".join(parts)
+
+    response, streamed = asyncio.run(play())
+    assert response.choices[0].message.content == streamed == recorded
+    assert response.usage.total_tokens == 17
+    assert live.calls == 1 and replay.stats == {"hits": 2, "misses": 0}
+
+
+def test_stream_gravado_serve_chamada_sem_streaming(tmp_path):
+    store = CassetteStore(str(tmp_path))
+    recorder = RecordingClient(LiveClient(), store)
+
+    async def record():
+        stream = await recorder.chat.completions.create(stream=True, **REQUEST)
+        return "".join([chunk.choices[0].delta.content async for chunk in stream])
+
+    assert asyncio.run(record()) == "Frações são partes de um todo."
+    replay = ReplayClient(store, latency="none")
+    response = asyncio.run(replay.chat.completions.create(**REQUEST))
+    assert response.choices[0].message.content == "Frações são partes de um todo."
+
+
+def test_reproducao_sem_cassete_falha_ou_responde_sintetico(tmp_path):
+    with pytest.raises(CassetteMissError):
+        asyncio.run(ReplayClient(CassetteStore(str(tmp_path))).chat.completions.create(**REQUEST))
+
+    synthetic = ReplayClient(CassetteStore(str(tmp_path)), on_miss="synthetic", latency="none")
+    json_request = dict(REQUEST, response_format={"type": "json_object"})
+    response = asyncio.run(synthetic.chat.completions.create(**json_request))
+    assert response.choices[0].message.content == "{}"
+
+
+def test_chamada_do_professor_roda_offline_a_partir_das_cassetes(tmp_path):
+    store = CassetteStore(str(tmp_path))
+    li.set_client_factory(lambda: RecordingClient(LiveClient(), store))
+    try:
+        recorded = li.call_teacher_llm("Explique frações", use_cache=False)
+        li.set_client_factory(lambda: ReplayClient(store, latency="none"))
+        assert li.call_teacher_llm("Explique frações", use_cache=False) == recorded
+        assert "".join(li.stream_teacher_llm("Explique frações", use_cache=False)) == recorded
+    finally:
+        li.set_client_factory()
+
+
+def test_latencia_sintetica():
+    rng = random.Random(1)
+    assert parse_latency("none", rng)(2.0) == 0.0
+    assert parse_latency("recorded", rng)(2.0) == 2.0
+    assert parse_latency("fixed:300", rng)(None) == 0.3
+    assert 0.2 <= parse_latency("uniform:200:900", rng)(None) <= 0.9
+    with pytest.raises(ValueError):
+        parse_latency("gauss:1", rng)
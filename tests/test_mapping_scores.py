@@ -0,0 +1,83 @@
+# tests/test_mapping_scores.py
+import pytest
+
+from app import config
+from app import mapping
+
+USER_DATA = {"learning_goal": "1", "hours_per_week": "2"}
+
+
+def _labels(n, offset=0):
+    return {label: ((i + offset) % 7) / 7 for i, label in enumerate(config.CANDIDATE_LABELS[:n])}
+
+
+def test_pesos_das_respostas_abertas_seguem_a_formula_original():
+    mc, likert = _labels(10), _labels(20, 3)
+    text1, text2 = _labels(15, 1), _labels(15, 5)
+    weights = mapping.calculate_dynamic_weights(USER_DATA)
+
+    final_scores, _ = mapping.compute_mapping_scores(USER_DATA, mc, likert, [text1, text2])
+
+    for label in set(mc) | set(likert) | set(text1) | set(text2):
+        text = text1.get(label, 0.0) / 4 + text2.get(label, 0.0) / 2
+        expected = (mc.get(label, 0.0) * weights["hobbies"] / 8
+                    + likert.get(label, 0.0) * weights["likert"] / 4
+                    + text * weights["text"] / 2)
+        assert final_scores[label] == pytest.approx(expected)
+
+
+def _aggregate_dict(scores, learning_tracks, min_score_threshold=0.05):
+    """Agregação original em dicionários, referência para o LabelSpace."""
+    track_scores = {}
+    for track, label_list in learning_tracks.items():
+        values = [scores.get(label, 0.0) for label in label_list]
+        values = [value for value in values if value >= min_score_threshold]
+        if values:
+            track_scores[track] = sum(values) / len(values)
+    return track_scores
+
+
+def _combine_dict(user_data, mc, likert, text_scores_list):
+    weights = mapping.calculate_dynamic_weights(user_data)
+    text_combined = {}
+    for text_scores in text_scores_list:
+        text_combined = mapping.combine_scores(text_combined, text_scores, weight=1.0)
+    final_scores = mapping.combine_scores({}, mc, weight=weights["hobbies"])
+    final_scores = mapping.combine_scores(final_scores, likert, weight=weights["likert"])
+    return mapping.combine_scores(final_scores, text_combined, weight=weights["text"])
+
+
+def test_label_space_equivale_ao_calculo_em_dicionarios():
+    # Hobbies e Likert usam rótulos fora de CANDIDATE_LABELS e das trilhas
+    mc = {"praticar esportes": 1.0, "desenhar ou pintar": 0.5}
+    likert = {"programação": 0.75, "artes": 0.0, "música": 0.25}
+    text1, text2 = _labels(40, 2), _labels(60, 4)
+
+    final_scores, track_scores = mapping.compute_mapping_scores(USER_DATA, mc, likert, [text1, text2])
+
+    expected_final = _combine_dict(USER_DATA, mc, likert, [text1, text2])
+    assert final_scores.keys() == expected_final.keys()
+    for label, value in expected_final.items():
+        assert final_scores[label] == pytest.approx(value)
+    expected_tracks = _aggregate_dict(expected_final, config.LEARNING_TRACKS)
+    assert list(track_scores) == list(expected_tracks)
+    for track, value in expected_tracks.items():
+        assert track_scores[track] == pytest.approx(value)
+
+
+@pytest.mark.parametrize("threshold", [0.0, 0.05, 0.3])
+def test_agregacao_em_trilhas_equivale_ao_dicionario_com_trilhas_copiadas(threshold):
+    scores = _labels(len(config.CANDIDATE_LABELS))
+    tracks = {track: list(labels) for track, labels in config.LEARNING_TRACKS.items()}
+    tracks["Duplicada"] = ["programação", "programação", "artes"]
+
+    result = mapping.aggregate_learning_tracks(scores, tracks, threshold)
+    expected = _aggregate_dict(scores, tracks, threshold)
+    assert result.keys() == expected.keys()
+    for track, value in expected.items():
+        assert result[track] == pytest.approx(value)
+
+
+def test_label_space_e_reaproveitado_pelo_conteudo():
+    tracks = {track: list(labels) for track, labels in config.LEARNING_TRACKS.items()}
+    assert mapping.get_label_space(learning_tracks=tracks) is mapping.get_label_space()
@@ -0,0 +1,42 @@
+# tests/test_remap_users.py
+from app import mapping
+from app.remap_users import remap_user
+
+USER_DATA = {"learning_goal": "1"}
+
+
+def _profile(**extra):
+    mc = {"praticar esportes": 1.0}
+    likert = {"programação": 1.0, "esportes": 0.0}
+    text_scores = [{"programação": 0.9, "algoritmos": 0.8}, {"programação": 0.7}]
+    _, track_scores = mapping.compute_mapping_scores(USER_DATA, mc, likert, text_scores)
+    user_data = dict(USER_DATA, track_scores=track_scores,
+                     mapping_inputs={"mc_scores": mc, "likert_scores": likert, "text_scores": text_scores})
+    user_data.update(extra)
+    return user_data
+
+
+def test_area_escolhida_a_mao_nao_conta_como_mudanca_de_recomendacao():
+    user_data = _profile(recommended_track="Música e Performance")
+    diff = remap_user("u1", user_data)["diff"]
+    assert diff["changed_tracks"] == {}
+    assert not diff["recommendation_changed"]
+    assert diff["old_top_track"] == diff["new_top_track"]
+
+
+def test_mudanca_no_topo_das_pontuacoes_conta_como_mudanca():
+    user_data = _profile()
+    top = max(user_data["track_scores"], key=user_data["track_scores"].get)
+    stored = {track: 0.1 for track in user_data["track_scores"]}
+    stored["Música e Performance"] = 0.99
+    user_data["track_scores"] = stored
+
+    diff = remap_user("u1", user_data)["diff"]
+    assert diff["old_top_track"] == "Música e Performance"
+    assert diff["new_top_track"] == top
+    assert diff["recommendation_changed"]
+
+
+def test_atualizacao_grava_so_campos_usados():
+    update = remap_user("u1", _profile())["update"]
+    assert set(update) == {"final_scores", "track_scores", "remapped_at", "mapping_inputs"}
@@ -0,0 +1,126 @@
+# tests/test_semantic_cache.py
+import hashlib
+
+import numpy as np
+import pytest
+
+from app.semantic_cache import SemanticCache, calibrate_threshold, exact_signature, normalize_question
+from app.semantic_cache_pairs import PARAPHRASE_PAIRS
+
+PARTITION = ("Tecnologia", "Programação", "iniciante", (11, 14), "didático")
+
+
+class BagOfWordsEmbedder:
+    """Embedder determinístico para testar a lógica do cache sem baixar modelo."""
+
+    model_name = "bag-of-words"
+    dim = 64
+
+    def embed(self, question):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in normalize_question(question).split():
+            vector[int(hashlib.md5(word.encode()).hexdigest(), 16) % self.dim] += 1.0
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+
+class FixedEmbedder:
+    """Cossenos escolhidos por par, para testar a calibração."""
+
+    model_name = "fixed"
+
+    def __init__(self, similarities):
+        self.similarities = similarities
+
+    def embed(self, question):
+        for (first, second), similarity in self.similarities.items():
+            if question == first:
+                return np.array([1.0, 0.0])
+            if question == second:
+                return np.array([similarity, np.sqrt(1 - similarity ** 2)])
+        raise KeyError(question)
+
+
+def _cache(**kwargs):
+    return SemanticCache(threshold=kwargs.pop("threshold", 0.9), embedder=BagOfWordsEmbedder(), **kwargs)
+
+
+def test_mesma_pergunta_e_servida_do_cache():
+    cache = _cache()
+    cache.store("O que é uma variável?", PARTITION, "resposta")
+    assert cache.lookup("o que é uma variável", PARTITION) == "resposta"
+    assert cache.lookup("O que é uma variável?", ("Outra",) + PARTITION[1:]) is None
+
+
+def test_negacao_e_numeros_separam_perguntas():
+    assert exact_signature("O que é fotossíntese?") != exact_signature("O que não é fotossíntese?")
+    assert exact_signature("Quanto é 2+2?") != exact_signature("Quanto é 2-2?")
+
+    cache = _cache(threshold=0.0)
+    cache.store("Quanto é 2+2?", PARTITION, "4")
+    cache.store("O que é fotossíntese?", PARTITION, "fotossíntese")
+    assert cache.lookup("Quanto é 2-2?", PARTITION) is None
+    assert cache.lookup("O que não é fotossíntese?", PARTITION) is None
+
+
+def test_calibracao_fica_acima_do_maior_par_negativo():
+    pairs = [("a", "b", True), ("c", "d", False), ("e", "f", False), ("g", "h", True)]
+    embedder = FixedEmbedder({("a", "b"): 0.95, ("c", "d"): 0.80, ("e", "f"): 0.90, ("g", "h"): 0.91})
+    result = calibrate_threshold(embedder, pairs, margin=0.02)
+    assert result["threshold"] == pytest.approx(0.92)
+    assert result["max_negative"] == pytest.approx(0.90)
+    assert result["recall"] == 0.5
+
+
+def test_calibracao_ignora_pares_separados_pela_assinatura():
+    pairs = [("Quanto é 2+2?", "Quanto é 2-2?", False), ("a", "b", True)]
+    embedder = FixedEmbedder({("Quanto é 2+2?", "Quanto é 2-2?"): 0.99, ("a", "b"): 0.9})
+    result = calibrate_threshold(embedder, pairs, margin=0.02)
+    assert result["pairs"] == 1
+    assert result["threshold"] == 1.0
+
+
+def test_lru_e_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("app.semantic_cache.time.time", lambda: now[0])
+    cache = _cache(max_entries=2, ttl=10)
+    cache.store("O que é uma variável?", PARTITION, "variável")
+    cache.store("O que é uma função?", PARTITION, "função")
+    cache.store("O que é uma classe?", PARTITION, "classe")
+    assert cache.lookup("O que é uma variável?", PARTITION) is None
+    assert cache.lookup("O que é uma classe?", PARTITION) == "classe"
+
+    now[0] += 11
+    assert cache.lookup("O que é uma classe?", PARTITION) is None
+
+
+@pytest.fixture(scope="module")
+def real_cache():
+    pytest.importorskip("transformers")
+    from app.semantic_cache import SentenceEmbedder
+    try:
+        embedder = SentenceEmbedder()
+    except OSError as e:
+        pytest.skip(f"Modelo de embeddings indisponível: {e}")
+    threshold = calibrate_threshold(embedder)["threshold"]
+    return SemanticCache(threshold=threshold, embedder=embedder)
+
+
+@pytest.mark.parametrize("stored, asked", [
+    ("Como funciona um loop for em Python e quando devo usar esse tipo de repetição?",
+     "Como funciona um loop while em Python e quando devo usar esse tipo de repetição?"),
+    ("Como calculo a área de um triângulo?", "Como calculo o perímetro de um triângulo?"),
+    ("Como funciona a mitose?", "Como funciona a meiose?"),
+    ("O que é energia cinética?", "O que é energia potencial?"),
+])
+def test_quase_iguais_nao_sao_servidas_do_cache(real_cache, stored, asked):
+    real_cache.store(stored, PARTITION, "resposta")
+    assert real_cache.lookup(asked, PARTITION) is None
+
+
+def test_parafrases_sao_servidas_do_cache(real_cache):
+    positives = [(a, b) for a, b, same in PARAPHRASE_PAIRS if same]
+    hits = 0
+    for first, second in positives:
+        real_cache.store(first, PARTITION, first)
+        hits += real_cache.lookup(second, PARTITION) == first
+    assert hits >= len(positives) // 2
@@ -0,0 +1,138 @@
+# tests/test_single_flight.py
+import asyncio
+import os
+
+import pytest
+
+from app.single_flight import AsyncSingleFlight
+
+
+def test_chamadas_concorrentes_com_a_mesma_chave_executam_uma_vez():
+    flight = AsyncSingleFlight()
+    calls = []
+
+    async def produce():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "resposta"
+
+    async def run():
+        return await asyncio.gather(*(flight.do("k", produce) for _ in range(10)))
+
+    assert asyncio.run(run()) == ["resposta"] * 10
+    assert len(calls) == 1
+    assert flight.stats() == {"executions": 1, "coalesced": 9}
+
+
+def test_cancelar_um_participante_nao_cancela_os_outros():
+    flight = AsyncSingleFlight()
+
+    async def produce():
+        await asyncio.sleep(0.05)
+        return "resposta"
+
+    async def run():
+        first = asyncio.ensure_future(flight.do("k", produce))
+        second = asyncio.ensure_future(flight.do("k", produce))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        assert await second == "resposta"
+        with pytest.raises(asyncio.CancelledError):
+            await first
+
+    asyncio.run(run())
+
+
+def test_execucao_e_cancelada_quando_todos_desistem():
+    flight = AsyncSingleFlight()
+    cancelled = []
+
+    async def produce():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def run():
+        waiters = [asyncio.ensure_future(flight.do("k", produce)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        await asyncio.sleep(0)
+
+    asyncio.run(run())
+    assert cancelled == [True]
+
+
+def test_lock_entre_processos_reaproveita_o_resultado_e_apaga_o_arquivo(tmp_path):
+    # Duas instâncias fazem o papel de dois processos: cada uma abre seu próprio arquivo de lock
+    first, second = AsyncSingleFlight(str(tmp_path)), AsyncSingleFlight(str(tmp_path))
+    shared_cache = {}
+    calls = []
+
+    async def produce():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        shared_cache["k"] = "resposta"
+        return "resposta"
+
+    async def recheck():
+        return shared_cache.get("k")
+
+    async def run():
+        return await asyncio.gather(first.do("k", produce, recheck), second.do("k", produce, recheck))
+
+    assert asyncio.run(run()) == ["resposta", "resposta"]
+    assert len(calls) == 1
+    assert os.listdir(tmp_path) == []
+
+
+def test_chaves_diferentes_nao_esperam_umas_pelas_outras(tmp_path):
+    first, second = AsyncSingleFlight(str(tmp_path)), AsyncSingleFlight(str(tmp_path))
+
+    async def slow():
+        await asyncio.sleep(0.3)
+        return "lenta"
+
+    async def fast():
+        return "rápida"
+
+    async def run():
+        slow_task = asyncio.ensure_future(first.do("a", slow))
+        await asyncio.sleep(0.01)
+        result = await asyncio.wait_for(second.do("b", fast), timeout=0.2)
+        await slow_task
+        return result
+
+    assert asyncio.run(run()) == "rápida"
+
+
+def test_espera_pelo_lock_nao_ocupa_o_executor_padrao(tmp_path):
+    first, second = AsyncSingleFlight(str(tmp_path)), AsyncSingleFlight(str(tmp_path))
+    release = None
+
+    async def hold():
+        await release.wait()
+        return "primeira"
+
+    async def run():
+        nonlocal release
+        release = asyncio.Event()
+        holder = asyncio.ensure_future(first.do("k", hold))
+        await asyncio.sleep(0.01)
+        # Vários processos esperando o mesmo lock não podem travar as leituras de cache em threads
+        waiters = [asyncio.ensure_future(AsyncSingleFlight(str(tmp_path)).do("k", hold)) for _ in range(64)]
+        await asyncio.sleep(0.05)
+        assert await asyncio.wait_for(asyncio.to_thread(lambda: "cache"), timeout=1) == "cache"
+
+        # Cancelar quem espera o lock não deixa o lock preso
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        release.set()
+        assert await holder == "primeira"
+        assert await asyncio.wait_for(second.do("k", hold), timeout=1) == "primeira"
+
+    asyncio.run(run())
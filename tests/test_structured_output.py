@@ -0,0 +1,37 @@
+# tests/test_structured_output.py
+from app.structured_output import IncrementalJSONParser, parse_json, validate
+
+
+def test_parse_json_repara_cercas_comentarios_e_virgulas_finais():
+    text = '```json\n{"a": 1, // comentário\n "b": [1, 2,],}\n```'
+    assert parse_json(text) == {"a": 1, "b": [1, 2]}
+
+
+def test_parse_json_recupera_resposta_cortada():
+    assert parse_json('{"a": 1, "b": [1, 2, {"c": "tex') == {"a": 1, "b": [1, 2, {"c": "tex"}]}
+
+
+def test_parse_json_fechado_com_virgula_faltando_recupera_o_trecho_anterior():
+    assert parse_json('{"title": "T" "introduction": "x"}') == {"title": "T"}
+    assert parse_json('{"a": [1 2], "b": 3}') == {"a": [1]}
+    assert parse_json('[1, 2 3]') == [1, 2]
+
+
+def test_parse_json_fechado_e_malformado_nao_levanta_excecao():
+    assert parse_json('{"a": tru}') == {}
+
+
+def test_json_malformado_recuperado_aponta_campos_faltando_para_nova_tentativa():
+    schema = {"type": "object", "required": ["title", "introduction"],
+              "properties": {"title": {"type": "string"}, "introduction": {"type": "string"}}}
+    errors = validate(parse_json('{"title": "T" "introduction": "x"}'), schema)
+    assert [path for path, _ in errors] == [("introduction",)]
+
+
+def test_parser_incremental_avisa_itens_completos():
+    parser = IncrementalJSONParser()
+    events = parser.feed('{"weekly_plan": [{"week": 1}, ')
+    assert (("weekly_plan", 0), {"week": 1}) in events
+    parser.feed('{"week": 2}]}')
+    assert parser.complete
+    assert parser.result() == {"weekly_plan": [{"week": 1}, {"week": 2}]}
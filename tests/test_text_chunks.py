@@ -0,0 +1,70 @@
+# tests/test_text_chunks.py
+import pytest
+
+from app import config
+from app import mapping
+
+
+class CharTokenizer:
+    """Um token por caractere que não é espaço."""
+
+    def __call__(self, text, add_special_tokens=False):
+        return {"input_ids": [ord(char) for char in text if not char.isspace()]}
+
+    def decode(self, token_ids):
+        return "".join(chr(token_id) for token_id in token_ids)
+
+
+def _tokens(text):
+    return len(CharTokenizer()(text)["input_ids"])
+
+
+def test_nenhum_trecho_passa_do_limite_mesmo_com_palavra_gigante():
+    text = "abc de " + "x" * 25 + " fgh ij"
+    chunks = list(mapping.iter_text_chunks(text, CharTokenizer(), max_tokens=10, overlap_tokens=3))
+    assert all(_tokens(chunk) <= 10 for chunk in chunks)
+    # A palavra gigante foi dividida, sem perder caracteres
+    assert sum(chunk.count("x") for chunk in chunks) >= 25
+    assert chunks[-1].endswith("fgh ij")
+
+
+def test_trechos_consecutivos_se_sobrepoem():
+    words = [f"p{n:02d}" for n in range(30)]  # 3 tokens cada
+    chunks = list(mapping.iter_text_chunks(" ".join(words), CharTokenizer(), max_tokens=12, overlap_tokens=3))
+    assert len(chunks) > 1
+    for previous, current in zip(chunks, chunks[1:]):
+        assert previous.split()[-1] == current.split()[0]
+    assert chunks[-1].split()[-1] == "p29"
+
+
+def test_texto_curto_sai_em_um_trecho():
+    assert list(mapping.iter_text_chunks("um dois três", CharTokenizer(), 100, 10)) == ["um dois três"]
+
+
+class FakeClassifier:
+    tokenizer = CharTokenizer()
+
+    def __init__(self, scores_by_marker):
+        self.scores_by_marker = scores_by_marker
+
+    def __call__(self, sequences, candidate_labels, **kwargs):
+        outputs = []
+        for text in sequences:
+            scores = next(s for marker, s in self.scores_by_marker.items() if marker in text)
+            outputs.append({"labels": list(candidate_labels), "scores": [scores[label] for label in candidate_labels]})
+        return outputs
+
+
+@pytest.mark.parametrize("aggregation, expected", [("max", {"a": 0.9, "b": 0.6}), ("mean", {"a": 0.5, "b": 0.4})])
+def test_agregacao_dos_trechos(monkeypatch, aggregation, expected):
+    monkeypatch.setattr(config, "ZERO_SHOT_CHUNK_AGGREGATION", aggregation)
+    classifier = FakeClassifier({"um": {"a": 0.9, "b": 0.2}, "dois": {"a": 0.1, "b": 0.6}})
+    result = mapping._classify_chunks(classifier, iter(["trecho um", "trecho dois"]), ["a", "b"])
+    assert dict(zip(result["labels"], result["scores"])) == pytest.approx(expected)
+    assert result["scores"] == sorted(result["scores"], reverse=True)
+
+
+def test_agregacao_invalida_e_rejeitada(monkeypatch):
+    monkeypatch.setattr(config, "ZERO_SHOT_CHUNK_AGGREGATION", "median")
+    with pytest.raises(ValueError):
+        mapping._classify_chunks(FakeClassifier({}), iter(["x"]), ["a"])
@@ -0,0 +1,109 @@
+# tests/test_usage_ledger.py
+import asyncio
+import datetime
+import json
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from app import llm_integration as li
+from app import llm_routing, usage_ledger
+from app.llm_routing import ModelRouter
+from app.llm_transport import _completion
+from app.usage_ledger import UsageLedger, aggregate, usage_context, usage_tags
+
+
+class FakeClient:
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, model, messages, **kwargs):
+        return _completion(model, "resposta", {"prompt_tokens": 100, "completion_tokens": 50, "total_tokens": 150})
+
+
+@pytest.fixture
+def routing_log(tmp_path, monkeypatch):
+    path = str(tmp_path / "llm_routing.jsonl")
+    router = ModelRouter(log_path=path)
+    monkeypatch.setattr(llm_routing, "_router", router)
+    monkeypatch.setattr(usage_ledger, "_ledger", UsageLedger(path=path, token_budget=150))
+    li.set_client_factory(FakeClient)
+    yield path, router
+    li.set_client_factory()
+
+
+def _lines(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def chamada_da_funcionalidade():
+    return li.call_teacher_llm("Explique frações", use_cache=False)
+
+
+def test_chamada_registra_usuario_e_funcao_chamadora_no_log_do_roteador(routing_log):
+    path, router = routing_log
+    with usage_context(user_id="aluno-1"):
+        assert chamada_da_funcionalidade() == "resposta"
+    router.flush()
+
+    [entry] = _lines(path)
+    assert entry["user_id"] == "aluno-1"
+    assert entry["caller"] == "test_usage_ledger.chamada_da_funcionalidade"
+    assert (entry["prompt_tokens"], entry["completion_tokens"]) == (100, 50)
+    assert aggregate(path, ("user_id", "caller"))[0]["total_tokens"] == 150
+
+
+def test_gravacao_do_log_nao_acontece_na_thread_do_event_loop(routing_log, monkeypatch):
+    path, router = routing_log
+    threads = []
+    real_open = open
+
+    def tracking_open(file, *args, **kwargs):
+        if file == path:
+            threads.append(threading.current_thread().name)
+        return real_open(file, *args, **kwargs)
+
+    monkeypatch.setattr("builtins.open", tracking_open)
+
+    async def run():
+        return await li.acall_teacher_llm("Explique frações", use_cache=False, user_id="aluno-1")
+
+    asyncio.run(run())
+    router.flush()
+    assert "llm-routing-log" in threads and threading.main_thread().name not in threads
+
+
+def test_orcamento_soma_o_uso_gravado_por_outros_processos(tmp_path):
+    path = tmp_path / "llm_routing.jsonl"
+    ledger = UsageLedger(path=str(path), token_budget=1000)
+    assert not ledger.over_budget("aluno-1")
+
+    today = datetime.date.today().isoformat()
+    other_process = {"ts": 0, "day": today, "tier": "default", "model": "m", "task": None, "latency_s": 1.0,
+                     "prompt_tokens": 700, "completion_tokens": 400, "cost_usd": 0.0,
+                     "user_id": "aluno-1", "caller": None, "estimated": False}
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(other_process) + "\n")
+        f.write('{"ts": 0, "day": "' + today + '", "prompt_t')  # Linha ainda sendo gravada
+
+    usage = ledger.daily_usage("aluno-1")
+    assert usage["tokens"] == 1100 and usage["exceeded"]
+    assert not ledger.over_budget("aluno-2")
+
+
+def test_acima_do_orcamento_a_chamada_desce_para_o_nivel_rapido(routing_log):
+    path, router = routing_log
+    with usage_context(user_id="aluno-1"):
+        chamada_da_funcionalidade()
+        router.flush()
+        chamada_da_funcionalidade()
+    router.flush()
+    assert [entry["tier"] for entry in _lines(path)][1] == "fast"
+
+
+def test_usage_tags_usa_o_usuario_do_contexto():
+    with usage_context(user_id="aluno-9", caller="painel.resumo"):
+        assert usage_tags() == {"user_id": "aluno-9", "caller": "painel.resumo"}
+    assert usage_tags("aluno-3")["user_id"] == "aluno-3"
@@ -0,0 +1,99 @@
+# tests/test_zero_shot_service.py
+import os
+import time
+
+import pytest
+
+from app.mapping import ZeroShotService, ZeroShotServiceClosed, ZeroShotWorkerCrashed, _service_outputs
+
+
+def fake_worker_main(tasks, results, model_name, backend, quantize, batch_size, num_threads):
+    """Processo falso: "crash" derruba o processo, "erro" falha a tarefa, "lento" demora."""
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        task_id, texts, labels = task
+        if "crash" in texts:
+            os._exit(1)
+        for text in texts:
+            # "crash-once:<arquivo>" derruba só o primeiro processo que o recebe
+            if text.startswith("crash-once:") and not os.path.exists(text.split(":", 1)[1]):
+                open(text.split(":", 1)[1], "w").close()
+                os._exit(1)
+        if "erro" in texts:
+            results.put((task_id, None, "ValueError: texto inválido"))
+            continue
+        if "lento" in texts:
+            time.sleep(0.5)
+        results.put((task_id, [{"labels": list(labels), "scores": [1.0] * len(labels)} for _ in texts], None))
+
+
+def _service(num_workers=2):
+    return ZeroShotService(num_workers, max_batch_texts=1, max_wait_ms=0, worker_main=fake_worker_main)
+
+
+def test_classifica_pedidos_concorrentes():
+    service = _service()
+    try:
+        futures = [service.submit(f"texto {n}", ["a", "b"]) for n in range(20)]
+        assert all(future.result(timeout=30)["labels"] == ["a", "b"] for future in futures)
+    finally:
+        service.shutdown()
+
+
+def test_erro_da_tarefa_nao_derruba_o_servico():
+    service = _service()
+    try:
+        with pytest.raises(RuntimeError, match="texto inválido") as excinfo:
+            service.submit("erro", ["a"]).result(timeout=30)
+        assert not isinstance(excinfo.value, (ZeroShotWorkerCrashed, ZeroShotServiceClosed))
+        assert service.submit("ok", ["a"]).result(timeout=30)["labels"] == ["a"]
+        assert not service.closed
+    finally:
+        service.shutdown()
+
+
+def test_queda_de_um_processo_sob_carga_falha_so_as_tarefas_dele():
+    service = _service()
+    try:
+        # Mantém a fila de respostas ocupada: a queda precisa ser notada mesmo assim
+        busy = [service.submit("lento", ["a"]) for _ in range(4)]
+        crashed = service.submit("crash", ["a"])
+        with pytest.raises(ZeroShotWorkerCrashed):
+            crashed.result(timeout=10)
+        assert not service.closed
+        # As tarefas enfileiradas no processo que caiu falham; as do outro seguem
+        outcomes = []
+        for future in busy:
+            try:
+                outcomes.append(future.result(timeout=30)["labels"])
+            except ZeroShotWorkerCrashed:
+                outcomes.append("caiu")
+        assert ["a"] in outcomes
+        assert service.submit("ok", ["a"]).result(timeout=30)["labels"] == ["a"]
+    finally:
+        service.shutdown()
+
+
+def test_texto_do_processo_que_caiu_e_reenviado_uma_vez(tmp_path):
+    service = _service()
+    try:
+        groups = {("a",): [(0, f"crash-once:{tmp_path / 'caiu'}"), (1, "ok")]}
+        outputs = _service_outputs(service, groups)
+        assert [output["labels"] for output in outputs[("a",)]] == [["a"], ["a"]]
+        assert not service.closed
+    finally:
+        service.shutdown()
+
+
+def test_servico_encerra_quando_todos_os_processos_caem():
+    service = _service(num_workers=1)
+    with pytest.raises(ZeroShotWorkerCrashed):
+        service.submit("crash", ["a"]).result(timeout=10)
+    deadline = time.monotonic() + 10
+    while not service.closed and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert service.closed
+    with pytest.raises(ZeroShotServiceClosed):
+        service.submit("ok", ["a"])